@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Event, EventCategory
+from .models import CalendarFeedToken, Event, EventCategory, EventRecurrence
 
 
 @admin.register(EventCategory)
@@ -9,9 +9,16 @@ class EventCategoryAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
 
 
+class EventRecurrenceInline(admin.StackedInline):
+    model = EventRecurrence
+    extra = 0
+    readonly_fields = ['excluded_dates']
+
+
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
     list_display = ['title', 'category', 'start_datetime', 'end_datetime', 'created_at']
+    inlines = [EventRecurrenceInline]
     list_filter = ['category', 'start_datetime', 'created_at']
     search_fields = ['title', 'short_description']
     date_hierarchy = 'start_datetime'
@@ -32,3 +39,10 @@ class EventAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(CalendarFeedToken)
+class CalendarFeedTokenAdmin(admin.ModelAdmin):
+    list_display = ['user', 'created_at']
+    search_fields = ['user__email', 'user__first_name', 'user__last_name']
+    readonly_fields = ['key', 'created_at']
@@ -0,0 +1,344 @@
+"""
+Batched, off-request writes of EventActionLog entries
+
+Event views hand their audit entries to log_event_action, which queues them once
+the request's transaction commits. A background thread per process drains the
+queue and inserts the entries with bulk_create, ACTION_LOG_BATCH_SIZE at a time or
+every ACTION_LOG_FLUSH_INTERVAL seconds, whichever comes first. The queue is
+bounded by ACTION_LOG_QUEUE_SIZE; when it is full ACTION_LOG_OVERFLOW decides
+whether the entry is written in the request after all ('sync', the default) or
+dropped with a warning ('drop'). A batch that fails to insert is retried
+ACTION_LOG_WRITE_RETRIES times and then written entry by entry, so only entries
+that cannot be written at all are lost (and logged). Whatever is still queued is
+flushed when the process exits (atexit), so a normal restart loses nothing. The
+WSGI entry point also turns SIGTERM, which would skip atexit, into a normal exit.
+
+With ACTION_LOG_ASYNC off every entry is written on commit in the request thread.
+
+The table itself only keeps recent history: archive_action_logs (run by the
+prune_action_logs command) moves whole months older than the retention period
+into gzipped JSON Lines files, one per month, and deletes them from the table.
+"""
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from ManagementApp.counters import adjust_count
+
+from .models import Event, EventActionLog
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_SYNC = 'sync'
+OVERFLOW_DROP = 'drop'
+
+
+def client_ip(request):
+    """Client IP address of a request, preferring the first X-Forwarded-For hop"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0]
+    return request.META.get('REMOTE_ADDR')
+
+
+def write_action_logs(entries):
+    """Insert unsaved log entries in one statement; returns how many were written"""
+    if not entries:
+        return 0
+    # An event or user may have been deleted while its entry sat in the queue;
+    # keep the entry and clear the reference, as on_delete=SET_NULL would have
+    event_ids = {entry.event_id for entry in entries if entry.event_id}
+    user_ids = {entry.user_id for entry in entries if entry.user_id}
+    existing_events = set(Event.objects.filter(pk__in=event_ids).values_list('pk', flat=True)) if event_ids else set()
+    existing_users = set(get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True)) if user_ids else set()
+    for entry in entries:
+        if entry.event_id not in existing_events:
+            entry.event_id = None
+        if entry.user_id not in existing_users:
+            entry.user_id = None
+    EventActionLog.objects.bulk_create(entries)
+    # bulk_create sends no post_save, so keep the dashboard counter in step here
+    adjust_count(EventActionLog, len(entries))
+    return len(entries)
+
+
+class ActionLogWriter:
+    """Bounded queue of log entries drained in batches by a background thread"""
+
+    def __init__(self, max_size, batch_size, flush_interval, overflow, retries=3, retry_delay=0.5):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.dropped = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    def _ensure_started(self):
+        # Forked workers inherit the parent's queue but not its thread, so start afresh
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self.queue = queue.Queue(maxsize=self.max_size)
+                self._stopping = threading.Event()
+                atexit.register(self.shutdown)
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='action-log-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, entry):
+        """Queue an entry, applying the overflow policy when the queue is full"""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            if self.overflow == OVERFLOW_DROP:
+                self.dropped += 1
+                logger.warning('Action log queue full; dropped %s entry for "%s"', entry.action, entry.event_title)
+            else:
+                write_action_logs([entry])
+
+    def _take_batch(self, timeout):
+        """Wait up to timeout for one entry, then take whatever else is queued up to a full batch"""
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Write a batch, retrying it and then falling back to one entry at a time; returns how many were written"""
+        for attempt in range(1, self.retries + 1):
+            try:
+                return write_action_logs(batch)
+            except Exception:
+                logger.warning(
+                    'Could not write %d action log entries (attempt %d of %d)', len(batch), attempt, self.retries,
+                    exc_info=True,
+                )
+                self._reconnect()
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay * attempt)
+        # Keep one bad entry from taking the rest of the batch with it
+        written = 0
+        for entry in batch:
+            try:
+                written += write_action_logs([entry])
+            except Exception:
+                self.failed += 1
+                logger.exception('Could not write %s action log entry for "%s"', entry.action, entry.event_title)
+                self._reconnect()
+        return written
+
+    @staticmethod
+    def _reconnect():
+        # Drop a broken connection so the next attempt opens a fresh one (never inside a caller's transaction)
+        if not connection.in_atomic_block:
+            close_old_connections()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take_batch(self.flush_interval)
+            if batch:
+                close_old_connections()
+                self._write(batch)
+        connection.close()
+
+    def flush(self):
+        """Write everything queued so far from the calling thread; returns how many were written"""
+        if self._pid != os.getpid():
+            return 0
+        written = 0
+        while batch := self._take_batch(0):
+            written += self._write(batch)
+        return written
+
+    def stop(self):
+        """Ask the background thread to stop after its current batch; safe inside a signal handler"""
+        if self._pid == os.getpid():
+            self._stopping.set()
+
+    def shutdown(self, timeout=10):
+        """Stop the background thread and flush what is left"""
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def install_sigterm_handler(self):
+        """
+        Exit normally on SIGTERM (docker stop, systemd, a process manager), whose
+        default action skips atexit, so shutdown() still flushes the queue.
+        
+        The handler only stops the writer thread and exits (or hands over to the
+        previous handler); the flush itself runs from atexit, outside the handler.
+        Only the main thread can install signal handlers, so this is a no-op elsewhere.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(signum, frame):
+            self.stop()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous != signal.SIG_IGN:
+                # Exit as the default action would; re-raising the signal is ignored when running as PID 1
+                sys.exit(128 + signum)
+
+        signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+writer = ActionLogWriter(
+    max_size=getattr(settings, 'ACTION_LOG_QUEUE_SIZE', 10000),
+    batch_size=getattr(settings, 'ACTION_LOG_BATCH_SIZE', 100),
+    flush_interval=getattr(settings, 'ACTION_LOG_FLUSH_INTERVAL', 2.0),
+    overflow=getattr(settings, 'ACTION_LOG_OVERFLOW', OVERFLOW_SYNC),
+    retries=getattr(settings, 'ACTION_LOG_WRITE_RETRIES', 3),
+)
+
+
+def log_event_action(request, action, event=None, event_title='', event_data=None):
+    """Record an editor's action on an event once the current transaction commits"""
+    entry = EventActionLog(
+        event=event,
+        user=request.user,
+        action=action,
+        event_title=event_title,
+        event_data=event_data,
+        # Stamped now rather than when the batch is written
+        timestamp=timezone.now(),
+        ip_address=client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:255],
+    )
+    if getattr(settings, 'ACTION_LOG_ASYNC', True):
+        transaction.on_commit(lambda: writer.submit(entry))
+    else:
+        transaction.on_commit(lambda: write_action_logs([entry]))
+    return entry
+
+
+ARCHIVE_FIELDS = [
+    'id', 'event_id', 'event_title', 'event_data', 'user_id', 'user__email', 'action', 'timestamp',
+    'ip_address', 'user_agent',
+]
+
+
+def month_start(value):
+    """Midnight on the first of value's month, in the current time zone"""
+    return timezone.localtime(value).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value):
+    """The first of the month after a month_start"""
+    return value.replace(year=value.year + value.month // 12, month=value.month % 12 + 1)
+
+
+def archive_path(archive_dir, month):
+    return Path(archive_dir) / f'event_action_log-{month:%Y-%m}.jsonl.gz'
+
+
+def archive_action_logs(before, archive_dir, dry_run=False, batch_size=5000):
+    """
+    Move entries from the months that end on or before before into gzipped JSONL
+    archives under archive_dir and delete them from the table.
+    
+    A month is archived to a temporary file first and only deleted once that file
+    is complete. Entries the month's archive already holds, left behind by a run
+    that stopped before its delete, are deleted without being written again; any
+    others are added to the existing file as another gzip member (zcat and
+    gzip.open read straight through). Returns [(month, entries)].
+    """
+    cutoff = month_start(before)
+    oldest = EventActionLog.objects.filter(timestamp__lt=cutoff).order_by('timestamp').values_list(
+        'timestamp', flat=True
+    ).first()
+    if oldest is None:
+        return []
+    archived = []
+    month = month_start(oldest)
+    while month < cutoff:
+        end = next_month(month)
+        entries = EventActionLog.objects.filter(timestamp__gte=month, timestamp__lt=end)
+        if dry_run:
+            count = entries.count()
+        else:
+            count = _archive_month(entries, archive_path(archive_dir, month), batch_size)
+        if count:
+            archived.append((month, count))
+        month = end
+    return archived
+
+
+def _archived_ids(path):
+    """Ids of the entries already in an archive file"""
+    if not path.exists():
+        return set()
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        return {json.loads(line)['id'] for line in archive}
+
+
+def _archive_month(entries, path, batch_size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + '.tmp')
+    already_archived = _archived_ids(path)
+    archived_ids = []
+    written = 0
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as archive:
+        for row in entries.order_by('timestamp', 'id').values(*ARCHIVE_FIELDS).iterator(chunk_size=batch_size):
+            archived_ids.append(row['id'])
+            if row['id'] in already_archived:
+                continue
+            row['user_email'] = row.pop('user__email')
+            archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+            written += 1
+    if not written:
+        temp_path.unlink()
+    elif path.exists():
+        with open(path, 'ab') as target, open(temp_path, 'rb') as source:
+            shutil.copyfileobj(source, target)
+            target.flush()
+            os.fsync(target.fileno())
+        temp_path.unlink()
+    else:
+        with open(temp_path, 'rb') as source:
+            os.fsync(source.fileno())
+        temp_path.replace(path)
+    # Delete only what is in the archive, in batches. Nothing references log entries, so a
+    # plain DELETE skips delete()'s per-row signals; shift the dashboard counter once per batch
+    table = connection.ops.quote_name(EventActionLog._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(archived_ids), batch_size):
+            cursor.execute(f'DELETE FROM {table} WHERE id = ANY(%s)', [archived_ids[start:start + batch_size]])
+            adjust_count(EventActionLog, -cursor.rowcount)
+    return len(archived_ids)
@@ -0,0 +1,136 @@
+"""
+Validators for conditional GETs of the calendar pages and the calendar feeds
+
+Browsers, FullCalendar and subscribed calendar apps re-request these constantly
+while nothing has changed. The pages are wrapped in
+django.views.decorators.http.condition (the feeds check their validators inline,
+after parsing their parameters) with an ETag built from a cheap aggregate over
+what the page shows. The aggregate is the
+latest updated_at plus a row count, so deletions also change it. The ETag also
+includes who is asking and which event permissions they hold, so a match returns
+304 Not Modified without running the view.
+
+Last-Modified is only sent for the feeds. The HTML pages also depend on the viewer
+and on deletions, which a date alone cannot express.
+"""
+import hashlib
+
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Event, EventCategory, EventContact, EventRegistration
+
+# Browsers must revalidate (cheaply, thanks to the validators) before reusing a page
+CACHE_CONTROL = {'private': True, 'no_cache': True}
+
+
+def _etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def viewer_state(user):
+    """The parts of the viewer that change what the calendar pages render"""
+    if not user.is_authenticated:
+        return ('anonymous',)
+    return (
+        user.pk, user.updated_at,
+        user.has_permission('create_events'), user.has_permission('edit_events'), user.has_permission('delete_events'),
+    )
+
+
+def calendar_etag(request, *args, **kwargs):
+    """ETag for pages listing every event (the calendar and the event list)"""
+    events = Event.objects.aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    categories = EventCategory.objects.aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    return _etag(
+        events['last_modified'], events['count'], categories['last_modified'], categories['count'],
+        viewer_state(request.user),
+    )
+
+
+def event_detail_etag(request, pk, *args, **kwargs):
+    """ETag for one event's page: the event, its registrations, contacts and documents, and the viewer's registration"""
+    latest_contact = EventContact.objects.filter(event=OuterRef('pk')).order_by().values('event').annotate(
+        latest=Max('member__updated_at')
+    ).values('latest')
+    latest_document = Event.linked_documents.through.objects.filter(event=OuterRef('pk')).order_by().values(
+        'event'
+    ).annotate(latest=Max('documentfile__updated_at')).values('latest')
+    latest_registration = EventRegistration.objects.filter(event=OuterRef('pk')).order_by('-updated_at').values(
+        'updated_at'
+    )[:1]
+    # A recurring event lists its next unmaterialized occurrences
+    latest_occurrence = Event.objects.filter(series=OuterRef('pk')).order_by('-pk').values('pk')[:1]
+    state = Event.objects.filter(pk=pk).annotate(
+        latest_contact=Subquery(latest_contact),
+        latest_document=Subquery(latest_document),
+        latest_registration=Subquery(latest_registration),
+        latest_occurrence=Subquery(latest_occurrence),
+    ).values_list(
+        'updated_at', 'seats_taken', 'active_registration_count', 'total_registrant_count', 'category__updated_at',
+        'registration_open_datetime', 'start_datetime', 'latest_contact', 'latest_document', 'latest_registration',
+        'latest_occurrence', 'series__updated_at',
+    ).first()
+    if state is None:
+        return None
+    registration_open_datetime, start_datetime = state[5], state[6]
+    now = timezone.now()
+    # Registration opening and the event starting change the page without changing any row
+    time_state = (
+        registration_open_datetime is None or now >= registration_open_datetime, now > start_datetime,
+        timezone.localdate(),
+    )
+    return _etag(state, time_state, viewer_state(request.user))
+
+
+def feed_validators(events, occurrences=()):
+    """
+    (ETag, Last-Modified) for the JSON feed from one aggregate over the events it would
+    return, plus the recurring-event occurrences expanded for it
+    """
+    state = events.order_by().aggregate(
+        last_modified=Max('updated_at'), count=Count('pk'),
+        category_modified=Max('category__updated_at'), category_count=Count('category', distinct=True),
+    )
+    # Occurrences are copies of their series' event, so its updated_at covers them
+    expanded = tuple(
+        (occurrence.series_id, occurrence.occurrence_date, occurrence.updated_at,
+         occurrence.category.updated_at if occurrence.category else None)
+        for occurrence in occurrences
+    )
+    last_modified = max(filter(None, [
+        state['last_modified'], state['category_modified'], *(occurrence[2] for occurrence in expanded),
+    ]), default=None)
+    return _etag(tuple(state.values()), expanded), last_modified
+
+
+def ics_feed_validators(events, registrations=None, extra=()):
+    """
+    (ETag, Last-Modified) for an ICS feed: the events it lists, the registrations
+    behind a personal feed, and anything else the body is built from (extra)
+    """
+    etag, last_modified = feed_validators(events)
+    if registrations is not None:
+        state = registrations.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+        etag = _etag(etag, tuple(state.values()))
+        last_modified = max(filter(None, [last_modified, state['last_modified']]), default=None)
+    return _etag(etag, extra), last_modified
+
+
+def not_modified(request, etag, last_modified=None):
+    """The 304 (or 412) response for a request whose validators match, or None to render normally"""
+    return get_conditional_response(
+        request, etag=quote_etag(etag),
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def set_validators(response, etag, last_modified=None):
+    """Attach the validators and revalidation policy to a freshly rendered response"""
+    response.headers['ETag'] = quote_etag(etag)
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, **CACHE_CONTROL)
+    return response
@@ -0,0 +1,173 @@
+"""
+Event fee resolution
+
+A person's fee for an event is the fee of their first active member type (in
+display order) that the event charges for, or nothing if none match. Guests are
+free; their lines only record the event's guest member type. Fees are resolved
+through FeeTable once, at registration time, and stored as RegistrationLineItem
+rows so later fee changes do not rewrite what people were charged.
+
+Migration 0013 backfilled older registrations the same way, plus one adjustment
+line where the current fees no longer add up to the total_fee stored at the time.
+Fee tables are cached per event and dropped by CalendarApp.signals whenever one
+of the event's fees is saved or deleted.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import (
+    Event, EventGuest, EventRegistration, EventRegistrationFee, EventRevenueRollup, RegistrationLineItem
+)
+from .registration import active_member_type_ids, get_registration_rules
+
+FEE_TABLE_CACHE_KEY = 'calendar:fee-table:{event_id}'
+FEE_TABLE_CACHE_TIMEOUT = getattr(settings, 'REGISTRATION_RULES_CACHE_TIMEOUT', 60 * 60 * 6)
+NO_FEE = Decimal('0.00')
+
+
+class FeeTable:
+    """An event's fees keyed by member type id"""
+
+    def __init__(self, event_id, fees):
+        self.event_id = event_id
+        self.fees = dict(fees)
+
+    @classmethod
+    def load_many(cls, event_ids):
+        """Read the fee tables of several events in one query"""
+        tables = {event_id: cls(event_id, {}) for event_id in event_ids}
+        rows = EventRegistrationFee.objects.filter(event_id__in=tables).values_list(
+            'event_id', 'member_type_id', 'fee_amount'
+        )
+        for event_id, member_type_id, fee_amount in rows:
+            tables[event_id].fees[member_type_id] = fee_amount
+        return tables
+
+    def match(self, member_type_ids):
+        """
+        Resolve (member_type_id, fee) for a person's active member types in display order.
+        
+        The first type with a fee wins; with no fee the person's first type (if any) is free.
+        """
+        for member_type_id in member_type_ids:
+            if member_type_id in self.fees:
+                return member_type_id, self.fees[member_type_id]
+        return next(iter(member_type_ids), None), NO_FEE
+
+    def fee_info(self):
+        """Fees keyed by member type id, as strings for the registration template"""
+        return {str(member_type_id): str(amount) for member_type_id, amount in self.fees.items()}
+
+
+def get_fee_tables(event_ids):
+    """Return {event_id: FeeTable}, from the cache where possible and one query for the rest"""
+    keys = {event_id: FEE_TABLE_CACHE_KEY.format(event_id=event_id) for event_id in set(event_ids)}
+    cached = cache.get_many(keys.values())
+    tables = {event_id: cached[key] for event_id, key in keys.items() if key in cached}
+    missing = [event_id for event_id in keys if event_id not in tables]
+    if missing:
+        loaded = FeeTable.load_many(missing)
+        cache.set_many({keys[event_id]: table for event_id, table in loaded.items()}, FEE_TABLE_CACHE_TIMEOUT)
+        tables.update(loaded)
+    return tables
+
+
+def get_fee_table(event):
+    """Return the (cached) fee table of one event"""
+    return get_fee_tables([event.pk])[event.pk]
+
+
+def invalidate_fee_tables(event_ids):
+    """Drop cached fee tables now and again on commit, in case a request re-cached the old rows meanwhile"""
+    keys = [FEE_TABLE_CACHE_KEY.format(event_id=event_id) for event_id in event_ids]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def build_line_items(registration, fee_table, people, guests, guest_member_type_id):
+    """
+    Unsaved line items for a registration.
+    
+    people is a list of (kind, member id, active member type ids) with the primary
+    member first; guests are free and recorded as guest_member_type_id.
+    """
+    items = []
+    for kind, member_id, member_type_ids in people:
+        member_type_id, amount = fee_table.match(member_type_ids)
+        items.append(RegistrationLineItem(
+            registration=registration, event_id=registration.event_id, kind=kind,
+            member_id=member_id, member_type_id=member_type_id, amount=amount,
+        ))
+    for guest in guests:
+        items.append(RegistrationLineItem(
+            registration=registration, event_id=registration.event_id, kind=RegistrationLineItem.GUEST,
+            guest=guest, member_type_id=guest_member_type_id, amount=NO_FEE,
+        ))
+    return items
+
+
+def write_line_items(registrations):
+    """
+    Create line items for registrations bulk-inserted without them (seed data, fixtures)
+    from the current fees, reading everything in a handful of queries, set each
+    registration's total_fee to the sum of its line items and refresh the revenue
+    rollups of their events.
+    
+    Returns the number of line items created.
+    """
+    registrations = list(registrations)
+    if not registrations:
+        return 0
+    registration_ids = [registration.pk for registration in registrations]
+    
+    additional = {}
+    links = EventRegistration.additional_members.through.objects.filter(
+        eventregistration_id__in=registration_ids
+    ).order_by('pk').values_list('eventregistration_id', 'clubuser_id')
+    for registration_id, member_id in links:
+        additional.setdefault(registration_id, []).append(member_id)
+    guests = {}
+    for guest in EventGuest.objects.filter(registration_id__in=registration_ids).order_by('pk'):
+        guests.setdefault(guest.registration_id, []).append(guest)
+    
+    member_ids = {registration.member_id for registration in registrations}
+    for additional_ids in additional.values():
+        member_ids.update(additional_ids)
+    member_type_ids = active_member_type_ids(member_ids)
+    event_ids = {registration.event_id for registration in registrations}
+    fee_tables = get_fee_tables(event_ids)
+    guest_types = {
+        event_id: get_registration_rules(Event(pk=event_id)).guest_member_type_id
+        for event_id in {registration.event_id for registration in registrations if registration.pk in guests}
+    }
+    
+    items = []
+    for registration in registrations:
+        people = [(RegistrationLineItem.PRIMARY, registration.member_id, member_type_ids.get(registration.member_id, []))]
+        people += [
+            (RegistrationLineItem.ADDITIONAL, member_id, member_type_ids.get(member_id, []))
+            for member_id in additional.get(registration.pk, [])
+        ]
+        items += build_line_items(
+            registration, fee_tables[registration.event_id], people,
+            guests.get(registration.pk, []), guest_types.get(registration.event_id),
+        )
+    RegistrationLineItem.objects.bulk_create(items, batch_size=5000)
+    # Whatever total_fee the rows were inserted with, make it agree with their line items
+    EventRegistration.objects.filter(pk__in=registration_ids).update(total_fee=Coalesce(
+        Subquery(
+            RegistrationLineItem.objects.filter(registration=OuterRef('pk')).values('registration').annotate(
+                total=Sum('amount')
+            ).values('total')
+        ),
+        NO_FEE,
+    ))
+    # bulk_create sends no signals, so bring the revenue rollups up to date here
+    EventRevenueRollup.refresh(event_ids)
+    return len(items)
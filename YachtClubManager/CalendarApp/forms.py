@@ -1,7 +1,8 @@
 from django import forms
 from django.forms import inlineformset_factory
 from django_ckeditor_5.widgets import CKEditor5Widget
-from .models import Event, EventContact, EventRegistrationFee, EventRegistration, EventGuest
+from .models import Event, EventContact, EventRecurrence, EventRegistrationFee, EventRegistration, EventGuest
+from .registration import active_member_type_ids, get_registration_rules
 from django.contrib.auth import get_user_model
 from ManagementApp.models import MemberType
 
@@ -76,7 +77,7 @@ class EventForm(forms.ModelForm):
 
     class Meta:
         model = Event
-        fields = ['title', 'short_description', 'category', 'start_datetime', 'end_datetime', 'formatted_description', 'registration_status', 'registration_open_datetime', 'registrant_list_visibility', 'allowed_member_types', 'linked_documents']
+        fields = ['title', 'short_description', 'category', 'start_datetime', 'end_datetime', 'formatted_description', 'registration_status', 'registration_open_datetime', 'registrant_list_visibility', 'capacity', 'allowed_member_types', 'linked_documents']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Event Title'}),
             'short_description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Brief description'}),
@@ -86,6 +87,7 @@ class EventForm(forms.ModelForm):
             'registration_status': forms.Select(attrs={'class': 'form-control'}),
             'registration_open_datetime': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
             'registrant_list_visibility': forms.Select(attrs={'class': 'form-control'}),
+            'capacity': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'placeholder': 'Unlimited'}),
             'allowed_member_types': forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'}),
             'linked_documents': forms.SelectMultiple(attrs={'class': 'form-select', 'size': '8', 'style': 'min-height: 200px;'}),
         }
@@ -99,6 +101,7 @@ class EventForm(forms.ModelForm):
             'registration_status': 'Registration Status',
             'registration_open_datetime': 'Registration Open Date/Time',
             'registrant_list_visibility': 'Registrant List Visibility',
+            'capacity': 'Capacity',
             'allowed_member_types': 'Allowed Member Types',
             'linked_documents': 'Linked Documents',
         }
@@ -140,6 +143,69 @@ class EventForm(forms.ModelForm):
         return cleaned_data
 
 
+class EventRecurrenceForm(forms.ModelForm):
+    """Repeat rule of an event; leaving Repeats empty makes (or keeps) it a one-off event"""
+
+    frequency = forms.ChoiceField(
+        choices=[('', 'Does not repeat')] + EventRecurrence.FREQUENCY_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        label='Repeats'
+    )
+    weekdays = forms.TypedMultipleChoiceField(
+        choices=EventRecurrence.WEEKDAY_CHOICES,
+        coerce=int,
+        required=False,
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'}),
+        label='On',
+        help_text="Weekly events only. Leave empty to repeat on the first event's day."
+    )
+
+    class Meta:
+        model = EventRecurrence
+        fields = ['frequency', 'interval', 'weekdays', 'count', 'until']
+        widgets = {
+            'interval': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
+            'count': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'placeholder': 'No limit'}),
+            'until': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+        }
+        labels = {
+            'interval': 'Every',
+            'count': 'Number of Occurrences',
+            'until': 'Until',
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['interval'].required = False
+        if self.instance.pk is None:
+            # Not the model's default frequency: new events start as one-offs
+            self.initial['frequency'] = ''
+
+    def clean(self):
+        cleaned_data = super().clean()
+        self.repeats = bool(cleaned_data.get('frequency'))
+        if self.repeats and cleaned_data.get('count') and cleaned_data.get('until'):
+            raise forms.ValidationError('Choose either a number of occurrences or an end date, not both.')
+        # A one-off event still builds a valid (unsaved) rule
+        cleaned_data['frequency'] = cleaned_data.get('frequency') or EventRecurrence.WEEKLY
+        cleaned_data['interval'] = cleaned_data.get('interval') or 1
+        if cleaned_data['frequency'] != EventRecurrence.WEEKLY:
+            cleaned_data['weekdays'] = []
+        return cleaned_data
+
+    def save_for(self, event):
+        """Attach, update or remove the event's repeat rule"""
+        if self.repeats:
+            recurrence = self.save(commit=False)
+            recurrence.event = event
+            recurrence.save()
+            return recurrence
+        if self.instance.pk:
+            self.instance.delete()
+        return None
+
+
 class EventRegistrationFeeForm(forms.ModelForm):
     """Form for event registration fees"""
     
@@ -314,17 +380,19 @@ class EventRegistrationForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         self.event = kwargs.pop('event', None)
         self.user = kwargs.pop('user', None)
+        self.rules = kwargs.pop('rules', None)
         super().__init__(*args, **kwargs)
         
         if self.user and self.event:
+            if self.rules is None:
+                self.rules = get_registration_rules(self.event)
             # Get user's dependent members
             dependents = self.user.dependent_members.filter(is_active=True)
             
             # Filter dependents by allowed member types for this event
-            if self.event.allowed_member_types.exists():
-                allowed_types = self.event.allowed_member_types.filter(is_active=True)
+            if self.rules.restricted:
                 # Use a more explicit filter to check if any of the dependent's member types are in allowed types
-                allowed_type_pks = list(allowed_types.values_list('pk', flat=True))
+                allowed_type_pks = list(self.rules.allowed_member_type_ids)
                 if allowed_type_pks:
                     # Filter dependents whose member_types intersect with allowed types
                     # This checks if the dependent has at least one member type that matches
@@ -363,10 +431,10 @@ class EventRegistrationForm(forms.ModelForm):
         
         if self.event and self.user:
             # Validate that selected dependents have allowed member types
-            allowed_types = self.event.get_allowed_member_types()
+            self.additional_member_type_ids = active_member_type_ids(additional_members) if additional_members else {}
             for member in additional_members:
-                member_types = member.member_types.filter(is_active=True)
-                if not any(mt in allowed_types for mt in member_types):
+                member_type_ids = self.additional_member_type_ids.get(member.pk, [])
+                if not member_type_ids or not self.rules.allows(member_type_ids):
                     raise forms.ValidationError(
                         f'{member.get_full_name()} does not have a member type allowed for this event.'
                     )
@@ -0,0 +1,48 @@
+"""
+Template fragment cache for the event cards on the calendar and event list pages
+
+A card (category badge, title, dates, truncated description) looks the same to
+every visitor, so each one is cached by {% cache %} under the event id, the
+event's updated_at and its category's updated_at, and rendered only on the first
+request after the card changes. Anything per-visitor (the edit and delete
+buttons) stays outside the fragment.
+
+An edit normally moves updated_at and so the key; the signal handlers also delete
+the card stored under the old values before an event or category is saved or
+deleted, which covers saves with update_fields that leave updated_at alone and
+keeps superseded cards from lingering until they expire.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+
+# Fragment names used by {% cache %} in calendar.html and event_list.html
+EVENT_CARD_FRAGMENTS = ('calendar_event_card', 'event_list_card')
+
+
+def event_card_cache_timeout():
+    return getattr(settings, 'EVENT_CARD_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def event_card_keys(event_id, updated_at, category_updated_at):
+    """Cache keys of one event's cards, matching the vary-on arguments in the templates"""
+    # The template renders a missing category's updated_at as ''
+    if category_updated_at is None:
+        category_updated_at = ''
+    return [
+        make_template_fragment_key(fragment, [event_id, updated_at, category_updated_at])
+        for fragment in EVENT_CARD_FRAGMENTS
+    ]
+
+
+def invalidate_event_cards(events):
+    """Drop the cached cards of a queryset of events as they are currently stored, now and again on commit"""
+    keys = [
+        key
+        for row in events.order_by().values_list('pk', 'updated_at', 'category__updated_at')
+        for key in event_card_keys(*row)
+    ]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,170 @@
+"""
+iCalendar (RFC 5545) subscription feeds of the club calendar
+
+Calendar apps subscribe to a URL carrying the member's CalendarFeedToken key, so
+no session is involved, and poll it every hour or so. A feed lists the events that
+ended no more than ICS_FEED_PAST_DAYS ago: every event, one category's events, or
+the events the member is registered for (waitlisted ones marked tentative).
+
+A recurring event is written once, with its rule as RRULE; the dates of excluded
+and materialized occurrences go into EXDATE, and each materialized occurrence is
+an event of its own. Calendar apps expand the series themselves, so the feed
+grows with the number of series rather than with the number of occurrences.
+
+The body is streamed from a generator over the events read in chunks. It is
+built only from stored rows (DTSTAMP is the event's updated_at, not the time of
+the request), so the same rows always give the same bytes and the feed can carry
+a strong ETag. Polls that find nothing changed get a 304 after one aggregate query.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Event, EventRegistration
+from .recurrence import occurrence_start
+
+ICS_CONTENT_TYPE = 'text/calendar; charset=utf-8'
+ICS_PRODID = '-//Yacht Club Manager//Club Calendar//EN'
+ICS_CHUNK_SIZE = 500
+# Lines are folded at 75 octets (RFC 5545 section 3.1)
+ICS_LINE_LENGTH = 75
+# How often calendar apps are asked to poll
+ICS_REFRESH_INTERVAL = 'PT1H'
+
+
+def feed_window_start():
+    """Midnight ICS_FEED_PAST_DAYS days ago; moving once a day keeps the ETag stable in between"""
+    days = getattr(settings, 'ICS_FEED_PAST_DAYS', 180)
+    return timezone.make_aware(datetime.combine(timezone.localdate() - timedelta(days=days), time.min))
+
+
+def feed_events(window_start):
+    """Events shown in a feed, including recurring events whose series reaches into the window"""
+    return Event.objects.filter(
+        Q(end_datetime__gt=window_start)
+        | Q(recurrence__isnull=False)
+        & (Q(recurrence__until__isnull=True) | Q(recurrence__until__gte=window_start.date()))
+    )
+
+
+def registration_feed(user_id, window_start):
+    """(events, registrations) for a member's personal feed: events they are on a live registration for"""
+    registrations = EventRegistration.objects.filter(Q(member_id=user_id) | Q(additional_members=user_id))
+    live = registrations.filter(cancelled=False)
+    events = feed_events(window_start).filter(pk__in=live.values('event_id')).annotate(
+        confirmed=Exists(live.filter(event=OuterRef('pk'), waitlisted=False))
+    )
+    return events, registrations
+
+
+def escape_text(value):
+    """Escape a TEXT property value"""
+    return (
+        value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '\\n')
+    )
+
+
+def fold_line(line):
+    """Split a content line into CRLF-terminated lines of at most 75 octets, never inside a character"""
+    encoded = line.encode()
+    if len(encoded) <= ICS_LINE_LENGTH:
+        return line + '\r\n'
+    parts = []
+    start, limit = 0, ICS_LINE_LENGTH
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Back off to the start of a UTF-8 sequence
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start = end
+        # Continuation lines begin with a space, which counts towards their length
+        limit = ICS_LINE_LENGTH - 1
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def recurrence_lines(event, recurrence):
+    """RRULE and EXDATE of a recurring event, in the same value type as its DTSTART"""
+    if event.is_all_day:
+        def format_occurrence(day):
+            return f'{day:%Y%m%d}'
+        date_param = ';VALUE=DATE'
+    else:
+        def format_occurrence(day):
+            return format_datetime(occurrence_start(event, day))
+        date_param = ''
+    rrule = recurrence.rrule
+    if recurrence.until:
+        rrule += f';UNTIL={format_occurrence(recurrence.until)}'
+    lines = [f'RRULE:{rrule}']
+    skipped = sorted({*recurrence.excluded_dates, *(getattr(event, 'materialized_dates', None) or ())})
+    if skipped:
+        lines.append(f'EXDATE{date_param}:' + ','.join(format_occurrence(day) for day in skipped))
+    return lines
+
+
+def event_lines(event, url, uid_domain, status=None):
+    """The VEVENT of one event"""
+    if event.is_all_day:
+        start = f'DTSTART;VALUE=DATE:{timezone.localtime(event.start_datetime):%Y%m%d}'
+        end = f'DTEND;VALUE=DATE:{timezone.localtime(event.end_datetime):%Y%m%d}'
+    else:
+        start = f'DTSTART:{format_datetime(event.start_datetime)}'
+        end = f'DTEND:{format_datetime(event.end_datetime)}'
+    description = f'{event.short_description}\n\n{url}' if event.short_description else url
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.pk}@{uid_domain}',
+        f'DTSTAMP:{format_datetime(event.updated_at)}',
+        f'LAST-MODIFIED:{format_datetime(event.updated_at)}',
+        start,
+        end,
+        *(recurrence_lines(event, event.recurrence) if getattr(event, 'recurrence', None) else ()),
+        f'SUMMARY:{escape_text(event.title)}',
+        f'DESCRIPTION:{escape_text(description)}',
+        f'URL:{url}',
+    ]
+    if event.category:
+        lines.append(f'CATEGORIES:{escape_text(event.category.name)}')
+    if status:
+        lines.append(f'STATUS:{status}')
+    lines.append('END:VEVENT')
+    return ''.join(fold_line(line) for line in lines)
+
+
+def calendar_chunks(name, events, event_url, uid_domain):
+    """
+    Yield the feed one event at a time.
+
+    event_url maps an event to its absolute URL. Events annotated with confirmed
+    (the personal feed) are marked CONFIRMED or, when waitlisted, TENTATIVE.
+    """
+    yield ''.join(fold_line(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{ICS_PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+        f'X-PUBLISHED-TTL:{ICS_REFRESH_INTERVAL}',
+        f'REFRESH-INTERVAL;VALUE=DURATION:{ICS_REFRESH_INTERVAL}',
+    ])
+    materialized = Event.objects.filter(series=OuterRef('pk')).values('occurrence_date')
+    events = events.select_related('category', 'recurrence').only(
+        'id', 'title', 'short_description', 'start_datetime', 'end_datetime', 'updated_at', 'category__name',
+        'recurrence__frequency', 'recurrence__interval', 'recurrence__weekdays', 'recurrence__count',
+        'recurrence__until', 'recurrence__excluded_dates',
+    ).annotate(materialized_dates=ArraySubquery(materialized)).order_by('start_datetime', 'pk')
+    for event in events.iterator(chunk_size=ICS_CHUNK_SIZE):
+        confirmed = getattr(event, 'confirmed', None)
+        status = None if confirmed is None else ('CONFIRMED' if confirmed else 'TENTATIVE')
+        yield event_lines(event, event_url(event), uid_domain, status)
+    yield fold_line('END:VCALENDAR')
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from CalendarApp.fees import get_fee_tables
+from CalendarApp.models import Event
+from CalendarApp.registration import prewarm_registration_rules
+
+
+class Command(BaseCommand):
+    help = 'Cache the registration rules and fee tables of events whose registration is about to open (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', type=int, help='Only warm these events (default: events opening soon)')
+        parser.add_argument(
+            '--minutes', type=int, default=15,
+            help='Warm events whose registration opens within this many minutes (default: 15)'
+        )
+
+    def handle(self, *args, **options):
+        # A process-local cache would be warmed in this process and discarded when it exits
+        backend = caches['default']
+        if isinstance(backend, (LocMemCache, DummyCache)):
+            raise CommandError(
+                f'The default cache ({type(backend).__name__}) is local to this process, so nothing would stay warm. '
+                'Point CACHE_BACKEND/CACHE_LOCATION at a shared cache (memcached, redis or a database table).'
+            )
+        if options['event_ids']:
+            events = Event.objects.filter(pk__in=options['event_ids'])
+        else:
+            now = timezone.now()
+            events = Event.objects.filter(
+                registration_status__in=['recommended', 'required', 'required_by_close_date'],
+                registration_open_datetime__gte=now,
+                registration_open_datetime__lte=now + timedelta(minutes=options['minutes']),
+            )
+        events = list(events)
+        warmed = prewarm_registration_rules(events)
+        get_fee_tables([event.pk for event in events])
+        self.stdout.write(self.style.SUCCESS(f'✓ Cached registration rules and fees for {warmed} event(s)'))
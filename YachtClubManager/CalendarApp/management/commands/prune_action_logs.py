@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from CalendarApp.audit import archive_action_logs
+
+
+class Command(BaseCommand):
+    help = 'Move event action log entries older than the retention period into monthly gzipped JSONL archives (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int, default=getattr(settings, 'ACTION_LOG_RETENTION_DAYS', 365),
+            help='Keep at least this many days of entries in the table; older whole months are archived'
+        )
+        parser.add_argument(
+            '--archive-dir', default=getattr(settings, 'ACTION_LOG_ARCHIVE_DIR', settings.BASE_DIR / 'archives'),
+            help='Directory for the event_action_log-YYYY-MM.jsonl.gz files'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['retention_days'])
+        archived = archive_action_logs(before, options['archive_dir'], dry_run=options['dry_run'])
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        for month, count in archived:
+            self.stdout.write(f'  {month:%Y-%m}: {count} entries')
+        total = sum(count for _, count in archived)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {verb} {total} action log entries from {len(archived)} month(s) to {options["archive_dir"]}'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from CalendarApp.models import Event, EventRevenueRollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized registration counters and revenue rollups of events from their registrations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', type=int, help='Only recount these events (default: all)')
+
+    def handle(self, *args, **options):
+        updated = Event.recount_registrations(options['event_ids'] or None)
+        EventRevenueRollup.refresh(options['event_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'✓ Recounted registrations and revenue for {updated} event(s)'))
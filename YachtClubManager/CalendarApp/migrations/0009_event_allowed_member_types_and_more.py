@@ -62,18 +62,18 @@ class Migration(migrations.Migration):
                             "id" bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
                             "eventregistration_id" bigint NOT NULL,
                             "clubuser_id" bigint NOT NULL,
-                            CONSTRAINT "CalendarApp_eventregistration_additional_members_eventregistration_id_fkey" 
+                            CONSTRAINT "CalendarApp_eventreg_addl_members_registration_id_fkey" 
                                 FOREIGN KEY ("eventregistration_id") REFERENCES "CalendarApp_eventregistration" ("id") 
                                 ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
-                            CONSTRAINT "CalendarApp_eventregistration_additional_members_clubuser_id_fkey" 
+                            CONSTRAINT "CalendarApp_eventreg_addl_members_clubuser_id_fkey" 
                                 FOREIGN KEY ("clubuser_id") REFERENCES "ManagementApp_clubuser" ("id") 
                                 ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
-                            CONSTRAINT "CalendarApp_eventregistration_additional_members_eventregistration_id_clubuser_id_uniq" 
+                            CONSTRAINT "CalendarApp_eventreg_addl_members_registration_id_clubuser_id_uniq" 
                                 UNIQUE ("eventregistration_id", "clubuser_id")
                         );
-                        CREATE INDEX IF NOT EXISTS "CalendarApp_eventregistration_additional_members_eventregistration_id_idx" 
+                        CREATE INDEX IF NOT EXISTS "CalendarApp_eventreg_addl_members_registration_id_idx" 
                             ON "CalendarApp_eventregistration_additional_members" ("eventregistration_id");
-                        CREATE INDEX IF NOT EXISTS "CalendarApp_eventregistration_additional_members_clubuser_id_idx" 
+                        CREATE INDEX IF NOT EXISTS "CalendarApp_eventreg_addl_members_clubuser_id_idx" 
                             ON "CalendarApp_eventregistration_additional_members" ("clubuser_id");
                     """,
                     reverse_sql=migrations.RunSQL.noop,
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_registration_counters(apps, schema_editor):
+    """Count the existing active registrations and registrants of every event"""
+    Event = apps.get_model('CalendarApp', 'Event')
+    EventRegistration = apps.get_model('CalendarApp', 'EventRegistration')
+    AdditionalMember = EventRegistration.additional_members.through
+
+    active = EventRegistration.objects.filter(event=OuterRef('pk'), cancelled=False).order_by().values('event')
+    additional = AdditionalMember.objects.filter(
+        eventregistration__event=OuterRef('pk'),
+        eventregistration__cancelled=False,
+    ).order_by().values('eventregistration__event')
+    registration_count = Coalesce(Subquery(active.annotate(n=Count('pk')).values('n')), Value(0))
+    additional_count = Coalesce(Subquery(additional.annotate(n=Count('pk')).values('n')), Value(0))
+    Event.objects.update(
+        active_registration_count=registration_count,
+        total_registrant_count=registration_count + additional_count,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CalendarApp', '0010_event_linked_documents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='active_registration_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of active (non-cancelled) registrations'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='total_registrant_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of people on active registrations (primary plus additional members)'),
+        ),
+        migrations.RunPython(populate_registration_counters, migrations.RunPython.noop),
+    ]
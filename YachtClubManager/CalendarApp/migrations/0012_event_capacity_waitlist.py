@@ -0,0 +1,73 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_seats(apps, schema_editor):
+    """Size existing registrations (primary + additional members + guests) and fill the seat ledger"""
+    Event = apps.get_model('CalendarApp', 'Event')
+    EventRegistration = apps.get_model('CalendarApp', 'EventRegistration')
+    EventGuest = apps.get_model('CalendarApp', 'EventGuest')
+    AdditionalMember = EventRegistration.additional_members.through
+
+    additional = AdditionalMember.objects.filter(eventregistration=OuterRef('pk')).order_by().values('eventregistration')
+    guests = EventGuest.objects.filter(registration=OuterRef('pk')).order_by().values('registration')
+    EventRegistration.objects.update(
+        seat_count=Value(1)
+        + Coalesce(Subquery(additional.annotate(n=Count('pk')).values('n')), Value(0))
+        + Coalesce(Subquery(guests.annotate(n=Count('pk')).values('n')), Value(0))
+    )
+
+    confirmed = EventRegistration.objects.filter(
+        event=OuterRef('pk'), cancelled=False, waitlisted=False
+    ).order_by().values('event')
+    Event.objects.update(seats_taken=Coalesce(Subquery(confirmed.annotate(n=Sum('seat_count')).values('n')), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CalendarApp', '0011_event_registration_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Maximum number of people (members, dependents and guests). Leave blank for unlimited.', null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Seats held by confirmed registrations'),
+        ),
+        migrations.AddField(
+            model_name='eventregistration',
+            name='seat_count',
+            field=models.PositiveIntegerField(default=1, help_text='Seats this registration needs (primary member, additional members and guests)'),
+        ),
+        migrations.AddField(
+            model_name='eventregistration',
+            name='waitlisted',
+            field=models.BooleanField(default=False, help_text='Waiting for seats to free up (the event was full)'),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='active_registration_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of confirmed (non-cancelled, non-waitlisted) registrations'),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='total_registrant_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of people on confirmed registrations (primary plus additional members)'),
+        ),
+        migrations.AddIndex(
+            model_name='eventregistration',
+            index=models.Index(fields=['event', 'waitlisted', 'registered_at'], name='CalendarApp_event_i_43aa17_idx'),
+        ),
+        migrations.RunPython(populate_seats, migrations.RunPython.noop),
+    ]
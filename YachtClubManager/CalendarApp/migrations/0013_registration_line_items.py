@@ -0,0 +1,133 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:31
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_line_items(apps, schema_editor):
+    """
+    Write line items for existing registrations.
+    
+    Member fees are resolved from the current fee tables, which may have changed since
+    people registered, and guests were never charged before line items, so guests get
+    zero-amount lines and any difference to the stored total_fee is written as one
+    adjustment line. Past revenue therefore still sums to what was actually charged.
+    """
+    EventRegistration = apps.get_model('CalendarApp', 'EventRegistration')
+    EventRegistrationFee = apps.get_model('CalendarApp', 'EventRegistrationFee')
+    EventGuest = apps.get_model('CalendarApp', 'EventGuest')
+    RegistrationLineItem = apps.get_model('CalendarApp', 'RegistrationLineItem')
+    MemberType = apps.get_model('ManagementApp', 'MemberType')
+    ClubUser = apps.get_model(settings.AUTH_USER_MODEL)
+    AllowedLink = apps.get_model('CalendarApp', 'Event').allowed_member_types.through
+    AdditionalLink = EventRegistration.additional_members.through
+    MemberTypeLink = ClubUser.member_types.through
+    type_order = ('membertype__display_order', 'membertype__name')
+
+    fees = {
+        (event_id, member_type_id): amount
+        for event_id, member_type_id, amount in EventRegistrationFee.objects.values_list(
+            'event_id', 'member_type_id', 'fee_amount'
+        )
+    }
+    # Guests are charged as the event's allowed guest type, or the club's for unrestricted events
+    restricted, guest_types = set(), {}
+    for event_id, member_type_id, is_active, name in AllowedLink.objects.order_by(*type_order).values_list(
+        'event_id', 'membertype_id', 'membertype__is_active', 'membertype__name'
+    ):
+        restricted.add(event_id)
+        if is_active and 'guest' in name.lower():
+            guest_types.setdefault(event_id, member_type_id)
+    default_guest_type = MemberType.objects.filter(
+        is_active=True, name__icontains='guest'
+    ).order_by('display_order', 'name').values_list('pk', flat=True).first()
+
+    def match(event_id, member_type_ids):
+        for member_type_id in member_type_ids:
+            if (event_id, member_type_id) in fees:
+                return member_type_id, fees[(event_id, member_type_id)]
+        return (member_type_ids[0] if member_type_ids else None), Decimal('0.00')
+
+    registrations = EventRegistration.objects.order_by('pk').values_list('pk', 'event_id', 'member_id', 'total_fee')
+    last_pk = 0
+    while batch := list(registrations.filter(pk__gt=last_pk)[:2000]):
+        last_pk = batch[-1][0]
+        registration_ids = [pk for pk, _, _, _ in batch]
+        additional = {}
+        for registration_id, member_id in AdditionalLink.objects.filter(
+            eventregistration_id__in=registration_ids
+        ).order_by('pk').values_list('eventregistration_id', 'clubuser_id'):
+            additional.setdefault(registration_id, []).append(member_id)
+        guests = {}
+        for registration_id, guest_id in EventGuest.objects.filter(
+            registration_id__in=registration_ids
+        ).order_by('pk').values_list('registration_id', 'pk'):
+            guests.setdefault(registration_id, []).append(guest_id)
+        member_ids = {member_id for _, _, member_id, _ in batch}
+        for additional_ids in additional.values():
+            member_ids.update(additional_ids)
+        member_types = {}
+        for member_id, member_type_id in MemberTypeLink.objects.filter(
+            clubuser_id__in=member_ids, membertype__is_active=True
+        ).order_by(*type_order).values_list('clubuser_id', 'membertype_id'):
+            member_types.setdefault(member_id, []).append(member_type_id)
+
+        items = []
+        for registration_id, event_id, member_id, total_fee in batch:
+            charged = Decimal('0.00')
+            people = [('primary', member_id)] + [('additional', pk) for pk in additional.get(registration_id, [])]
+            for kind, person_id in people:
+                member_type_id, amount = match(event_id, member_types.get(person_id, []))
+                charged += amount
+                items.append(RegistrationLineItem(
+                    registration_id=registration_id, event_id=event_id, kind=kind,
+                    member_id=person_id, member_type_id=member_type_id, amount=amount,
+                ))
+            # Guests keep their type for the report but were not charged at the time
+            guest_type = guest_types.get(event_id) if event_id in restricted else default_guest_type
+            for guest_id in guests.get(registration_id, []):
+                items.append(RegistrationLineItem(
+                    registration_id=registration_id, event_id=event_id, kind='guest',
+                    guest_id=guest_id, member_type_id=guest_type, amount=0,
+                ))
+            if charged != total_fee:
+                items.append(RegistrationLineItem(
+                    registration_id=registration_id, event_id=event_id, kind='adjustment',
+                    amount=total_fee - charged,
+                ))
+        RegistrationLineItem.objects.bulk_create(items)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CalendarApp', '0012_event_capacity_waitlist'),
+        ('ManagementApp', '0007_clubuser_parent_member_clubuser_relationship_type_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrationLineItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('primary', 'Primary Member'), ('additional', 'Additional Member'), ('guest', 'Guest'), ('adjustment', 'Adjustment')], help_text='Who this line is for', max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, default=0.0, help_text='Fee charged for this person', max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(help_text='Event the fee was charged for', on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='CalendarApp.event')),
+                ('guest', models.ForeignKey(blank=True, help_text='Guest charged (guest lines)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='line_items', to='CalendarApp.eventguest')),
+                ('member', models.ForeignKey(blank=True, help_text='Member charged (primary or additional members)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='registration_line_items', to=settings.AUTH_USER_MODEL)),
+                ('member_type', models.ForeignKey(blank=True, help_text='Member type the fee was resolved from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='registration_line_items', to='ManagementApp.membertype')),
+                ('registration', models.ForeignKey(help_text='Registration this person was registered on', on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='CalendarApp.eventregistration')),
+            ],
+            options={
+                'verbose_name': 'Registration Line Item',
+                'verbose_name_plural': 'Registration Line Items',
+                'ordering': ['registration', 'pk'],
+            },
+        ),
+        migrations.RunPython(create_line_items, migrations.RunPython.noop),
+    ]
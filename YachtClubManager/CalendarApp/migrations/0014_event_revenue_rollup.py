@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_rollups(apps, schema_editor):
+    """Sum the existing line items of confirmed registrations into rollup rows (adjustments add revenue only)"""
+    RegistrationLineItem = apps.get_model('CalendarApp', 'RegistrationLineItem')
+    EventRevenueRollup = apps.get_model('CalendarApp', 'EventRevenueRollup')
+    totals = RegistrationLineItem.objects.filter(
+        registration__cancelled=False, registration__waitlisted=False
+    ).values('event_id', 'member_type_id').annotate(
+        registrants=models.Count('pk', filter=~models.Q(kind='adjustment')), revenue=models.Sum('amount')
+    ).order_by()
+    EventRevenueRollup.objects.bulk_create([EventRevenueRollup(**row) for row in totals], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CalendarApp', '0013_registration_line_items'),
+        ('ManagementApp', '0007_clubuser_parent_member_clubuser_relationship_type_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventRevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registrants', models.PositiveIntegerField(default=0, help_text='People on confirmed registrations')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, help_text='Fees charged to them', max_digits=12)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='CalendarApp.event')),
+                ('member_type', models.ForeignKey(blank=True, help_text='Member type the fees were charged for (empty for people without one)', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='ManagementApp.membertype')),
+            ],
+            options={
+                'verbose_name': 'Event Revenue Rollup',
+                'verbose_name_plural': 'Event Revenue Rollups',
+                'constraints': [models.UniqueConstraint(fields=('event', 'member_type'), name='calendar_rollup_event_member_type', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CalendarApp', '0014_event_revenue_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='eventactionlog',
+            name='CalendarApp_timesta_0572a6_idx',
+        ),
+        migrations.AddIndex(
+            model_name='eventactionlog',
+            index=models.Index(fields=['-timestamp', '-id'], name='CalendarApp_timesta_47c4ca_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CalendarApp', '0015_eventactionlog_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='eventactionlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,16 @@
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CalendarApp', '0016_eventactionlog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventactionlog',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='calendar_actionlog_ts_brin'),
+        ),
+    ]
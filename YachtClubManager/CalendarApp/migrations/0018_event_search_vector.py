@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:49
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+
+def populate_search_documents(apps, schema_editor):
+    """Fill in the plain-text description of existing events (the vector follows on its own)"""
+    Event = apps.get_model('CalendarApp', 'Event')
+    events = list(Event.objects.exclude(formatted_description__isnull=True).exclude(formatted_description='').only(
+        'pk', 'formatted_description'
+    ))
+    for event in events:
+        event.search_document = ' '.join(strip_tags(event.formatted_description).split())
+    Event.objects.bulk_update(events, ['search_document'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CalendarApp', '0017_eventactionlog_timestamp_brin'),
+        ('DocumentManagement', '0004_effectivefolderpermission'),
+        ('ManagementApp', '0009_clubuser_search_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('title', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('short_description', 'search_document', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='CalendarApp_search__8683b1_gin'),
+        ),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
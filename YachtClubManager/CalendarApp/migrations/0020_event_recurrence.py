@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-16 21:01
+
+import django.contrib.postgres.fields
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CalendarApp', '0019_calendar_feed_token'),
+        ('DocumentManagement', '0004_effectivefolderpermission'),
+        ('ManagementApp', '0009_clubuser_search_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventRecurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequency', models.CharField(choices=[('DAILY', 'Daily'), ('WEEKLY', 'Weekly'), ('MONTHLY', 'Monthly')], default='WEEKLY', max_length=7)),
+                ('interval', models.PositiveSmallIntegerField(default=1, help_text='Repeat every this many days, weeks or months', validators=[django.core.validators.MinValueValidator(1)])),
+                ('weekdays', django.contrib.postgres.fields.ArrayField(base_field=models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')]), blank=True, default=list, help_text="Days of the week a weekly event falls on. Leave empty to use the first event's day.", size=None)),
+                ('count', models.PositiveIntegerField(blank=True, help_text='Total number of occurrences, including the first. Leave blank to repeat indefinitely.', null=True, validators=[django.core.validators.MinValueValidator(1)])),
+                ('until', models.DateField(blank=True, help_text='Last date an occurrence may fall on', null=True)),
+                ('excluded_dates', django.contrib.postgres.fields.ArrayField(base_field=models.DateField(), blank=True, default=list, editable=False, size=None)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Event Recurrence',
+            },
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='occurrence_date',
+            field=models.DateField(blank=True, editable=False, help_text='Date of the series occurrence this event stands in for', null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='series',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Recurring event this occurrence was materialized from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='CalendarApp.event'),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(fields=('series', 'occurrence_date'), name='calendar_event_unique_occurrence'),
+        ),
+        migrations.AddField(
+            model_name='eventrecurrence',
+            name='event',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recurrence', to='CalendarApp.event'),
+        ),
+    ]
@@ -1,5 +1,14 @@
-from django.db import models
+import secrets
+
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.validators import MinValueValidator
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Q, Sum
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import strip_tags
 from django.contrib.auth import get_user_model
 from django_ckeditor_5.fields import CKEditor5Field
 from ManagementApp.models import MemberType
@@ -84,6 +93,55 @@ class Event(models.Model):
         blank=True,
         help_text='Documents from Document Management that are linked to this event'
     )
+    capacity = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Maximum number of people (members, dependents and guests). Leave blank for unlimited.'
+    )
+    # Seat ledger for capacity checks - only changed through reserve_seats()/release_seats()
+    seats_taken = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text='Seats held by confirmed registrations'
+    )
+    # Denormalized registration counters, maintained by CalendarApp.signals
+    active_registration_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text='Number of confirmed (non-cancelled, non-waitlisted) registrations'
+    )
+    total_registrant_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text='Number of people on confirmed registrations (primary plus additional members)'
+    )
+    # Set on an occurrence of a recurring event once it is materialized for a registration or an edit
+    series = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='occurrences',
+        help_text='Recurring event this occurrence was materialized from'
+    )
+    occurrence_date = models.DateField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Date of the series occurrence this event stands in for'
+    )
+    # Plain text of formatted_description, refreshed on save, for full-text search
+    search_document = models.TextField(blank=True, editable=False)
+    # Title weighted above the descriptions; kept by the database (see CalendarApp.search)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config='english')
+            + SearchVector('short_description', 'search_document', weight='B', config='english')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -92,12 +150,42 @@ class Event(models.Model):
         indexes = [
             models.Index(fields=['start_datetime', 'end_datetime']),
             models.Index(fields=['category']),
+            GinIndex(fields=['search_vector']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'occurrence_date'], name='calendar_event_unique_occurrence'),
+        ]
+
+    # Maintained with atomic F() updates, so never written back from a possibly stale instance
+    LEDGER_FIELDS = {'seats_taken', 'active_registration_count', 'total_registrant_count'}
 
     def __str__(self):
         return f"{self.title} - {self.start_datetime.strftime('%Y-%m-%d')}"
 
+    def save(self, *args, **kwargs):
+        """Save the event without overwriting the seat ledger and registration counters"""
+        self.search_document = self.build_search_document(self.formatted_description)
+        update_fields = kwargs.get('update_fields')
+        if not self._state.adding and update_fields is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated and field.name not in self.LEDGER_FIELDS
+            ]
+        elif update_fields is not None and 'formatted_description' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_document'}
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def build_search_document(formatted_description):
+        """Text of the rich-text description without its HTML, for the search vector"""
+        return ' '.join(strip_tags(formatted_description or '').split())
+
     def get_absolute_url(self):
+        if self.pk is None and self.series_id:
+            # An occurrence expanded from a series but not stored yet
+            return reverse('calendar:event_occurrence', kwargs={
+                'pk': self.series_id, 'occurrence_date': self.occurrence_date,
+            })
         return reverse('calendar:event_detail', kwargs={'pk': self.pk})
 
     @property
@@ -145,25 +233,95 @@ class Event(models.Model):
         return True
     
     def is_registered(self, user):
-        """Check if a user is registered for this event"""
+        """Check if a user is registered (or waitlisted) for this event"""
         if not user or not user.is_authenticated:
             return False
         return self.registrations.filter(member=user, cancelled=False).exists()
     
+    def get_user_registration(self, user):
+        """Get the user's active (confirmed or waitlisted) registration, if any"""
+        if not user or not user.is_authenticated:
+            return None
+        return self.registrations.filter(member=user, cancelled=False).first()
+    
+    @property
+    def seats_available(self):
+        """Number of free seats, or None when the event has no capacity limit"""
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.seats_taken, 0)
+    
+    @classmethod
+    def reserve_seats(cls, event_id, seats):
+        """
+        Atomically take seats if they fit within capacity.
+        
+        The capacity check and the increment are one conditional UPDATE, so
+        concurrent registrations can never overbook. Returns True on success.
+        """
+        return cls.objects.filter(pk=event_id).filter(
+            Q(capacity__isnull=True) | Q(capacity__gte=F('seats_taken') + seats)
+        ).update(seats_taken=F('seats_taken') + seats) == 1
+    
+    @classmethod
+    def release_seats(cls, event_id, seats):
+        """Atomically give seats back"""
+        cls.objects.filter(pk=event_id, seats_taken__gte=seats).update(seats_taken=F('seats_taken') - seats)
+    
+    def promote_waitlist(self):
+        """
+        Confirm waitlisted registrations in FIFO order while their seats fit.
+        
+        Stops at the first entry that does not fit, so nobody is overtaken by a
+        smaller party. Returns the promoted registrations.
+        """
+        promoted = []
+        with transaction.atomic():
+            waitlist = self.registrations.select_for_update().filter(
+                cancelled=False, waitlisted=True
+            ).order_by('registered_at', 'pk')
+            for registration in waitlist:
+                if not Event.reserve_seats(self.pk, registration.seat_count):
+                    break
+                registration.waitlisted = False
+                registration.save(update_fields=['waitlisted', 'updated_at'])
+                promoted.append(registration)
+        return promoted
+    
     def get_registration_count(self):
         """Get the count of active registrations (primary members only)"""
-        return self.registrations.filter(cancelled=False).count()
+        return self.active_registration_count
     
     def get_total_registrants_count(self):
         """Get the total count of all registrants (primary + additional members) for non-cancelled registrations"""
-        from django.db.models import Count
-        active_registrations = self.registrations.filter(cancelled=False)
-        primary_count = active_registrations.count()  # Primary members
-        # Count additional members using aggregation to avoid N+1 queries
-        additional_count = active_registrations.aggregate(
-            total_additional=Count('additional_members')
-        )['total_additional'] or 0
-        return primary_count + additional_count
+        return self.total_registrant_count
+    
+    @classmethod
+    def recount_registrations(cls, events=None):
+        """Recompute the registration counters and seat ledger from the registration rows in one UPDATE"""
+        from django.db.models import Count, OuterRef, Subquery, Sum, Value
+        from django.db.models.functions import Coalesce
+        
+        confirmed = EventRegistration.objects.filter(
+            event=OuterRef('pk'), cancelled=False, waitlisted=False
+        ).order_by().values('event')
+        additional = EventRegistration.additional_members.through.objects.filter(
+            eventregistration__event=OuterRef('pk'),
+            eventregistration__cancelled=False,
+            eventregistration__waitlisted=False,
+        ).order_by().values('eventregistration__event')
+        registration_count = Coalesce(Subquery(confirmed.annotate(n=Count('pk')).values('n')), Value(0))
+        additional_count = Coalesce(Subquery(additional.annotate(n=Count('pk')).values('n')), Value(0))
+        seat_count = Coalesce(Subquery(confirmed.annotate(n=Sum('seat_count')).values('n')), Value(0))
+        
+        queryset = cls.objects.all() if events is None else cls.objects.filter(pk__in=[
+            event.pk if isinstance(event, cls) else event for event in events
+        ])
+        return queryset.update(
+            active_registration_count=registration_count,
+            total_registrant_count=registration_count + additional_count,
+            seats_taken=seat_count,
+        )
     
     def get_allowed_member_types(self):
         """Get member types allowed to register for this event"""
@@ -179,6 +337,103 @@ class Event(models.Model):
         return self.allowed_member_types.filter(pk=member_type.pk, is_active=True).exists()
 
 
+class EventRecurrence(models.Model):
+    """
+    Repeat rule of a recurring event, a subset of the iCalendar RRULE
+
+    The event is the series' first occurrence and the template for the others, which
+    are expanded on demand (see CalendarApp.recurrence) and only stored as events of
+    their own once someone registers for or edits one.
+    """
+    DAILY = 'DAILY'
+    WEEKLY = 'WEEKLY'
+    MONTHLY = 'MONTHLY'
+    FREQUENCY_CHOICES = [
+        (DAILY, 'Daily'),
+        (WEEKLY, 'Weekly'),
+        (MONTHLY, 'Monthly'),
+    ]
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    # iCalendar BYDAY codes, indexed like WEEKDAY_CHOICES
+    WEEKDAY_CODES = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, related_name='recurrence')
+    frequency = models.CharField(max_length=7, choices=FREQUENCY_CHOICES, default=WEEKLY)
+    interval = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        help_text='Repeat every this many days, weeks or months'
+    )
+    weekdays = ArrayField(
+        models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES),
+        default=list,
+        blank=True,
+        help_text="Days of the week a weekly event falls on. Leave empty to use the first event's day."
+    )
+    count = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1)],
+        help_text='Total number of occurrences, including the first. Leave blank to repeat indefinitely.'
+    )
+    until = models.DateField(null=True, blank=True, help_text='Last date an occurrence may fall on')
+    # EXDATE: dates left out of the series, including those of deleted occurrences
+    excluded_dates = ArrayField(models.DateField(), default=list, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Event Recurrence'
+
+    def __str__(self):
+        return f"{self.event.title} ({self.describe()})"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Every occurrence is rendered from the series event, so its validators and cached cards must move too
+        Event.objects.filter(pk=self.event_id).update(updated_at=timezone.now())
+
+    def describe(self):
+        """Plain-English summary of the rule, e.g. Every 2 weeks on Wednesday until Sep 30, 2026"""
+        unit = {self.DAILY: 'day', self.WEEKLY: 'week', self.MONTHLY: 'month'}[self.frequency]
+        summary = f'Every {unit}' if self.interval == 1 else f'Every {self.interval} {unit}s'
+        if self.frequency == self.WEEKLY and self.weekdays:
+            names = dict(self.WEEKDAY_CHOICES)
+            summary += ' on ' + ', '.join(names[day] for day in sorted(set(self.weekdays)))
+        if self.until:
+            summary += f' until {self.until:%b %d, %Y}'
+        elif self.count:
+            summary += f', {self.count} times'
+        return summary
+
+    @property
+    def rrule(self):
+        """The rule as an iCalendar RRULE value (UNTIL is left to the feed, which knows the DTSTART form)"""
+        parts = [f'FREQ={self.frequency}', f'INTERVAL={self.interval}']
+        if self.frequency == self.WEEKLY and self.weekdays:
+            parts.append('BYDAY=' + ','.join(self.WEEKDAY_CODES[day] for day in sorted(set(self.weekdays))))
+        if self.count:
+            parts.append(f'COUNT={self.count}')
+        return ';'.join(parts)
+
+    def exclude(self, day):
+        """Leave one date out of the series"""
+        with transaction.atomic():
+            recurrence = EventRecurrence.objects.select_for_update().get(pk=self.pk)
+            if day not in recurrence.excluded_dates:
+                recurrence.excluded_dates.append(day)
+                recurrence.save(update_fields=['excluded_dates', 'updated_at'])
+            self.excluded_dates = recurrence.excluded_dates
+
+
 class EventRegistrationFee(models.Model):
     """Fee for a specific member type for an event"""
     event = models.ForeignKey(
@@ -265,6 +520,11 @@ class EventRegistration(models.Model):
     registered_at = models.DateTimeField(auto_now_add=True, help_text='When the member registered')
     cancelled = models.BooleanField(default=False, help_text='Whether the registration was cancelled')
     cancelled_at = models.DateTimeField(null=True, blank=True, help_text='When the registration was cancelled')
+    waitlisted = models.BooleanField(default=False, help_text='Waiting for seats to free up (the event was full)')
+    seat_count = models.PositiveIntegerField(
+        default=1,
+        help_text='Seats this registration needs (primary member, additional members and guests)'
+    )
     notes = models.TextField(blank=True, help_text='Additional notes about the registration')
     total_fee = models.DecimalField(
         max_digits=10,
@@ -279,6 +539,7 @@ class EventRegistration(models.Model):
         ordering = ['registered_at']
         indexes = [
             models.Index(fields=['event', 'cancelled']),
+            models.Index(fields=['event', 'waitlisted', 'registered_at']),
             models.Index(fields=['member']),
             models.Index(fields=['registered_at']),
         ]
@@ -286,9 +547,26 @@ class EventRegistration(models.Model):
         verbose_name_plural = 'Event Registrations'
     
     def __str__(self):
-        status = "Cancelled" if self.cancelled else "Registered"
+        if self.cancelled:
+            status = "Cancelled"
+        elif self.waitlisted:
+            status = "Waitlisted"
+        else:
+            status = "Registered"
         return f"{self.member.get_full_name()} - {self.event.title} ({status})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored state so the counter signals can detect confirmation changes
+        instance._loaded_confirmed = instance.is_confirmed
+        return instance
+    
+    @property
+    def is_confirmed(self):
+        """Whether this registration currently holds its seats"""
+        return not self.cancelled and not self.waitlisted
+    
     def get_all_registrants(self):
         """Get all members registered (primary + additional)"""
         registrants = [self.member]
@@ -300,11 +578,195 @@ class EventRegistration(models.Model):
         return 1 + self.additional_members.count()
     
     def cancel(self):
-        """Cancel this registration"""
-        from django.utils import timezone
-        self.cancelled = True
-        self.cancelled_at = timezone.now()
-        self.save()
+        """Cancel this registration, freeing its seats for the waitlist"""
+        with transaction.atomic():
+            # Lock the row so a double submit cannot release the seats twice
+            current = EventRegistration.objects.select_for_update().get(pk=self.pk)
+            held_seats = current.seat_count if current.is_confirmed else 0
+            if not current.cancelled:
+                current.cancelled = True
+                current.cancelled_at = timezone.now()
+                current.save(update_fields=['cancelled', 'cancelled_at', 'updated_at'])
+            self.cancelled, self.cancelled_at, self.waitlisted = current.cancelled, current.cancelled_at, current.waitlisted
+            self._loaded_confirmed = False
+            
+            if held_seats:
+                Event.release_seats(self.event_id, held_seats)
+                self.event.promote_waitlist()
+
+
+class RegistrationLineItem(models.Model):
+    """
+    Fee charged for one person on a registration, fixed at the time they registered.
+    
+    Registrations made before line items existed were backfilled with an ADJUSTMENT
+    line where needed, so their line items still add up to the stored total_fee.
+    """
+    PRIMARY = 'primary'
+    ADDITIONAL = 'additional'
+    GUEST = 'guest'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (PRIMARY, 'Primary Member'),
+        (ADDITIONAL, 'Additional Member'),
+        (GUEST, 'Guest'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+    
+    registration = models.ForeignKey(
+        EventRegistration,
+        on_delete=models.CASCADE,
+        related_name='line_items',
+        help_text='Registration this person was registered on'
+    )
+    # Denormalized from the registration so revenue can be aggregated per event without a join
+    event = models.ForeignKey(
+        Event,
+        on_delete=models.CASCADE,
+        related_name='line_items',
+        help_text='Event the fee was charged for'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, help_text='Who this line is for')
+    member = models.ForeignKey(
+        ClubUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='registration_line_items',
+        help_text='Member charged (primary or additional members)'
+    )
+    guest = models.ForeignKey(
+        EventGuest,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='line_items',
+        help_text='Guest charged (guest lines)'
+    )
+    member_type = models.ForeignKey(
+        MemberType,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='registration_line_items',
+        help_text='Member type the fee was resolved from'
+    )
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0.00,
+        help_text='Fee charged for this person'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['registration', 'pk']
+        verbose_name = 'Registration Line Item'
+        verbose_name_plural = 'Registration Line Items'
+    
+    def __str__(self):
+        return f"{self.get_kind_display()}: ${self.amount}"
+
+
+class EventRevenueRollup(models.Model):
+    """
+    Confirmed registrants and fee revenue per event and member type, summed from line items.
+    
+    Kept current by CalendarApp.signals so the reports dashboard can GROUP BY a few
+    thousand rollup rows instead of every line item ever written. A registration
+    becoming confirmed or unconfirmed shifts the rows by its own line items; refresh()
+    recomputes whole events for backfills and repairs.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='revenue_rollups')
+    member_type = models.ForeignKey(
+        MemberType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='revenue_rollups',
+        help_text='Member type the fees were charged for (empty for people without one)'
+    )
+    registrants = models.PositiveIntegerField(default=0, help_text='People on confirmed registrations')
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0.00, help_text='Fees charged to them')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['event', 'member_type'], nulls_distinct=False, name='calendar_rollup_event_member_type'
+            ),
+        ]
+        verbose_name = 'Event Revenue Rollup'
+        verbose_name_plural = 'Event Revenue Rollups'
+    
+    def __str__(self):
+        return f"{self.event_id} / {self.member_type_id}: {self.registrants} (${self.revenue})"
+    
+    @staticmethod
+    def _totals(line_items):
+        """Rollup rows of the given line items, as dicts ready for cls(**row); adjustments add revenue only"""
+        return line_items.values('event_id', 'member_type_id').annotate(
+            registrants=Count('pk', filter=~Q(kind=RegistrationLineItem.ADJUSTMENT)), revenue=Sum('amount')
+        ).order_by()
+    
+    @classmethod
+    def registration_totals(cls, registration_id):
+        """Rollup rows contributed by one registration's line items"""
+        return list(cls._totals(RegistrationLineItem.objects.filter(registration_id=registration_id)))
+    
+    @classmethod
+    def apply(cls, totals, sign=1):
+        """
+        Add (sign=1) or subtract (sign=-1) rollup rows with F() upserts.
+        
+        Each row is one UPDATE of a single (event, member type) row, so concurrent
+        registrations do not wait on each other or on the event row. Rows left empty
+        are removed.
+        """
+        for row in totals:
+            rows = cls.objects.filter(event_id=row['event_id'], member_type_id=row['member_type_id'])
+            changes = {
+                'registrants': F('registrants') + sign * row['registrants'],
+                'revenue': F('revenue') + sign * row['revenue'],
+            }
+            if rows.update(**changes) or sign < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(**row)
+            except IntegrityError:
+                # A concurrent registration created the row first
+                rows.update(**changes)
+        if sign < 0:
+            for row in totals:
+                cls.objects.filter(
+                    event_id=row['event_id'], member_type_id=row['member_type_id'], registrants=0, revenue=0
+                ).delete()
+    
+    @classmethod
+    def schedule_apply(cls, registration_id, sign=1):
+        """Apply a registration's line items once the current transaction (and its line items) commits"""
+        transaction.on_commit(lambda: cls.apply(cls.registration_totals(registration_id), sign))
+    
+    @classmethod
+    def refresh(cls, event_ids=None):
+        """Recompute the rollup rows of the given events (default: all) with one GROUP BY"""
+        line_items = RegistrationLineItem.objects.filter(registration__cancelled=False, registration__waitlisted=False)
+        stale = cls.objects.all()
+        with transaction.atomic():
+            if event_ids is not None:
+                event_ids = list(event_ids)
+                # Serialize refreshes of the same event so they cannot interleave delete and insert
+                list(Event.objects.select_for_update().filter(pk__in=event_ids).values_list('pk', flat=True))
+                line_items = line_items.filter(event_id__in=event_ids)
+                stale = stale.filter(event_id__in=event_ids)
+            totals = cls._totals(line_items)
+            stale.delete()
+            cls.objects.bulk_create([cls(**row) for row in totals], batch_size=5000)
+    
+    @classmethod
+    def schedule_refresh(cls, event_id):
+        """Refresh one event's rollup after the current transaction commits"""
+        transaction.on_commit(lambda: cls.refresh([event_id]))
 
 
 class EventContact(models.Model):
@@ -361,14 +823,18 @@ class EventActionLog(models.Model):
         blank=True,
         help_text='Additional event data at time of action (for deleted events)'
     )
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the action happens, not when CalendarApp.audit gets round to writing it
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.CharField(max_length=255, blank=True)
     
     class Meta:
         ordering = ['-timestamp']
         indexes = [
-            models.Index(fields=['-timestamp']),
+            # Matches the (timestamp, id) keyset the action log pages on
+            models.Index(fields=['-timestamp', '-id']),
+            # Block-range index for the time-range scans of pruning and archiving
+            BrinIndex(fields=['timestamp'], name='calendar_actionlog_ts_brin'),
             models.Index(fields=['user']),
             models.Index(fields=['action']),
         ]
@@ -379,3 +845,40 @@ class EventActionLog(models.Model):
         event_ref = self.event.title if self.event else self.event_title
         user_name = self.user.get_full_name() if self.user else "Unknown User"
         return f"{user_name} {self.get_action_display()} '{event_ref}' on {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
+
+
+def generate_feed_key():
+    return secrets.token_urlsafe(32)
+
+
+class CalendarFeedToken(models.Model):
+    """Secret key in a member's calendar subscription links, so calendar apps can poll the ICS feeds without a session"""
+    user = models.OneToOneField(
+        ClubUser,
+        on_delete=models.CASCADE,
+        related_name='calendar_feed_token',
+        help_text='Member whose subscription links carry this key'
+    )
+    key = models.CharField(max_length=64, unique=True, default=generate_feed_key, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Calendar feed token for {self.user.get_full_name()}"
+
+    @classmethod
+    def for_user(cls, user):
+        """The member's current token, created on first use"""
+        token, _ = cls.objects.get_or_create(user=user)
+        return token
+
+    @classmethod
+    def revoke(cls, user):
+        """Invalidate every subscription link the member has handed out"""
+        cls.objects.filter(user=user).delete()
+
+    @classmethod
+    def rotate(cls, user):
+        """Replace the member's token, so old links stop working and new ones can be shared"""
+        with transaction.atomic():
+            cls.revoke(user)
+            return cls.objects.create(user=user)
@@ -0,0 +1,204 @@
+"""
+Recurring event series
+
+A recurring event is one Event row (the series' first occurrence, which every other
+occurrence copies) plus an EventRecurrence rule. The other occurrences are not
+stored: expand_occurrences works out the ones overlapping a requested window from
+the rule, so storage is one row per series and the calendar feed's cost follows
+the window on screen rather than the length of the series.
+
+An occurrence becomes an Event row of its own (series and occurrence_date set)
+only when someone registers for it or edits it (materialize_occurrence). From
+then on that row replaces the expansion for its date. Deleting a materialized
+occurrence adds its date to the rule's excluded dates so it does not come back.
+"""
+import copy
+from datetime import date, datetime, timedelta
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Q
+from django.db.models.base import ModelState
+from django.utils import timezone
+
+from .models import Event, EventContact, EventRecurrence, EventRegistrationFee
+
+# Occurrences listed on a series' detail page
+UPCOMING_OCCURRENCES = 5
+# Longest window expand_occurrences serves: a year view plus its padding weeks. An
+# open-ended daily series would otherwise copy out one event per day of any window
+MAX_EXPANSION_WINDOW = timedelta(days=400)
+
+
+def _month_date(first_date, months):
+    """first_date moved on by a number of months, or None when that month has no such day"""
+    month_index = first_date.month - 1 + months
+    try:
+        return date(first_date.year + month_index // 12, month_index % 12 + 1, first_date.day)
+    except ValueError:
+        return None
+
+
+def occurrence_dates(recurrence, first_date, start=None, end=None):
+    """
+    Dates of a series in order, from its first date up to the rule's end, limited to
+    the range start..end (inclusive) when given. Excluded dates are left out but
+    still count towards the rule's count, as EXDATE does.
+    """
+    interval = recurrence.interval
+    weekdays = sorted(set(recurrence.weekdays)) or [first_date.weekday()]
+    period = 0
+    if start is not None and recurrence.count is None and start > first_date:
+        # Without a count there is nothing to tally, so skip straight to the range
+        if recurrence.frequency == EventRecurrence.MONTHLY:
+            months = (start.year - first_date.year) * 12 + start.month - first_date.month
+            period = max(0, months // interval - 1)
+        else:
+            days = interval * (7 if recurrence.frequency == EventRecurrence.WEEKLY else 1)
+            period = max(0, (start - first_date).days // days - 1)
+    index = 0
+    while True:
+        if recurrence.frequency == EventRecurrence.DAILY:
+            candidates = [first_date + timedelta(days=period * interval)]
+        elif recurrence.frequency == EventRecurrence.WEEKLY:
+            week = first_date - timedelta(days=first_date.weekday()) + timedelta(weeks=period * interval)
+            candidates = [week + timedelta(days=weekday) for weekday in weekdays]
+        else:
+            candidates = [day for day in [_month_date(first_date, period * interval)] if day]
+        for day in candidates:
+            if day < first_date:
+                continue
+            if (recurrence.until and day > recurrence.until) or (end and day > end):
+                return
+            if recurrence.count is not None and index >= recurrence.count:
+                return
+            index += 1
+            if (start is None or day >= start) and day not in recurrence.excluded_dates:
+                yield day
+        period += 1
+
+
+def is_occurrence(series, day):
+    """Whether day is an expandable (not the first, not excluded) date of a recurring event"""
+    recurrence = getattr(series, 'recurrence', None)
+    if recurrence is None:
+        return False
+    first_date = timezone.localtime(series.start_datetime).date()
+    return day != first_date and day in occurrence_dates(recurrence, first_date, start=day, end=day)
+
+
+def occurrence_start(series, day):
+    """Start of the occurrence on day, at the first event's wall-clock time"""
+    local_start = timezone.localtime(series.start_datetime)
+    return timezone.make_aware(datetime.combine(day, local_start.time()))
+
+
+def make_occurrence(series, day):
+    """Unsaved copy of a series' event moved to day, standing in for an occurrence that is not stored"""
+    occurrence = copy.copy(series)
+    occurrence._state = ModelState()
+    # Keep the select_related category, but not the series' own reverse relations
+    occurrence._state.fields_cache = {
+        name: value for name, value in series._state.fields_cache.items() if name == 'category'
+    }
+    occurrence.__dict__.pop('_prefetched_objects_cache', None)
+    occurrence.pk = None
+    occurrence.series_id = series.pk
+    occurrence.occurrence_date = day
+    shift = occurrence_start(series, day) - series.start_datetime
+    occurrence.start_datetime = series.start_datetime + shift
+    occurrence.end_datetime = series.end_datetime + shift
+    if series.registration_open_datetime:
+        occurrence.registration_open_datetime = series.registration_open_datetime + shift
+    return occurrence
+
+
+def expand_occurrences(window_start, window_end, series=None):
+    """
+    Unsaved occurrences of recurring events overlapping window_start..window_end, in
+    start order. series narrows the recurring events considered (e.g. by category).
+    The first occurrence and materialized ones are ordinary events, so they are not
+    included. Runs one query.
+    
+    Raises ValueError for windows longer than MAX_EXPANSION_WINDOW.
+    """
+    if window_end - window_start > MAX_EXPANSION_WINDOW:
+        raise ValueError(f'Window is longer than {MAX_EXPANSION_WINDOW.days} days')
+    if series is None:
+        series = Event.objects.all()
+    # An occurrence starting up to one event-length before the window can still overlap it
+    first_day = timezone.localtime(window_start).date() - timedelta(days=1)
+    last_day = timezone.localtime(window_end).date()
+    materialized = Event.objects.filter(
+        series=OuterRef('pk'), occurrence_date__gte=first_day, occurrence_date__lte=last_day
+    ).values('occurrence_date')
+    series = series.filter(
+        recurrence__isnull=False, start_datetime__lt=window_end,
+    ).filter(
+        Q(recurrence__until__isnull=True) | Q(recurrence__until__gte=first_day)
+    ).select_related('category', 'recurrence').defer(
+        'formatted_description', 'search_document', 'search_vector'
+    ).annotate(materialized_dates=ArraySubquery(materialized))
+
+    occurrences = []
+    for event in series:
+        duration_days = event.duration.days + 1
+        first_date = timezone.localtime(event.start_datetime).date()
+        skip = set(event.materialized_dates) | {first_date}
+        for day in occurrence_dates(event.recurrence, first_date, first_day - timedelta(days=duration_days), last_day):
+            if day in skip:
+                continue
+            occurrence = make_occurrence(event, day)
+            if occurrence.start_datetime < window_end and occurrence.end_datetime > window_start:
+                occurrences.append(occurrence)
+    occurrences.sort(key=lambda occurrence: (occurrence.start_datetime, occurrence.series_id))
+    return occurrences
+
+
+def upcoming_occurrences(series, limit=UPCOMING_OCCURRENCES):
+    """The next few expandable dates of a recurring event, as (date, start) pairs"""
+    recurrence = getattr(series, 'recurrence', None)
+    if recurrence is None:
+        return []
+    first_date = timezone.localtime(series.start_datetime).date()
+    materialized = set(series.occurrences.values_list('occurrence_date', flat=True))
+    upcoming = []
+    for day in occurrence_dates(recurrence, first_date, start=max(timezone.localdate(), first_date)):
+        if day == first_date or day in materialized:
+            continue
+        upcoming.append((day, occurrence_start(series, day)))
+        if len(upcoming) == limit:
+            break
+    return upcoming
+
+
+def materialize_occurrence(series, day):
+    """
+    The Event row for one occurrence of a series, created on first use with the
+    series' contacts, fees, allowed member types and linked documents
+    """
+    existing = series.occurrences.filter(occurrence_date=day).first()
+    if existing is not None:
+        return existing
+    occurrence = make_occurrence(series, day)
+    occurrence.seats_taken = occurrence.active_registration_count = occurrence.total_registrant_count = 0
+    try:
+        with transaction.atomic():
+            occurrence.save()
+            occurrence.allowed_member_types.set(series.allowed_member_types.all())
+            occurrence.linked_documents.set(series.linked_documents.all())
+            EventContact.objects.bulk_create([
+                EventContact(
+                    event=occurrence, member_id=contact.member_id, is_primary=contact.is_primary,
+                    responsibilities=contact.responsibilities,
+                )
+                for contact in series.event_contacts.all()
+            ])
+            EventRegistrationFee.objects.bulk_create([
+                EventRegistrationFee(event=occurrence, member_type_id=fee.member_type_id, fee_amount=fee.fee_amount)
+                for fee in series.registration_fees.all()
+            ])
+    except IntegrityError:
+        # Someone else materialized the same occurrence first
+        return series.occurrences.get(occurrence_date=day)
+    return occurrence
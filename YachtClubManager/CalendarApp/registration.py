@@ -0,0 +1,114 @@
+"""
+Cached registration rules for events
+
+When registration opens for a popular event every member hits event_register at
+once. Status and opening time come with the event row itself, but the allowed
+member types cost extra queries and rarely change, so they are read once into an
+immutable RegistrationRules snapshot and shared through the cache until the event
+or the member types involved are edited (see CalendarApp.signals). Fees are cached
+the same way by CalendarApp.fees.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from ManagementApp.models import ClubUser, MemberType
+
+RULES_CACHE_KEY = 'calendar:registration-rules:v2:{event_id}'
+DEFAULT_GUEST_TYPE_CACHE_KEY = 'calendar:default-guest-member-type'
+# Snapshots are invalidated on every edit, so the timeout only bounds memory use
+RULES_CACHE_TIMEOUT = getattr(settings, 'REGISTRATION_RULES_CACHE_TIMEOUT', 60 * 60 * 6)
+
+
+@dataclass(frozen=True)
+class RegistrationRules:
+    """Allowed member types for an event, as checked by every registration"""
+    event_id: int
+    # True when the event limits registration to allowed_member_type_ids
+    restricted: bool
+    allowed_member_type_ids: frozenset
+    guests_allowed: bool
+    # Allowed member type guest line items are recorded as (restricted events only)
+    allowed_guest_member_type_id: int | None
+
+    @classmethod
+    def build(cls, event):
+        """Read the rules for an event from the database"""
+        allowed = list(event.allowed_member_types.values_list('pk', 'is_active', 'name'))
+        active_allowed = [(pk, name) for pk, is_active, name in allowed if is_active]
+        return cls(
+            event_id=event.pk,
+            restricted=bool(allowed),
+            allowed_member_type_ids=frozenset(pk for pk, _ in active_allowed),
+            # Guests need a "Guest" member type when the event restricts member types
+            guests_allowed=not allowed or any('guest' in name.lower() for _, name in active_allowed),
+            allowed_guest_member_type_id=next((pk for pk, name in active_allowed if 'guest' in name.lower()), None),
+        )
+
+    @property
+    def guest_member_type_id(self):
+        """Member type guest line items are recorded as, or None if there is none"""
+        if self.restricted:
+            return self.allowed_guest_member_type_id
+        return get_default_guest_member_type_id()
+
+    def allows(self, member_type_ids):
+        """Check whether any of the given member types may register"""
+        if not self.restricted:
+            return True
+        return not self.allowed_member_type_ids.isdisjoint(member_type_ids)
+
+
+def get_registration_rules(event):
+    """Return the cached rules for an event, building and caching them on a miss"""
+    key = RULES_CACHE_KEY.format(event_id=event.pk)
+    rules = cache.get(key)
+    if rules is None:
+        rules = RegistrationRules.build(event)
+        cache.set(key, rules, RULES_CACHE_TIMEOUT)
+    return rules
+
+
+def prewarm_registration_rules(events):
+    """Build and cache the rules for several events at once; returns how many were cached"""
+    rules = {RULES_CACHE_KEY.format(event_id=event.pk): RegistrationRules.build(event) for event in events}
+    cache.set_many(rules, RULES_CACHE_TIMEOUT)
+    return len(rules)
+
+
+def invalidate_registration_rules(event_ids):
+    """Drop cached rules now and again on commit, in case a request re-cached the old rows meanwhile"""
+    keys = [RULES_CACHE_KEY.format(event_id=event_id) for event_id in event_ids]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_default_guest_member_type_id():
+    """The first active "Guest" member type, used for guests of events that allow every member type"""
+    member_type_id = cache.get(DEFAULT_GUEST_TYPE_CACHE_KEY)
+    if member_type_id is None:
+        member_type_id = MemberType.objects.filter(
+            is_active=True, name__icontains='guest'
+        ).values_list('pk', flat=True).first() or 0
+        cache.set(DEFAULT_GUEST_TYPE_CACHE_KEY, member_type_id, RULES_CACHE_TIMEOUT)
+    return member_type_id or None
+
+
+def invalidate_default_guest_member_type():
+    """Forget the default guest member type after member types change"""
+    cache.delete(DEFAULT_GUEST_TYPE_CACHE_KEY)
+    transaction.on_commit(lambda: cache.delete(DEFAULT_GUEST_TYPE_CACHE_KEY))
+
+
+def active_member_type_ids(members):
+    """Map member id -> active member type ids (in display order) for several members in one query"""
+    links = ClubUser.member_types.through.objects.filter(
+        clubuser__in=members, membertype__is_active=True
+    ).order_by('membertype__display_order', 'membertype__name').values_list('clubuser_id', 'membertype_id')
+    type_ids = {}
+    for member_id, member_type_id in links:
+        type_ids.setdefault(member_id, []).append(member_type_id)
+    return type_ids
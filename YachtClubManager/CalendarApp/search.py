@@ -0,0 +1,106 @@
+"""
+Full-text event search
+
+Events carry a weighted tsvector (Event.search_vector, title above the short and
+formatted descriptions) that PostgreSQL keeps up to date and answers from a GIN
+index. A search runs two queries: one grouped count of the matches by category
+and year, which yields both facet lists and the total, and one for the ranked page.
+A year typed into the query ("2019 Fall Cruise") is used as the year filter
+rather than as a word the event text must contain.
+"""
+import re
+from dataclasses import dataclass, field
+from math import ceil
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Count, F
+from django.db.models.functions import ExtractYear
+
+from .models import Event
+
+EVENT_SEARCH_PAGE_SIZE = 20
+YEAR_TOKEN = re.compile(r'\b(?:19|20)\d{2}\b')
+
+
+@dataclass
+class EventSearchResults:
+    """One page of ranked matches with category and year facet counts"""
+    events: list
+    total: int
+    page: int
+    num_pages: int
+    # Filters in effect, including a year taken from the query text
+    category_id: int | None = None
+    year: int | None = None
+    category_facets: list = field(default_factory=list)
+    year_facets: list = field(default_factory=list)
+
+    def has_previous(self):
+        return self.page > 1
+
+    def has_next(self):
+        return self.page < self.num_pages
+
+
+def split_query(query):
+    """Separate four-digit years from the words of a query"""
+    years = [int(year) for year in YEAR_TOKEN.findall(query)]
+    return ' '.join(YEAR_TOKEN.sub(' ', query).split()), years
+
+
+def search_events(query, category_id=None, year=None, page=1, per_page=EVENT_SEARCH_PAGE_SIZE):
+    """Search events by text, optionally narrowed to a category and a year"""
+    text, query_years = split_query(query)
+    if year is None and query_years:
+        year = query_years[0]
+
+    matches = Event.objects.all()
+    search_query = None
+    if text:
+        search_query = SearchQuery(text, search_type='websearch', config='english')
+        matches = matches.filter(search_vector=search_query)
+
+    # Each facet counts the matches under the other facet's filter, so picking a
+    # category still shows how many matches each year has in that category
+    grid = matches.annotate(year=ExtractYear('start_datetime')).values(
+        'category_id', 'category__name', 'category__color', 'year'
+    ).annotate(count=Count('pk')).order_by()
+    categories, years, total = {}, {}, 0
+    for row in grid:
+        in_year = year is None or row['year'] == year
+        in_category = category_id is None or row['category_id'] == category_id
+        if in_year:
+            facet = categories.setdefault(row['category_id'], {
+                'id': row['category_id'], 'name': row['category__name'] or 'Uncategorized',
+                'color': row['category__color'], 'count': 0,
+            })
+            facet['count'] += row['count']
+        if in_category:
+            years[row['year']] = years.get(row['year'], 0) + row['count']
+        if in_year and in_category:
+            total += row['count']
+
+    num_pages = max(1, ceil(total / per_page))
+    page = min(max(page, 1), num_pages)
+    if category_id is not None:
+        matches = matches.filter(category_id=category_id)
+    if year is not None:
+        matches = matches.filter(start_datetime__year=year)
+    matches = matches.select_related('category').defer('formatted_description', 'search_document', 'search_vector')
+    if search_query is not None:
+        matches = matches.annotate(rank=SearchRank(F('search_vector'), search_query)).order_by(
+            '-rank', '-start_datetime', 'pk'
+        )
+    else:
+        matches = matches.order_by('-start_datetime', 'pk')
+    offset = (page - 1) * per_page
+    return EventSearchResults(
+        events=list(matches[offset:offset + per_page]) if total else [],
+        total=total,
+        page=page,
+        num_pages=num_pages,
+        category_id=category_id,
+        year=year,
+        category_facets=sorted(categories.values(), key=lambda facet: (-facet['count'], facet['name'])),
+        year_facets=[{'year': key, 'count': count} for key, count in sorted(years.items(), reverse=True)],
+    )
@@ -0,0 +1,158 @@
+"""
+Signal handlers that keep the denormalized registration counters and revenue rollups
+in sync, drop cached registration rules, fee tables and event cards when what they
+were built from changes, and keep deleted occurrences out of their recurring series
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from ManagementApp.models import MemberType
+
+from .fees import invalidate_fee_tables
+from .fragments import invalidate_event_cards
+from .models import Event, EventCategory, EventRecurrence, EventRegistration, EventRegistrationFee, EventRevenueRollup
+from .registration import invalidate_default_guest_member_type, invalidate_registration_rules
+
+
+def _adjust_counts(event_id, registrations=0, registrants=0):
+    """Atomically shift an event's counters in the database, never below zero"""
+    if registrations or registrants:
+        Event.objects.filter(
+            pk=event_id,
+            active_registration_count__gte=max(-registrations, 0),
+            total_registrant_count__gte=max(-registrants, 0),
+        ).update(
+            active_registration_count=F('active_registration_count') + registrations,
+            total_registrant_count=F('total_registrant_count') + registrants,
+        )
+
+
+@receiver(post_save, sender=EventRegistration)
+def registration_saved(sender, instance, created, **kwargs):
+    """Count registrations as they become confirmed, and uncount cancelled or waitlisted ones"""
+    was_confirmed = not created and getattr(instance, '_loaded_confirmed', instance.is_confirmed)
+    is_confirmed = instance.is_confirmed
+    instance._loaded_confirmed = is_confirmed
+    
+    if was_confirmed == is_confirmed:
+        return
+    # A new registration has no additional members yet - they are counted by m2m_changed
+    people = 1 if created else 1 + instance.additional_members.count()
+    sign = 1 if is_confirmed else -1
+    _adjust_counts(instance.event_id, sign, sign * people)
+    # Line items of a new registration are written after it is saved, so read them on commit
+    EventRevenueRollup.schedule_apply(instance.pk, sign)
+
+
+@receiver(pre_delete, sender=EventRegistration)
+def registration_deleted(sender, instance, **kwargs):
+    """Uncount a confirmed registration and free its seats before it disappears"""
+    stored = EventRegistration.objects.filter(
+        pk=instance.pk, cancelled=False, waitlisted=False
+    ).values_list('seat_count', flat=True).first()
+    if stored is None:
+        return
+    _adjust_counts(instance.event_id, -1, -(1 + instance.additional_members.count()))
+    Event.release_seats(instance.event_id, stored)
+    # The line items go with the registration, so take their totals now
+    totals = EventRevenueRollup.registration_totals(instance.pk)
+    transaction.on_commit(lambda: EventRevenueRollup.apply(totals, -1))
+    # Promote once the delete has committed (the event itself may be going away)
+    transaction.on_commit(Event(pk=instance.event_id).promote_waitlist)
+
+
+@receiver(m2m_changed, sender=EventRegistration.additional_members.through)
+def additional_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the registrant count in step with additional members being added or removed"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    sign = 1 if action == 'post_add' else -1
+    
+    if not reverse:
+        # instance is the registration; pk_set holds the members actually added/removed
+        if not instance.is_confirmed:
+            return
+        changed = instance.additional_members.count() if action == 'pre_clear' else len(pk_set or ())
+        _adjust_counts(instance.event_id, registrants=sign * changed)
+        return
+    
+    # instance is a member being attached to (or detached from) registrations
+    registrations = EventRegistration.objects.filter(cancelled=False, waitlisted=False)
+    if action == 'pre_clear':
+        registrations = registrations.filter(additional_members=instance)
+    else:
+        registrations = registrations.filter(pk__in=pk_set or ())
+    per_event = {}
+    for event_id in registrations.values_list('event_id', flat=True):
+        per_event[event_id] = per_event.get(event_id, 0) + 1
+    for event_id, changed in per_event.items():
+        _adjust_counts(event_id, registrants=sign * changed)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_changed(sender, instance, **kwargs):
+    """Drop the cached registration rules of an edited or deleted event"""
+    invalidate_registration_rules([instance.pk])
+
+
+@receiver(pre_save, sender=Event)
+@receiver(pre_delete, sender=Event)
+def event_card_changed(sender, instance, **kwargs):
+    """Drop the cached cards of an event about to be edited or deleted"""
+    if instance.pk is not None:
+        invalidate_event_cards(Event.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Event)
+def occurrence_deleted(sender, instance, **kwargs):
+    """Keep a deleted occurrence of a recurring event from being expanded again"""
+    if instance.series_id and instance.occurrence_date:
+        recurrence = EventRecurrence.objects.filter(event_id=instance.series_id).first()
+        if recurrence is not None:
+            recurrence.exclude(instance.occurrence_date)
+
+
+@receiver(pre_save, sender=EventCategory)
+@receiver(pre_delete, sender=EventCategory)
+def event_category_changed(sender, instance, **kwargs):
+    """Drop the cached cards of every event shown with this category's badge"""
+    if instance.pk is not None:
+        invalidate_event_cards(Event.objects.filter(category_id=instance.pk))
+
+
+@receiver(post_save, sender=EventRegistrationFee)
+@receiver(post_delete, sender=EventRegistrationFee)
+def registration_fee_changed(sender, instance, **kwargs):
+    """Drop the cached fee table when one of an event's fees changes"""
+    invalidate_fee_tables([instance.event_id])
+
+
+@receiver(m2m_changed, sender=Event.allowed_member_types.through)
+def allowed_member_types_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop the cached registration rules when an event's allowed member types change"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_registration_rules([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_registration_rules(instance.events.values_list('pk', flat=True))
+    else:
+        invalidate_registration_rules(pk_set or ())
+
+
+@receiver(post_save, sender=MemberType)
+@receiver(pre_delete, sender=MemberType)
+def member_type_changed(sender, instance, **kwargs):
+    """Drop the cached registration rules of every event that allows this member type"""
+    invalidate_registration_rules(instance.events.values_list('pk', flat=True))
+    invalidate_default_guest_member_type()
+
+
+@receiver(pre_delete, sender=MemberType)
+def member_type_deleted(sender, instance, **kwargs):
+    """Regroup the revenue of events that charged this member type under no member type"""
+    for event_id in instance.revenue_rollups.values_list('event_id', flat=True):
+        EventRevenueRollup.schedule_refresh(event_id)
@@ -1,3 +1,1020 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import signal
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from decimal import Decimal
+from importlib import import_module
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from CalendarApp.audit import OVERFLOW_DROP, OVERFLOW_SYNC, ActionLogWriter, archive_action_logs, month_start
+from CalendarApp.fees import get_fee_table, write_line_items
+from CalendarApp.fragments import event_card_keys
+from CalendarApp.forms import EventRecurrenceForm
+from CalendarApp.ics import fold_line
+from CalendarApp.models import (
+    CalendarFeedToken, Event, EventRecurrence, EventActionLog, EventCategory, EventGuest, EventRegistration, EventRegistrationFee, EventRevenueRollup, RegistrationLineItem
+)
+from CalendarApp.recurrence import MAX_EXPANSION_WINDOW, expand_occurrences, materialize_occurrence, occurrence_dates
+from CalendarApp.registration import get_registration_rules
+from CalendarApp.search import search_events
+from CalendarApp.signals import _adjust_counts
+from ManagementApp.benchmarks import BenchmarkTestCase
+from ManagementApp.counters import get_count
+from ManagementApp.models import ClubUser, MemberType, Role
+
+# (max queries, max seconds) per view - raise a budget only together with the change that needs it
+VIEW_BUDGETS = {
+    'calendar': (6, 1.0),
+    'event_detail': (12, 1.0),
+    'calendar_json': (3, 1.0),
+    'event_register_form': (20, 1.0),
+    'event_register_submit': (22, 1.0),
+    'document_browser_folder': (10, 1.0),
+    'document_browser_search': (6, 1.0),
+    'member_autocomplete': (3, 1.0),
+    'event_search': (4, 1.0),
+    'calendar_json_not_modified': (2, 1.0),
+    'event_detail_not_modified': (4, 1.0),
+    'ics_feed': (3, 1.0),
+    'ics_registration_feed_not_modified': (3, 1.0),
+}
+
+
+class CalendarViewBenchmarkTests(BenchmarkTestCase):
+    """Query-count and latency budgets for the calendar views"""
+
+    def test_calendar(self):
+        self.assertWithinBudget('calendar', VIEW_BUDGETS['calendar'], reverse('calendar:calendar'))
+
+    def test_event_detail(self):
+        self.assertWithinBudget(
+            'event_detail', VIEW_BUDGETS['event_detail'],
+            reverse('calendar:event_detail', kwargs={'pk': self.event.pk})
+        )
+
+    def test_calendar_json(self):
+        now = timezone.now()
+        response = self.assertWithinBudget(
+            'calendar_json', VIEW_BUDGETS['calendar_json'], reverse('calendar:calendar_json'),
+            data={
+                'start': (now - timedelta(days=31)).isoformat(),
+                'end': (now + timedelta(days=31)).isoformat(),
+            }
+        )
+        self.assertTrue(response.json())
+
+    def test_calendar_json_not_modified(self):
+        now = timezone.now()
+        window = {'start': (now - timedelta(days=31)).isoformat(), 'end': (now + timedelta(days=31)).isoformat()}
+        etag = self.client.get(reverse('calendar:calendar_json'), window)['ETag']
+        self.assertWithinBudget(
+            'calendar_json_not_modified', VIEW_BUDGETS['calendar_json_not_modified'],
+            reverse('calendar:calendar_json'), data=window, status_code=304, headers={'If-None-Match': etag}
+        )
+
+    def test_event_detail_not_modified(self):
+        path = reverse('calendar:event_detail', kwargs={'pk': self.event.pk})
+        etag = self.client.get(path)['ETag']
+        self.assertWithinBudget(
+            'event_detail_not_modified', VIEW_BUDGETS['event_detail_not_modified'], path,
+            status_code=304, headers={'If-None-Match': etag}
+        )
+
+    def test_ics_feed(self):
+        token = CalendarFeedToken.for_user(self.user)
+        response = self.assertWithinBudget(
+            'ics_feed', VIEW_BUDGETS['ics_feed'], reverse('calendar:ics_feed', kwargs={'key': token.key})
+        )
+        self.assertEqual(b''.join(response.streaming_content).count(b'BEGIN:VEVENT'), Event.objects.count())
+
+    def test_ics_registration_feed_not_modified(self):
+        member = ClubUser.objects.get(pk=EventRegistration.objects.values_list('member_id', flat=True).first())
+        path = reverse('calendar:ics_registration_feed', kwargs={'key': CalendarFeedToken.for_user(member).key})
+        etag = self.client.get(path)['ETag']
+        self.assertWithinBudget(
+            'ics_registration_feed_not_modified', VIEW_BUDGETS['ics_registration_feed_not_modified'], path,
+            status_code=304, headers={'If-None-Match': etag}
+        )
+
+    def test_event_register_form(self):
+        self.assertWithinBudget(
+            'event_register_form', VIEW_BUDGETS['event_register_form'],
+            reverse('calendar:event_register', kwargs={'pk': self.open_event.pk})
+        )
+
+    def test_event_register_submit(self):
+        dependents = list(self.user.dependent_members.values_list('pk', flat=True))
+        self.assertWithinBudget(
+            'event_register_submit', VIEW_BUDGETS['event_register_submit'],
+            reverse('calendar:event_register', kwargs={'pk': self.open_event.pk}),
+            method='post',
+            data={
+                'notes': '',
+                'additional_members': dependents,
+                'guests-TOTAL_FORMS': '1',
+                'guests-INITIAL_FORMS': '0',
+                'guests-MIN_NUM_FORMS': '0',
+                'guests-MAX_NUM_FORMS': '1000',
+                'guests-0-name': 'Benchmark Guest',
+                'guests-0-phone_number': '',
+            },
+            status_code=302,
+        )
+        self.assertTrue(EventRegistration.objects.filter(event=self.open_event, member=self.user).exists())
+
+    def test_member_autocomplete(self):
+        response = self.assertWithinBudget(
+            'member_autocomplete', VIEW_BUDGETS['member_autocomplete'], reverse('calendar:member_autocomplete'),
+            data={'q': 'Last01'}
+        )
+        self.assertTrue(response.json()['results'])
+
+    def test_event_search(self):
+        response = self.assertWithinBudget(
+            'event_search', VIEW_BUDGETS['event_search'], reverse('calendar:event_search'),
+            data={'q': 'benchmark event'}
+        )
+        self.assertEqual(response.context['results'].total, Event.objects.count())
+
+    def test_document_browser_folder(self):
+        self.assertWithinBudget(
+            'document_browser_folder', VIEW_BUDGETS['document_browser_folder'],
+            reverse('calendar:document_browser'), data={'folder_id': self.deep_folder.parent_id}
+        )
+
+    def test_document_browser_search(self):
+        response = self.assertWithinBudget(
+            'document_browser_search', VIEW_BUDGETS['document_browser_search'],
+            reverse('calendar:document_browser'), data={'search': 'Document'}
+        )
+        self.assertEqual(len(response.json()['files']), 100)
+
+
+class EventCapacityTests(TransactionTestCase):
+    """Seat allocation and the waitlist under concurrent registration"""
+
+    def setUp(self):
+        # Cached rules may point at rows flushed by an earlier test
+        cache.clear()
+        self.member_role = Role.get_member_role()
+        self.event = Event.objects.create(
+            title='Popular Cruise',
+            short_description='Limited seats',
+            start_datetime=timezone.now() + timedelta(days=7),
+            end_datetime=timezone.now() + timedelta(days=7, hours=4),
+            registration_status='required',
+            capacity=5,
+        )
+        self.members = [
+            ClubUser.objects.create_user(
+                email=f'sailor{i}@example.com', password='sailor', first_name='Sailor', last_name=str(i),
+                role=self.member_role,
+            )
+            for i in range(12)
+        ]
+
+    def register(self, member, guests=0):
+        client = Client()
+        client.force_login(member)
+        data = {
+            'notes': '',
+            'guests-TOTAL_FORMS': str(guests),
+            'guests-INITIAL_FORMS': '0',
+            'guests-MIN_NUM_FORMS': '0',
+            'guests-MAX_NUM_FORMS': '1000',
+        }
+        for index in range(guests):
+            data[f'guests-{index}-name'] = f'Guest {index}'
+        try:
+            return client.post(reverse('calendar:event_register', kwargs={'pk': self.event.pk}), data)
+        finally:
+            connection.close()
+
+    def test_concurrent_registrations_never_overbook(self):
+        with ThreadPoolExecutor(max_workers=len(self.members)) as pool:
+            responses = list(pool.map(self.register, self.members))
+
+        self.assertTrue(all(response.status_code == 302 for response in responses))
+        self.event.refresh_from_db()
+        confirmed = self.event.registrations.filter(cancelled=False, waitlisted=False)
+        self.assertEqual(confirmed.count(), 5)
+        self.assertEqual(self.event.seats_taken, 5)
+        self.assertEqual(self.event.active_registration_count, 5)
+        self.assertEqual(self.event.registrations.filter(waitlisted=True).count(), 7)
+
+    def test_cancellation_promotes_waitlist_in_order(self):
+        for member in self.members[:5]:
+            self.register(member)
+        self.register(self.members[5], guests=1)  # needs two seats
+        self.register(self.members[6])
+
+        EventRegistration.objects.get(event=self.event, member=self.members[0]).cancel()
+        # The party of two is first in line but does not fit, and nobody may overtake it
+        self.assertTrue(EventRegistration.objects.get(event=self.event, member=self.members[5]).waitlisted)
+        self.assertTrue(EventRegistration.objects.get(event=self.event, member=self.members[6]).waitlisted)
+
+        EventRegistration.objects.get(event=self.event, member=self.members[1]).cancel()
+        self.assertFalse(EventRegistration.objects.get(event=self.event, member=self.members[5]).waitlisted)
+        self.assertTrue(EventRegistration.objects.get(event=self.event, member=self.members[6]).waitlisted)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 5)
+
+    def test_reregistering_after_cancelling_reuses_the_registration(self):
+        self.register(self.members[0])
+        registration = EventRegistration.objects.get(event=self.event, member=self.members[0])
+        registration.cancel()
+
+        response = self.register(self.members[0])
+        self.assertEqual(response.status_code, 302)
+        registration.refresh_from_db()
+        self.assertFalse(registration.cancelled)
+        self.assertEqual(EventRegistration.objects.filter(event=self.event, member=self.members[0]).count(), 1)
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.seats_taken, self.event.active_registration_count), (1, 1))
+
+    def test_saving_a_stale_event_keeps_the_counters(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        self.register(self.members[0])
+
+        stale.title = 'Renamed'
+        stale.save()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.title, 'Renamed')
+        self.assertEqual((self.event.seats_taken, self.event.active_registration_count), (1, 1))
+
+    def test_a_repeated_decrement_stops_at_zero(self):
+        self.register(self.members[0])
+        EventRegistration.objects.filter(event=self.event, member=self.members[0]).delete()
+
+        # A second release of the same seat must not underflow the unsigned columns
+        Event.release_seats(self.event.pk, 1)
+        _adjust_counts(self.event.pk, -1, -1)
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.seats_taken, self.event.active_registration_count), (0, 0))
+
+
+class RegistrationRulesCacheTests(TestCase):
+    """The cached registration snapshot follows edits to the event, its fees and member types"""
+
+    def setUp(self):
+        cache.clear()
+        self.full_member = MemberType.objects.create(name='Full Member', display_order=1)
+        self.guest = MemberType.objects.create(name='Guest', display_order=2)
+        self.event = Event.objects.create(
+            title='Regatta',
+            short_description='Burst registration',
+            start_datetime=timezone.now() + timedelta(days=7),
+            end_datetime=timezone.now() + timedelta(days=7, hours=4),
+            registration_status='required',
+        )
+        self.fee = EventRegistrationFee.objects.create(
+            event=self.event, member_type=self.full_member, fee_amount=Decimal('40.00')
+        )
+
+    def test_snapshot_is_served_from_cache(self):
+        get_registration_rules(self.event)
+        get_fee_table(self.event)
+        with self.assertNumQueries(0):
+            rules = get_registration_rules(self.event)
+            fee_table = get_fee_table(self.event)
+        self.assertEqual(fee_table.match([self.guest.pk, self.full_member.pk]), (self.full_member.pk, Decimal('40.00')))
+        self.assertEqual(fee_table.match([self.guest.pk]), (self.guest.pk, Decimal('0.00')))
+        self.assertTrue(rules.allows([self.guest.pk]))
+        self.assertTrue(rules.guests_allowed)
+
+    def test_fee_and_member_type_edits_invalidate_snapshot(self):
+        get_registration_rules(self.event)
+        get_fee_table(self.event)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fee.fee_amount = Decimal('55.00')
+            self.fee.save()
+        self.assertEqual(get_fee_table(self.event).match([self.full_member.pk]), (self.full_member.pk, Decimal('55.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.allowed_member_types.add(self.full_member)
+        rules = get_registration_rules(self.event)
+        self.assertFalse(rules.allows([self.guest.pk]))
+        self.assertFalse(rules.guests_allowed)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.full_member.is_active = False
+            self.full_member.save()
+        self.assertFalse(get_registration_rules(self.event).allows([self.full_member.pk]))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_prewarm_refuses_a_process_local_cache(self):
+        with self.assertRaisesMessage(CommandError, 'LocMemCache'):
+            call_command('prewarm_registrations', self.event.pk, stdout=io.StringIO())
+
+
+class RegistrationLineItemTests(TestCase):
+    """Registering stores each person's fee, unaffected by later fee changes"""
+
+    def setUp(self):
+        cache.clear()
+        full_member = MemberType.objects.create(name='Full Member', display_order=1)
+        guest_type = MemberType.objects.create(name='Guest', display_order=2)
+        self.member = ClubUser.objects.create_user(
+            email='skipper@example.com', password='skipper', first_name='Skip', last_name='Per',
+            role=Role.get_member_role(),
+        )
+        self.member.member_types.add(full_member)
+        self.event = Event.objects.create(
+            title='Club Dinner',
+            short_description='Members and guests',
+            start_datetime=timezone.now() + timedelta(days=7),
+            end_datetime=timezone.now() + timedelta(days=7, hours=3),
+            registration_status='required',
+        )
+        self.member_fee = EventRegistrationFee.objects.create(
+            event=self.event, member_type=full_member, fee_amount=Decimal('40.00')
+        )
+        # Guests stay free even when the event has a fee for the guest member type
+        EventRegistrationFee.objects.create(event=self.event, member_type=guest_type, fee_amount=Decimal('25.00'))
+        self.client.force_login(self.member)
+
+    def test_line_items_are_written_per_person(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('calendar:event_register', kwargs={'pk': self.event.pk}), {
+                'notes': '',
+                'guests-TOTAL_FORMS': '1',
+                'guests-INITIAL_FORMS': '0',
+                'guests-MIN_NUM_FORMS': '0',
+                'guests-MAX_NUM_FORMS': '1000',
+                'guests-0-name': 'Dinner Guest',
+            })
+        registration = EventRegistration.objects.get(event=self.event, member=self.member)
+        items = list(registration.line_items.values_list('kind', 'member_type__name', 'amount'))
+        self.assertEqual(items, [('primary', 'Full Member', Decimal('40.00')), ('guest', 'Guest', Decimal('0.00'))])
+        self.assertEqual(registration.total_fee, Decimal('40.00'))
+        rollup = EventRevenueRollup.objects.filter(event=self.event).aggregate(
+            registrants=Sum('registrants'), revenue=Sum('revenue')
+        )
+        self.assertEqual(rollup, {'registrants': 2, 'revenue': Decimal('40.00')})
+
+        self.member_fee.fee_amount = Decimal('90.00')
+        self.member_fee.save()
+        self.assertEqual(
+            registration.line_items.filter(kind=RegistrationLineItem.PRIMARY).get().amount, Decimal('40.00')
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            registration.cancel()
+        self.assertFalse(EventRevenueRollup.objects.filter(event=self.event).exists())
+
+    def test_rollup_is_shifted_by_each_registration(self):
+        full_member = MemberType.objects.get(name='Full Member')
+        crew = ClubUser.objects.create_user(
+            email='crew@example.com', password='crew', first_name='Crew', last_name='Member',
+            role=Role.get_member_role(),
+        )
+
+        def register(member, amount, **extra):
+            registration = EventRegistration.objects.create(event=self.event, member=member, total_fee=amount, **extra)
+            RegistrationLineItem.objects.create(
+                registration=registration, event=self.event, kind=RegistrationLineItem.PRIMARY,
+                member=member, member_type=full_member, amount=amount,
+            )
+            return registration
+
+        def rollup():
+            return list(EventRevenueRollup.objects.filter(event=self.event).values_list(
+                'member_type_id', 'registrants', 'revenue'
+            ))
+
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            first = register(self.member, Decimal('40.00'))
+        # The delta is an upsert of the rollup row, without locking the event
+        self.assertFalse([query for query in queries if 'FOR UPDATE' in query['sql']])
+        with self.captureOnCommitCallbacks(execute=True):
+            waitlisted = register(crew, Decimal('40.00'), waitlisted=True)
+        self.assertEqual(rollup(), [(full_member.pk, 1, Decimal('40.00'))])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            waitlisted.waitlisted = False
+            waitlisted.save()
+        self.assertEqual(rollup(), [(full_member.pk, 2, Decimal('80.00'))])
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(rollup(), [(full_member.pk, 1, Decimal('40.00'))])
+        EventRevenueRollup.refresh([self.event.pk])
+        self.assertEqual(rollup(), [(full_member.pk, 1, Decimal('40.00'))])
+
+    def test_bulk_written_line_items_set_total_fee(self):
+        registration = EventRegistration.objects.create(event=self.event, member=self.member, total_fee=Decimal('1.00'))
+        write_line_items([registration])
+        registration.refresh_from_db()
+        self.assertEqual(registration.total_fee, Decimal('40.00'))
+        self.assertEqual(registration.line_items.aggregate(total=Sum('amount'))['total'], registration.total_fee)
+
+    def test_backfill_reconciles_with_stored_total(self):
+        # Registered before line items, when the member fee was 30.00 and guests were free
+        registration = EventRegistration.objects.create(event=self.event, member=self.member, total_fee=Decimal('30.00'))
+        EventGuest.objects.create(event=self.event, registration=registration, name='Old Guest')
+        backfill = import_module('CalendarApp.migrations.0013_registration_line_items')
+        backfill.create_line_items(django_apps, None)
+
+        items = list(registration.line_items.values_list('kind', 'amount'))
+        self.assertEqual(items, [
+            ('primary', Decimal('40.00')), ('guest', Decimal('0.00')), ('adjustment', Decimal('-10.00')),
+        ])
+        EventRevenueRollup.refresh([self.event.pk])
+        rollup = EventRevenueRollup.objects.filter(event=self.event).aggregate(
+            registrants=Sum('registrants'), revenue=Sum('revenue')
+        )
+        self.assertEqual(rollup, {'registrants': 2, 'revenue': Decimal('30.00')})
+
+
+class ActionLogWriterTests(TransactionTestCase):
+    """Queued action log entries are written in batches, with nothing lost on shutdown"""
+
+    def setUp(self):
+        cache.clear()
+        self.editor = ClubUser.objects.create_user(
+            email='editor@example.com', password='editor', first_name='Ed', last_name='Itor',
+            role=Role.get_admin_role(),
+        )
+        self.event = Event.objects.create(
+            title='Harbour Cleanup',
+            short_description='Bring gloves',
+            start_datetime=timezone.now() + timedelta(days=3),
+            end_datetime=timezone.now() + timedelta(days=3, hours=2),
+        )
+
+    def entry(self, event=None, title='Harbour Cleanup'):
+        return EventActionLog(
+            event=event, user=self.editor, action='updated', event_title=title, timestamp=timezone.now()
+        )
+
+    def test_batches_are_flushed_on_shutdown(self):
+        writer = ActionLogWriter(max_size=100, batch_size=3, flush_interval=0.05, overflow=OVERFLOW_SYNC)
+        gone = Event.objects.create(
+            title='Cancelled', short_description='', start_datetime=self.event.start_datetime,
+            end_datetime=self.event.end_datetime,
+        )
+        entries = [self.entry(self.event) for _ in range(7)] + [self.entry(gone, 'Cancelled')]
+        # Deleted before its entry is written: the entry survives without the reference
+        gone.delete()
+        for entry in entries:
+            writer.submit(entry)
+        writer.shutdown()
+
+        self.assertEqual(EventActionLog.objects.filter(event=self.event).count(), 7)
+        self.assertEqual(EventActionLog.objects.get(event_title='Cancelled').event_id, None)
+        self.assertEqual(
+            sorted(EventActionLog.objects.values_list('timestamp', flat=True)),
+            sorted(entry.timestamp for entry in entries),
+        )
+
+    def test_failed_batch_is_retried_then_written_entry_by_entry(self):
+        writer = ActionLogWriter(
+            max_size=100, batch_size=10, flush_interval=0.05, overflow=OVERFLOW_SYNC, retries=2, retry_delay=0,
+        )
+        entries = [self.entry(self.event) for _ in range(3)]
+        # Longer than event_title allows, so every insert including it fails
+        entries.insert(1, self.entry(self.event, title='x' * 300))
+        with self.assertLogs('CalendarApp.audit', 'WARNING'):
+            self.assertEqual(writer._write(entries), 3)
+        self.assertEqual(writer.failed, 1)
+        self.assertEqual(EventActionLog.objects.count(), 3)
+
+    def test_sigterm_stops_the_writer_and_leaves_the_flush_to_exit(self):
+        writer = ActionLogWriter(max_size=100, batch_size=100, flush_interval=60, overflow=OVERFLOW_SYNC)
+        received = []
+        previous = signal.signal(signal.SIGTERM, lambda signum, frame: received.append(signum))
+        self.addCleanup(signal.signal, signal.SIGTERM, previous)
+        writer.install_sigterm_handler()
+        for _ in range(3):
+            writer.submit(self.entry(self.event))
+        os.kill(os.getpid(), signal.SIGTERM)
+        self.assertTrue(writer._stopping.is_set())
+        # The handler that was installed before still runs afterwards
+        self.assertEqual(received, [signal.SIGTERM])
+
+        # What atexit runs once the process exits
+        writer.shutdown()
+        self.assertEqual(EventActionLog.objects.count(), 3)
+
+    def test_sigterm_exits_when_nothing_else_handles_it(self):
+        writer = ActionLogWriter(max_size=100, batch_size=100, flush_interval=60, overflow=OVERFLOW_SYNC)
+        previous = signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        self.addCleanup(signal.signal, signal.SIGTERM, previous)
+        writer.install_sigterm_handler()
+        writer.submit(self.entry(self.event))
+        with self.assertRaises(SystemExit):
+            os.kill(os.getpid(), signal.SIGTERM)
+        writer.shutdown()
+        self.assertEqual(EventActionLog.objects.count(), 1)
+
+    def fill_past_capacity(self, writer):
+        """Submit three entries to a one-slot queue while the writer thread is stuck on its first insert"""
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'LOCK TABLE {connection.ops.quote_name(EventActionLog._meta.db_table)} IN EXCLUSIVE MODE'
+                )
+            writer.submit(self.entry(self.event))
+            # Wait until the writer thread is blocked on the table lock
+            with connection.cursor() as cursor:
+                while True:
+                    cursor.execute('SELECT count(*) FROM pg_locks WHERE NOT granted')
+                    if cursor.fetchone()[0]:
+                        break
+                    time.sleep(0.01)
+            writer.submit(self.entry(self.event))
+            writer.submit(self.entry(self.event))
+        writer.shutdown()
+
+    def test_overflow_drops_when_configured(self):
+        writer = ActionLogWriter(max_size=1, batch_size=10, flush_interval=0.05, overflow=OVERFLOW_DROP)
+        self.fill_past_capacity(writer)
+        self.assertEqual(writer.dropped, 1)
+        self.assertEqual(EventActionLog.objects.count(), 2)
+
+    def test_overflow_writes_in_request_by_default(self):
+        writer = ActionLogWriter(max_size=1, batch_size=10, flush_interval=0.05, overflow=OVERFLOW_SYNC)
+        self.fill_past_capacity(writer)
+        self.assertEqual(writer.dropped, 0)
+        self.assertEqual(EventActionLog.objects.count(), 3)
+
+
+@override_settings(ACTION_LOG_ASYNC=False)
+class EventActionLogViewTests(TestCase):
+    """Event edits are logged once their transaction commits"""
+
+    def test_delete_is_logged(self):
+        admin = ClubUser.objects.create_user(
+            email='admin@example.com', password='admin', first_name='Ad', last_name='Min',
+            role=Role.get_admin_role(),
+        )
+        event = Event.objects.create(
+            title='Rained Out',
+            short_description='',
+            start_datetime=timezone.now() + timedelta(days=1),
+            end_datetime=timezone.now() + timedelta(days=1, hours=2),
+        )
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('calendar:event_delete', kwargs={'pk': event.pk}))
+        self.assertRedirects(response, reverse('calendar:calendar'), fetch_redirect_response=False)
+        self.assertFalse(Event.objects.filter(pk=event.pk).exists())
+        log = EventActionLog.objects.get()
+        self.assertEqual((log.action, log.event_title, log.user), ('deleted', 'Rained Out', admin))
+        self.assertEqual(log.event_data['title'], 'Rained Out')
+
+
+class ActionLogArchiveTests(TestCase):
+    """prune_action_logs moves whole old months to gzipped JSONL and leaves recent entries alone"""
+
+    def test_old_months_are_archived_and_removed(self):
+        now = timezone.now()
+        old = [datetime(2024, 1, 5, tzinfo=dt_timezone.utc), datetime(2024, 1, 30, tzinfo=dt_timezone.utc),
+               datetime(2024, 3, 1, tzinfo=dt_timezone.utc)]
+        EventActionLog.objects.bulk_create(
+            [EventActionLog(action='created', event_title=f'Old {i}', timestamp=ts) for i, ts in enumerate(old)]
+            + [EventActionLog(action='updated', event_title='Recent', timestamp=now)]
+        )
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command('prune_action_logs', retention_days=30, archive_dir=archive_dir, stdout=io.StringIO())
+            self.assertEqual(sorted(path.name for path in Path(archive_dir).iterdir()), [
+                'event_action_log-2024-01.jsonl.gz', 'event_action_log-2024-03.jsonl.gz',
+            ])
+            with gzip.open(Path(archive_dir) / 'event_action_log-2024-01.jsonl.gz', 'rt') as archive:
+                rows = [json.loads(line) for line in archive]
+        self.assertEqual([row['event_title'] for row in rows], ['Old 0', 'Old 1'])
+        self.assertEqual(list(EventActionLog.objects.values_list('event_title', flat=True)), ['Recent'])
+
+    def test_archiving_deletes_in_bulk_and_shifts_the_counter_once_per_batch(self):
+        cache.clear()
+        old = datetime(2024, 1, 5, tzinfo=dt_timezone.utc)
+        EventActionLog.objects.bulk_create([
+            EventActionLog(action='created', event_title=f'Old {i}', timestamp=old) for i in range(5)
+        ])
+        self.assertEqual(get_count(EventActionLog), 5)
+        with tempfile.TemporaryDirectory() as archive_dir:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                archive_action_logs(timezone.now(), archive_dir, batch_size=2)
+        # Three DELETE batches, one counter update each, instead of one per row
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(get_count(EventActionLog), 0)
+
+    def test_rerun_after_an_interrupted_delete_does_not_duplicate_entries(self):
+        old = datetime(2024, 1, 5, tzinfo=dt_timezone.utc)
+        entries = EventActionLog.objects.bulk_create([
+            EventActionLog(action='created', event_title=f'Old {i}', timestamp=old) for i in range(3)
+        ])
+        with tempfile.TemporaryDirectory() as archive_dir:
+            archive_action_logs(timezone.now(), archive_dir)
+            # As if the first run had stopped after writing the archive but before its delete
+            EventActionLog.objects.bulk_create(entries[:2])
+            EventActionLog.objects.create(action='created', event_title='Late', timestamp=old)
+            self.assertEqual(archive_action_logs(timezone.now(), archive_dir), [(month_start(old), 3)])
+            with gzip.open(Path(archive_dir) / 'event_action_log-2024-01.jsonl.gz', 'rt') as archive:
+                titles = [json.loads(line)['event_title'] for line in archive]
+        self.assertEqual(sorted(titles), ['Late', 'Old 0', 'Old 1', 'Old 2'])
+        self.assertFalse(EventActionLog.objects.exists())
+
+
+class EventSearchTests(TestCase):
+    """Event search ranks title matches first and reads the year out of the query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cruising = EventCategory.objects.create(name='Cruising', color='#0d6efd')
+        social = EventCategory.objects.create(name='Social', color='#198754')
+
+        def create(title, year, category, description=''):
+            start = datetime(year, 10, 4, 17, tzinfo=dt_timezone.utc)
+            return Event.objects.create(
+                title=title, short_description='Club outing', formatted_description=description,
+                category=category, start_datetime=start, end_datetime=start + timedelta(hours=4),
+            )
+
+        cls.cruise_2019 = create('Fall Cruise', 2019, cruising)
+        cls.cruise_2020 = create('Fall Cruise', 2020, cruising)
+        cls.dinner_2019 = create('Commodore Dinner', 2019, social, '<p>After the <strong>fall cruise</strong></p>')
+
+    def test_year_in_query_filters_by_start_date(self):
+        results = search_events('2019 Fall Cruise')
+        self.assertEqual(results.year, 2019)
+        self.assertEqual(results.events, [self.cruise_2019, self.dinner_2019])
+        self.assertEqual([(facet['name'], facet['count']) for facet in results.category_facets], [
+            ('Cruising', 1), ('Social', 1),
+        ])
+        self.assertEqual(results.year_facets, [{'year': 2020, 'count': 1}, {'year': 2019, 'count': 2}])
+
+    def test_description_html_is_searchable(self):
+        self.assertEqual(self.dinner_2019.search_document, 'After the fall cruise')
+        results = search_events('commodore', year=None)
+        self.assertEqual(results.events, [self.dinner_2019])
+
+    def test_category_filter_narrows_year_facets(self):
+        results = search_events('cruise', category_id=self.cruise_2019.category_id)
+        self.assertEqual(results.total, 2)
+        self.assertEqual({facet['year'] for facet in results.year_facets}, {2019, 2020})
+        self.assertEqual(len(results.category_facets), 2)
+
+
+class CalendarJsonTests(TestCase):
+    """calendar_json rejects windows it cannot parse or that are too long with a 400"""
+
+    def test_impossible_dates_are_rejected(self):
+        path = reverse('calendar:calendar_json')
+        for window in ({'start': '2025-02-30'}, {'start': '2025-01-01', 'end': '2025-02-30'},
+                       {'start': '2025-01-01T25:00:00'}):
+            with self.subTest(window=window):
+                response = self.client.get(path, window)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_long_windows_are_rejected(self):
+        path = reverse('calendar:calendar_json')
+        # A year view (with its padding weeks) still fits
+        self.assertEqual(self.client.get(path, {'start': '2025-12-29', 'end': '2027-01-04'}).status_code, 200)
+        for end in ('2120-01-01', '9999-12-31'):
+            with self.subTest(end=end):
+                self.assertEqual(self.client.get(path, {'start': '2020-01-01', 'end': end}).status_code, 400)
+        with self.assertRaises(ValueError):
+            expand_occurrences(timezone.now(), timezone.now() + MAX_EXPANSION_WINDOW + timedelta(days=1))
+
+
+class ConditionalGetTests(TestCase):
+    """Validators change with the data and the viewer, and match otherwise"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = ClubUser.objects.create_user(
+            email='crew@example.com', password='crew', first_name='Crew', last_name='Member',
+            role=Role.get_member_role(),
+        )
+        cls.event = Event.objects.create(
+            title='Sunset Sail',
+            short_description='Evening sail',
+            start_datetime=timezone.now() + timedelta(days=2),
+            end_datetime=timezone.now() + timedelta(days=2, hours=2),
+            registration_status='required',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_calendar_page_revalidates(self):
+        path = reverse('calendar:event_list')
+        etag = self.client.get(path)['ETag']
+        self.assertEqual(self.client.get(path, headers={'If-None-Match': etag}).status_code, 304)
+
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(path, headers={'If-None-Match': etag}).status_code, 200)
+
+        etag = self.client.get(path)['ETag']
+        self.event.title = 'Sunset Sail (rescheduled)'
+        self.event.save()
+        self.assertEqual(self.client.get(path, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_event_detail_changes_with_registrations(self):
+        self.client.force_login(self.member)
+        path = reverse('calendar:event_detail', kwargs={'pk': self.event.pk})
+        etag = self.client.get(path)['ETag']
+        self.assertEqual(self.client.get(path, headers={'If-None-Match': etag}).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            EventRegistration.objects.create(event=self.event, member=self.member)
+        self.assertEqual(self.client.get(path, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_feed_changes_when_an_event_is_deleted(self):
+        path = reverse('calendar:calendar_json')
+        response = self.client.get(path)
+        self.assertIn('Last-Modified', response)
+        self.event.delete()
+        self.assertEqual(self.client.get(path, headers={'If-None-Match': response['ETag']}).status_code, 200)
+
+
+class EventCardCacheTests(TestCase):
+    """Event cards are rendered once and re-rendered after the event or its category changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = EventCategory.objects.create(name='Racing', color='#0d6efd')
+        cls.event = Event.objects.create(
+            title='Wednesday Series',
+            short_description='Beer can racing',
+            start_datetime=timezone.now() + timedelta(days=3),
+            end_datetime=timezone.now() + timedelta(days=3, hours=3),
+            category=cls.category,
+        )
+        cls.uncategorized = Event.objects.create(
+            title='Work Party',
+            short_description='Spring cleanup',
+            start_datetime=timezone.now() + timedelta(days=4),
+            end_datetime=timezone.now() + timedelta(days=4, hours=4),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def stored_keys(self, event):
+        event.refresh_from_db()
+        return event_card_keys(event.pk, event.updated_at, event.category.updated_at if event.category else None)
+
+    def test_cards_are_cached_for_both_pages(self):
+        self.client.get(reverse('calendar:calendar'))
+        self.client.get(reverse('calendar:event_list'))
+        for event in (self.event, self.uncategorized):
+            self.assertTrue(all(key in cache for key in self.stored_keys(event)))
+
+    def test_edit_without_updated_at_rerenders_card(self):
+        path = reverse('calendar:event_list')
+        self.assertContains(self.client.get(path), 'Wednesday Series')
+        self.event.title = 'Thursday Series'
+        self.event.save(update_fields=['title'])
+        self.assertContains(self.client.get(path), 'Thursday Series')
+
+    def test_category_change_rerenders_card(self):
+        path = reverse('calendar:calendar')
+        self.client.get(path)
+        keys = self.stored_keys(self.event)
+        self.category.name = 'Regatta'
+        self.category.save()
+        self.assertFalse(any(key in cache for key in keys))
+        self.assertContains(self.client.get(path), 'Regatta')
+
+    def test_delete_drops_card(self):
+        self.client.get(reverse('calendar:event_list'))
+        keys = self.stored_keys(self.event)
+        self.event.delete()
+        self.assertFalse(any(key in cache for key in keys))
+
+
+class IcsFeedTests(TestCase):
+    """Token-authorised ICS feeds with stable, strong validators"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = ClubUser.objects.create_user(
+            email='skipper@example.com', password='skipper', first_name='Skipper', last_name='Member',
+            role=Role.get_member_role(),
+        )
+        cls.racing = EventCategory.objects.create(name='Racing', color='#dc3545')
+        start = timezone.now() + timedelta(days=5)
+        cls.race = Event.objects.create(
+            title='Harbour Race; Division A, B',
+            short_description='Start off the breakwater\nSkippers meeting at 9',
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=4),
+            category=cls.racing,
+        )
+        cls.social = Event.objects.create(
+            title="Commodore's Ball",
+            short_description='Black tie',
+            start_datetime=start + timedelta(days=1),
+            end_datetime=start + timedelta(days=1, hours=5),
+        )
+        cls.old = Event.objects.create(
+            title='Long Ago Regatta',
+            short_description='Before the feed window',
+            start_datetime=timezone.now() - timedelta(days=400),
+            end_datetime=timezone.now() - timedelta(days=400) + timedelta(hours=3),
+        )
+        cls.token = CalendarFeedToken.for_user(cls.member)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_feed(self, name='calendar:ics_feed', headers=None, **kwargs):
+        response = self.client.get(reverse(name, kwargs={'key': self.token.key, **kwargs}), headers=headers)
+        if response.status_code == 200:
+            response.body = b''.join(response.streaming_content).decode()
+        return response
+
+    def test_feed_lists_events_in_window(self):
+        response = self.get_feed()
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertFalse(response['ETag'].startswith('W/'))
+        body = response.body
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+        self.assertIn('SUMMARY:Harbour Race\\; Division A\\, B', body)
+        self.assertIn('Start off the breakwater\\nSkippers meeting at 9', body.replace('\r\n ', ''))
+        self.assertIn('CATEGORIES:Racing', body)
+        self.assertNotIn('Long Ago Regatta', body)
+
+    def test_same_rows_give_same_bytes_and_304(self):
+        first = self.get_feed()
+        second = self.get_feed()
+        self.assertEqual(first.body, second.body)
+        self.assertEqual(self.get_feed(headers={'If-None-Match': first['ETag']}).status_code, 304)
+
+        self.race.title = 'Harbour Race (postponed)'
+        self.race.save()
+        self.assertEqual(self.get_feed(headers={'If-None-Match': first['ETag']}).status_code, 200)
+
+    def test_category_feed(self):
+        body = self.get_feed('calendar:ics_category_feed', category_id=self.racing.pk).body
+        self.assertIn('X-WR-CALNAME:Yacht Club Calendar: Racing', body)
+        self.assertIn('Harbour Race', body)
+        self.assertNotIn('Commodore', body)
+
+    def test_registration_feed_follows_registrations(self):
+        response = self.get_feed('calendar:ics_registration_feed')
+        self.assertNotIn('BEGIN:VEVENT', response.body)
+
+        registration = EventRegistration.objects.create(event=self.race, member=self.member)
+        response = self.get_feed('calendar:ics_registration_feed', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Harbour Race', response.body)
+        self.assertIn('STATUS:CONFIRMED', response.body)
+        self.assertNotIn('Commodore', response.body)
+
+        registration.cancel()
+        response = self.get_feed('calendar:ics_registration_feed', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Harbour Race', response.body)
+
+    def test_revoked_and_unknown_tokens_are_refused(self):
+        old_key = self.token.key
+        new_key = CalendarFeedToken.rotate(self.member).key
+        self.assertEqual(self.client.get(reverse('calendar:ics_feed', kwargs={'key': old_key})).status_code, 404)
+        self.assertEqual(self.client.get(reverse('calendar:ics_feed', kwargs={'key': new_key})).status_code, 200)
+        CalendarFeedToken.revoke(self.member)
+        self.assertEqual(self.client.get(reverse('calendar:ics_feed', kwargs={'key': new_key})).status_code, 404)
+
+    def test_subscription_page_manages_links(self):
+        self.client.force_login(self.member)
+        path = reverse('calendar:calendar_feeds')
+        self.client.post(path, {'action': 'rotate'})
+        token = CalendarFeedToken.objects.get(user=self.member)
+        self.assertNotEqual(token.key, self.token.key)
+        self.assertContains(self.client.get(path), token.key)
+        self.client.post(path, {'action': 'revoke'})
+        self.assertFalse(CalendarFeedToken.objects.filter(user=self.member).exists())
+
+    def test_long_lines_are_folded_on_character_boundaries(self):
+        line = 'SUMMARY:' + 'Ä' * 60
+        folded = fold_line(line)
+        self.assertTrue(all(len(part.encode()) <= 75 for part in folded.split('\r\n')))
+        self.assertEqual(folded.replace('\r\n ', '').rstrip('\r\n'), line)
+
+
+class EventRecurrenceTests(TestCase):
+    """Recurring events expand per window and store occurrences only when they are needed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = ClubUser.objects.create_user(
+            email='racer@example.com', password='racer', first_name='Race', last_name='Crew',
+            role=Role.get_member_role(),
+        )
+        start = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), datetime.min.time()))
+        cls.start = start + timedelta(hours=18)
+        cls.series = Event.objects.create(
+            title='Race Night',
+            short_description='Weekly beer can race',
+            start_datetime=cls.start,
+            end_datetime=cls.start + timedelta(hours=3),
+            registration_status='recommended',
+        )
+        cls.recurrence = EventRecurrence.objects.create(event=cls.series, frequency=EventRecurrence.WEEKLY, count=20)
+        cls.first_date = timezone.localtime(cls.start).date()
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self, days):
+        response = self.client.get(reverse('calendar:calendar_json'), {
+            'start': self.start.isoformat(), 'end': (self.start + timedelta(days=days)).isoformat(),
+        })
+        return response.json()
+
+    def test_occurrence_dates_follow_rule(self):
+        weekly = EventRecurrence(
+            frequency=EventRecurrence.WEEKLY, interval=2, weekdays=[0, 2], count=5,
+            excluded_dates=[datetime(2026, 1, 19).date()],
+        )
+        # Every other Monday and Wednesday; the excluded date still counts towards the five
+        self.assertEqual(
+            [day.isoformat() for day in occurrence_dates(weekly, datetime(2026, 1, 5).date())],
+            ['2026-01-05', '2026-01-07', '2026-01-21', '2026-02-02'],
+        )
+        monthly = EventRecurrence(frequency=EventRecurrence.MONTHLY, until=datetime(2026, 5, 31).date())
+        self.assertEqual(
+            [day.isoformat() for day in occurrence_dates(monthly, datetime(2026, 1, 31).date())],
+            ['2026-01-31', '2026-03-31', '2026-05-31'],
+        )
+        daily = EventRecurrence(frequency=EventRecurrence.DAILY, excluded_dates=[datetime(2026, 1, 2).date()])
+        start = datetime(2026, 3, 1).date()
+        self.assertEqual(
+            list(occurrence_dates(daily, datetime(2026, 1, 1).date(), start=start, end=start + timedelta(days=1))),
+            [start, start + timedelta(days=1)],
+        )
+
+    def test_feed_expands_only_the_window(self):
+        events = self.feed(days=22)
+        self.assertEqual([event['title'] for event in events], ['Race Night'] * 4)
+        self.assertEqual(events[0]['id'], self.series.pk)
+        self.assertEqual(events[1]['url'], reverse('calendar:event_occurrence', kwargs={
+            'pk': self.series.pk, 'occurrence_date': self.first_date + timedelta(weeks=1),
+        }))
+        self.assertEqual(Event.objects.count(), 1)
+
+    def test_registering_materializes_one_occurrence(self):
+        day = self.first_date + timedelta(weeks=2)
+        self.client.force_login(self.member)
+        path = reverse('calendar:event_occurrence_materialize', kwargs={'pk': self.series.pk, 'occurrence_date': day})
+        response = self.client.post(path, {'next': 'register'})
+        occurrence = Event.objects.get(series=self.series, occurrence_date=day)
+        self.assertRedirects(response, reverse('calendar:event_register', kwargs={'pk': occurrence.pk}),
+                             fetch_redirect_response=False)
+        self.assertEqual(timezone.localtime(occurrence.start_datetime).date(), day)
+        self.assertEqual(occurrence.duration, self.series.duration)
+
+        # Asking again reuses the stored occurrence, and the feed shows it instead of an expansion
+        self.client.post(path, {'next': 'register'})
+        self.assertEqual(Event.objects.filter(series=self.series).count(), 1)
+        ids = [event['id'] for event in self.feed(days=22)]
+        self.assertEqual(len(ids), 4)
+        self.assertIn(occurrence.pk, ids)
+
+    def test_deleted_occurrence_stays_deleted(self):
+        day = self.first_date + timedelta(weeks=1)
+        materialize_occurrence(self.series, day).delete()
+        self.recurrence.refresh_from_db()
+        self.assertEqual(self.recurrence.excluded_dates, [day])
+        self.assertEqual(len(self.feed(days=22)), 3)
+        response = self.client.get(reverse('calendar:event_occurrence', kwargs={
+            'pk': self.series.pk, 'occurrence_date': day,
+        }))
+        self.assertEqual(response.status_code, 404)
+
+    def test_ics_feed_writes_series_once(self):
+        token = CalendarFeedToken.for_user(self.member)
+        self.recurrence.exclude(self.first_date + timedelta(weeks=3))
+        response = self.client.get(reverse('calendar:ics_feed', kwargs={'key': token.key}))
+        body = b''.join(response.streaming_content).decode().replace('\r\n ', '')
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+        self.assertIn('RRULE:FREQ=WEEKLY;INTERVAL=1;COUNT=20', body)
+        self.assertIn('EXDATE:', body)
+
+    def test_recurrence_form(self):
+        form = EventRecurrenceForm({'recurrence-frequency': ''}, prefix='recurrence', instance=self.recurrence)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIsNone(form.save_for(self.series))
+        self.assertFalse(EventRecurrence.objects.filter(event=self.series).exists())
+
+        form = EventRecurrenceForm({
+            'recurrence-frequency': 'WEEKLY', 'recurrence-count': '5', 'recurrence-until': '2030-01-01',
+        }, prefix='recurrence')
+        self.assertFalse(form.is_valid())
@@ -1,18 +1,45 @@
-from django.urls import path
+from datetime import date
+
+from django.urls import path, register_converter
 from . import views
 
+
+class IsoDateConverter:
+    """A YYYY-MM-DD path segment as a date"""
+    regex = r'\d{4}-\d{2}-\d{2}'
+
+    def to_python(self, value):
+        return date.fromisoformat(value)
+
+    def to_url(self, value):
+        return value.isoformat() if isinstance(value, date) else value
+
+
+register_converter(IsoDateConverter, 'isodate')
+
 app_name = 'calendar'
 
 urlpatterns = [
     path('', views.CalendarView.as_view(), name='calendar'),
     path('events/', views.EventListView.as_view(), name='event_list'),
+    path('events/search/', views.EventSearchView.as_view(), name='event_search'),
     path('events/create/', views.EventCreateView.as_view(), name='event_create'),
     path('events/<int:pk>/', views.EventDetailView.as_view(), name='event_detail'),
+    path('events/<int:pk>/occurrences/<isodate:occurrence_date>/', views.event_occurrence, name='event_occurrence'),
+    path(
+        'events/<int:pk>/occurrences/<isodate:occurrence_date>/materialize/',
+        views.event_occurrence_materialize,
+        name='event_occurrence_materialize',
+    ),
     path('events/<int:pk>/edit/', views.EventUpdateView.as_view(), name='event_edit'),
     path('events/<int:pk>/delete/', views.EventDeleteView.as_view(), name='event_delete'),
     path('events/<int:pk>/register/', views.event_register, name='event_register'),
     path('events/<int:pk>/unregister/', views.event_unregister, name='event_unregister'),
     path('events/json/', views.calendar_json, name='calendar_json'),
+    path('feeds/', views.calendar_feeds, name='calendar_feeds'),
+    path('feeds/<str:key>/events.ics', views.ics_feed, name='ics_feed'),
+    path('feeds/<str:key>/categories/<int:category_id>.ics', views.ics_feed, name='ics_category_feed'),
+    path('feeds/<str:key>/registrations.ics', views.ics_feed, {'registrations_only': True}, name='ics_registration_feed'),
     path('events/action-log/', views.EventActionLogView.as_view(), name='event_action_log'),
     path('members/autocomplete/', views.member_autocomplete, name='member_autocomplete'),
     path('documents/<int:pk>/info/', views.document_info, name='document_info'),
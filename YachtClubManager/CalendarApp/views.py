@@ -1,21 +1,45 @@
+from datetime import datetime, time
 from django.utils import timezone
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.core.exceptions import PermissionDenied
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
+from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Event, EventCategory, EventActionLog, EventRegistration, EventRegistrationFee
-from .forms import EventForm, EventContactFormSet, EventRegistrationFeeFormSet, EventRegistrationForm, EventGuestFormSet
+from django.db import IntegrityError, transaction
+from .models import CalendarFeedToken, Event, EventCategory, EventActionLog, EventRegistration, RegistrationLineItem
+from .forms import (
+    EventForm, EventContactFormSet, EventRecurrenceForm, EventRegistrationFeeFormSet, EventRegistrationForm,
+    EventGuestFormSet,
+)
+from .audit import log_event_action
+from .conditional import (
+    CACHE_CONTROL, calendar_etag, event_detail_etag, feed_validators, ics_feed_validators, not_modified, set_validators
+)
+from .fees import NO_FEE, build_line_items, get_fee_table
+from .fragments import event_card_cache_timeout
+from .ics import ICS_CONTENT_TYPE, calendar_chunks, feed_events, feed_window_start, registration_feed
+from .recurrence import (
+    MAX_EXPANSION_WINDOW, expand_occurrences, is_occurrence, make_occurrence, materialize_occurrence,
+    upcoming_occurrences,
+)
+from .registration import get_registration_rules
+from .search import search_events
 from ManagementApp.mixins import EventEditRequiredMixin, EventDeleteRequiredMixin
+from ManagementApp.pagination import KeysetPaginationMixin
+from ManagementApp.search import is_indexable_query, rank_members, search_members, search_members_by_last_name
 
 ClubUser = get_user_model()
 
 
+@method_decorator([cache_control(**CACHE_CONTROL), condition(etag_func=calendar_etag)], name='get')
 class CalendarView(ListView):
     """Main calendar view displaying all events"""
     model = Event
@@ -24,14 +48,18 @@ class CalendarView(ListView):
     
     def get_queryset(self):
         """Get all future events and recent past events"""
-        return Event.objects.select_related('category').order_by('-start_datetime')
+        return Event.objects.select_related('category').defer(
+            'formatted_description', 'search_document', 'search_vector'
+        ).order_by('-start_datetime')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = EventCategory.objects.all()
+        context['event_card_cache_timeout'] = event_card_cache_timeout()
         return context
 
 
+@method_decorator([cache_control(**CACHE_CONTROL), condition(etag_func=calendar_etag)], name='get')
 class EventListView(ListView):
     """List view of all events"""
     model = Event
@@ -40,19 +68,56 @@ class EventListView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        return Event.objects.select_related('category').order_by('-start_datetime')
+        return Event.objects.select_related('category', 'recurrence').defer(
+            'formatted_description', 'search_document', 'search_vector'
+        ).order_by('-start_datetime')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['event_card_cache_timeout'] = event_card_cache_timeout()
+        return context
+
+
+class EventSearchView(TemplateView):
+    """Full-text search over past and upcoming events, with category and year facets"""
+    template_name = 'CalendarApp/event_search.html'
 
+    @staticmethod
+    def _int_param(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        category_id = self._int_param(self.request.GET.get('category'))
+        year = self._int_param(self.request.GET.get('year'))
+        context.update({'query': query, 'selected_category': category_id, 'selected_year': year})
+        if query or category_id is not None or year is not None:
+            context['results'] = search_events(
+                query, category_id=category_id, year=year, page=self._int_param(self.request.GET.get('page')) or 1
+            )
+        return context
+
+
+@method_decorator([cache_control(**CACHE_CONTROL), condition(etag_func=event_detail_etag)], name='get')
 class EventDetailView(DetailView):
     """Detail view for a single event"""
     model = Event
     template_name = 'CalendarApp/event_detail.html'
     context_object_name = 'event'
+
+    def get_queryset(self):
+        return Event.objects.select_related('category', 'recurrence', 'series')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         event = self.object
         user = self.request.user
+        context['recurrence'] = getattr(event, 'recurrence', None)
+        context['upcoming_occurrences'] = upcoming_occurrences(event)
         
         # Check if user can register and if they're already registered
         can_register = event.can_register(user) if user.is_authenticated else False
@@ -66,8 +131,10 @@ class EventDetailView(DetailView):
                     can_register = False
         
         context['can_register'] = can_register
-        context['is_registered'] = event.is_registered(user) if user.is_authenticated else False
-        context['registration_count'] = event.get_registration_count()
+        registration = event.get_user_registration(user)
+        context['is_registered'] = registration is not None
+        context['is_waitlisted'] = registration is not None and registration.waitlisted
+        context['registration_count'] = event.active_registration_count
         context['registration_current'] = event.start_datetime < timezone.now()
         
         return context
@@ -101,46 +168,35 @@ class EventCreateView(LoginRequiredMixin, CreateView):
         if self.request.POST:
             context['contact_formset'] = EventContactFormSet(self.request.POST)
             context['fee_formset'] = EventRegistrationFeeFormSet(self.request.POST)
+            context['recurrence_form'] = EventRecurrenceForm(self.request.POST, prefix='recurrence')
         else:
             context['contact_formset'] = EventContactFormSet()
             context['fee_formset'] = EventRegistrationFeeFormSet()
+            context['recurrence_form'] = EventRecurrenceForm(prefix='recurrence')
         return context
 
     def form_valid(self, form):
         context = self.get_context_data()
         contact_formset = context['contact_formset']
         fee_formset = context['fee_formset']
+        recurrence_form = context['recurrence_form']
         
-        if contact_formset.is_valid() and fee_formset.is_valid():
+        if contact_formset.is_valid() and fee_formset.is_valid() and recurrence_form.is_valid():
             self.object = form.save()
             contact_formset.instance = self.object
             contact_formset.save()
             fee_formset.instance = self.object
             fee_formset.save()
+            # One series row instead of a row per occurrence
+            recurrence_form.save_for(self.object)
             
             # Log the action
-            EventActionLog.objects.create(
-                event=self.object,
-                user=self.request.user,
-                action='created',
-                event_title=self.object.title,
-                ip_address=self._get_client_ip(),
-                user_agent=self.request.META.get('HTTP_USER_AGENT', '')[:255]
-            )
+            log_event_action(self.request, 'created', event=self.object, event_title=self.object.title)
             
             messages.success(self.request, f'Event "{form.cleaned_data["title"]}" has been created successfully!')
             return redirect(self.success_url)
         else:
             return self.render_to_response(self.get_context_data(form=form))
-    
-    def _get_client_ip(self):
-        """Get client IP address from request"""
-        x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = self.request.META.get('REMOTE_ADDR')
-        return ip
 
 
 class EventUpdateView(EventEditRequiredMixin, UpdateView):
@@ -164,41 +220,36 @@ class EventUpdateView(EventEditRequiredMixin, UpdateView):
         else:
             context['contact_formset'] = EventContactFormSet(instance=self.object)
             context['fee_formset'] = EventRegistrationFeeFormSet(instance=self.object)
+        # A materialized occurrence belongs to its series and cannot repeat itself
+        if self.object.series_id is None:
+            context['recurrence_form'] = EventRecurrenceForm(
+                self.request.POST or None, prefix='recurrence', instance=getattr(self.object, 'recurrence', None)
+            )
         return context
 
     def form_valid(self, form):
         context = self.get_context_data()
         contact_formset = context['contact_formset']
         fee_formset = context['fee_formset']
+        recurrence_form = context.get('recurrence_form')
         
-        if contact_formset.is_valid() and fee_formset.is_valid():
+        if (contact_formset.is_valid() and fee_formset.is_valid()
+                and (recurrence_form is None or recurrence_form.is_valid())):
             form.save()
             contact_formset.save()
             fee_formset.save()
+            if recurrence_form is not None:
+                recurrence_form.save_for(self.object)
+            # A raised capacity may free seats for waitlisted members
+            self.object.promote_waitlist()
             
             # Log the action
-            EventActionLog.objects.create(
-                event=self.object,
-                user=self.request.user,
-                action='updated',
-                event_title=self.object.title,
-                ip_address=self._get_client_ip(),
-                user_agent=self.request.META.get('HTTP_USER_AGENT', '')[:255]
-            )
+            log_event_action(self.request, 'updated', event=self.object, event_title=self.object.title)
             
             messages.success(self.request, f'Event "{form.cleaned_data["title"]}" has been updated successfully!')
             return redirect(self.success_url)
         else:
             return self.render_to_response(self.get_context_data(form=form))
-    
-    def _get_client_ip(self):
-        """Get client IP address from request"""
-        x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = self.request.META.get('REMOTE_ADDR')
-        return ip
 
 
 class EventDeleteView(EventDeleteRequiredMixin, DeleteView):
@@ -208,8 +259,8 @@ class EventDeleteView(EventDeleteRequiredMixin, DeleteView):
     context_object_name = 'event'
     success_url = reverse_lazy('calendar:calendar')
     
-    def delete(self, request, *args, **kwargs):
-        self.object = self.get_object()
+    def form_valid(self, form):
+        # DeleteView routes POST through form_valid (delete() only serves HTTP DELETE)
         event_title = self.object.title
         event_data = {
             'title': self.object.title,
@@ -219,36 +270,20 @@ class EventDeleteView(EventDeleteRequiredMixin, DeleteView):
             'end_datetime': self.object.end_datetime.isoformat(),
         }
         
-        # Log the action before deletion
-        EventActionLog.objects.create(
-            event=None,  # Event will be deleted
-            user=request.user,
-            action='deleted',
-            event_title=event_title,
-            event_data=event_data,
-            ip_address=self._get_client_ip(),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
-        )
+        # Log the action before deletion, without an event reference as the event is about to go
+        log_event_action(self.request, 'deleted', event_title=event_title, event_data=event_data)
         
-        messages.success(request, f'Event "{event_title}" has been deleted successfully!')
-        return super().delete(request, *args, **kwargs)
-    
-    def _get_client_ip(self):
-        """Get client IP address from request"""
-        x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = self.request.META.get('REMOTE_ADDR')
-        return ip
+        messages.success(self.request, f'Event "{event_title}" has been deleted successfully!')
+        return super().form_valid(form)
 
 
-class EventActionLogView(LoginRequiredMixin, ListView):
+class EventActionLogView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """View for displaying event action logs"""
     model = EventActionLog
     template_name = 'CalendarApp/event_action_log.html'
     context_object_name = 'action_logs'
     paginate_by = 50
+    keyset_ordering = ('-timestamp', '-id')
     
     def dispatch(self, request, *args, **kwargs):
         """Check if user has permission to view logs (editors and admins)"""
@@ -264,17 +299,87 @@ class EventActionLogView(LoginRequiredMixin, ListView):
         return super().dispatch(request, *args, **kwargs)
     
     def get_queryset(self):
-        return EventActionLog.objects.select_related('user', 'event').order_by('-timestamp')
+        return EventActionLog.objects.select_related('user', 'event')
+
+
+def _parse_calendar_bound(value):
+    """Parse a FullCalendar start/end query parameter into an aware datetime"""
+    # Well-formed but impossible dates (2025-02-30) raise instead of returning None
+    try:
+        parsed = parse_datetime(value)
+        parsed_date = parse_date(value) if parsed is None else None
+    except ValueError:
+        return None
+    if parsed is None:
+        if parsed_date is None:
+            return None
+        parsed = datetime.combine(parsed_date, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
 
 
 def calendar_json(request):
-    """JSON endpoint for calendar events (for use with calendar libraries like FullCalendar)"""
-    events = Event.objects.select_related('category').all()
+    """JSON endpoint for calendar events (for use with calendar libraries like FullCalendar)
+
+    FullCalendar sends the visible window as ``start`` and ``end`` query parameters.
+    Only events overlapping that window are returned, so the payload stays proportional
+    to what is on screen rather than to the whole event history. An optional ``category``
+    parameter (repeatable) restricts the feed to the given category IDs.
+
+    Occurrences of recurring events are expanded from their series for the requested
+    window only, so they need both ``start`` and ``end``. Windows longer than
+    MAX_EXPANSION_WINDOW (a little over a year) are refused with a 400.
+    """
+    events = Event.objects.all()
+
+    # Restrict to events overlapping the requested window (start < window end and end > window start)
+    window_start = request.GET.get('start')
+    window_end = request.GET.get('end')
+    if window_start:
+        window_start = _parse_calendar_bound(window_start)
+        if window_start is None:
+            return JsonResponse({'error': 'Invalid start parameter'}, status=400)
+        events = events.filter(end_datetime__gt=window_start)
+    if window_end:
+        window_end = _parse_calendar_bound(window_end)
+        if window_end is None:
+            return JsonResponse({'error': 'Invalid end parameter'}, status=400)
+        events = events.filter(start_datetime__lt=window_end)
+    if window_start and window_end and window_end - window_start > MAX_EXPANSION_WINDOW:
+        return JsonResponse(
+            {'error': f'The requested window may span at most {MAX_EXPANSION_WINDOW.days} days'}, status=400
+        )
+
+    # Optional category filter
+    category_ids = [c for c in request.GET.getlist('category') if c]
+    series = Event.objects.all()
+    if category_ids:
+        if not all(c.isdigit() for c in category_ids):
+            return JsonResponse({'error': 'Invalid category parameter'}, status=400)
+        events = events.filter(category_id__in=category_ids)
+        series = series.filter(category_id__in=category_ids)
+
+    occurrences = expand_occurrences(window_start, window_end, series) if window_start and window_end else []
+
+    # FullCalendar refetches the same window often; answer unchanged windows with a 304
+    etag, last_modified = feed_validators(events, occurrences)
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    events = events.select_related('category').only(
+        'id', 'title', 'short_description', 'start_datetime', 'end_datetime',
+        'category__name', 'category__color',
+    ).order_by('start_datetime')
+    if occurrences:
+        events = sorted([*events, *occurrences], key=lambda event: event.start_datetime)
     events_data = []
-    
+
     for event in events:
         events_data.append({
-            'id': event.id,
+            # Expanded occurrences have no row of their own yet
+            'id': event.id or f'{event.series_id}-{event.occurrence_date:%Y%m%d}',
             'title': event.title,
             'start': event.start_datetime.isoformat(),
             'end': event.end_datetime.isoformat(),
@@ -284,27 +389,143 @@ def calendar_json(request):
             'category': event.category.name if event.category else 'Uncategorized',
         })
     
-    return JsonResponse(events_data, safe=False)
+    return set_validators(JsonResponse(events_data, safe=False), etag, last_modified)
+
+
+def event_occurrence(request, pk, occurrence_date):
+    """One occurrence of a recurring event, shown from its series until it is materialized"""
+    series = get_object_or_404(Event.objects.select_related('category', 'recurrence'), pk=pk)
+    materialized = series.occurrences.filter(occurrence_date=occurrence_date).values_list('pk', flat=True).first()
+    if materialized is not None:
+        return redirect('calendar:event_detail', pk=materialized)
+    if occurrence_date == timezone.localtime(series.start_datetime).date():
+        return redirect('calendar:event_detail', pk=series.pk)
+    if not is_occurrence(series, occurrence_date):
+        raise Http404('No such occurrence')
+
+    occurrence = make_occurrence(series, occurrence_date)
+    context = {
+        'event': occurrence,
+        'series': series,
+        'recurrence': series.recurrence,
+        'can_register': occurrence.can_register(request.user),
+        'registration_current': occurrence.start_datetime < timezone.now(),
+    }
+    return render(request, 'CalendarApp/event_occurrence.html', context)
+
+
+@login_required
+@require_http_methods(["POST"])
+def event_occurrence_materialize(request, pk, occurrence_date):
+    """Store an occurrence as an event of its own, then go on to register for it or edit it"""
+    series = get_object_or_404(Event.objects.select_related('recurrence'), pk=pk)
+    editing = request.POST.get('next') == 'edit'
+    if editing and not (request.user.has_permission('edit_events') or request.user.is_superuser):
+        raise PermissionDenied("You don't have permission to edit events.")
+
+    occurrence = series.occurrences.filter(occurrence_date=occurrence_date).first()
+    if occurrence is None:
+        if not is_occurrence(series, occurrence_date):
+            raise Http404('No such occurrence')
+        # Only store the occurrence for someone who will actually be able to register
+        if not editing and not make_occurrence(series, occurrence_date).can_register(request.user):
+            messages.error(request, 'Registration is not available for this event.')
+            return redirect('calendar:event_occurrence', pk=pk, occurrence_date=occurrence_date)
+        occurrence = materialize_occurrence(series, occurrence_date)
+
+    if editing:
+        return redirect('calendar:event_edit', pk=occurrence.pk)
+    return redirect('calendar:event_register', pk=occurrence.pk)
+
+
+@require_http_methods(["GET", "HEAD"])
+def ics_feed(request, key, category_id=None, registrations_only=False):
+    """ICS subscription feed of the club calendar, one category, or the member's registrations
+
+    The key in the URL is the member's CalendarFeedToken, which stands in for a session
+    since calendar apps cannot log in. Revoking or rotating the token breaks every link
+    that carries it.
+    """
+    user_id = CalendarFeedToken.objects.filter(key=key, user__is_active=True).values_list('user_id', flat=True).first()
+    if user_id is None:
+        raise Http404('Unknown calendar feed')
+
+    window_start = feed_window_start()
+    registrations = None
+    if registrations_only:
+        events, registrations = registration_feed(user_id, window_start)
+        name = 'My Yacht Club Events'
+    elif category_id is not None:
+        category = get_object_or_404(EventCategory, pk=category_id)
+        events = feed_events(window_start).filter(category=category)
+        name = f'Yacht Club Calendar: {category.name}'
+    else:
+        events = feed_events(window_start)
+        name = 'Yacht Club Calendar'
+
+    # The body is a pure function of the rows and these, so the ETag can be strong
+    site_url = request.build_absolute_uri('/')
+    etag, last_modified = ics_feed_validators(events, registrations, extra=(name, window_start, site_url))
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    chunks = calendar_chunks(
+        name, events,
+        event_url=lambda event: request.build_absolute_uri(event.get_absolute_url()),
+        uid_domain=request.get_host().split(':')[0],
+    )
+    return set_validators(StreamingHttpResponse(chunks, content_type=ICS_CONTENT_TYPE), etag, last_modified)
+
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def calendar_feeds(request):
+    """Show the member's calendar subscription links, and create, replace or revoke them"""
+    if request.method == 'POST':
+        if request.POST.get('action') == 'revoke':
+            CalendarFeedToken.revoke(request.user)
+            messages.success(request, 'Your calendar subscription links have been revoked.')
+        else:
+            CalendarFeedToken.rotate(request.user)
+            messages.success(request, 'New calendar subscription links are ready. Any old links no longer work.')
+        return redirect('calendar:calendar_feeds')
+
+    token = CalendarFeedToken.objects.filter(user=request.user).first()
+    feeds = []
+    if token is not None:
+        feeds.append(('All events', reverse('calendar:ics_feed', kwargs={'key': token.key})))
+        feeds.append(('My registrations', reverse('calendar:ics_registration_feed', kwargs={'key': token.key})))
+        for category in EventCategory.objects.all():
+            feeds.append((category.name, reverse(
+                'calendar:ics_category_feed', kwargs={'key': token.key, 'category_id': category.pk}
+            )))
+    context = {
+        'token': token,
+        'feeds': [
+            {'label': label, 'url': request.build_absolute_uri(path)} for label, path in feeds
+        ],
+    }
+    return render(request, 'CalendarApp/calendar_feeds.html', context)
 
 
 @login_required
 @require_http_methods(["GET"])
 def member_autocomplete(request):
     """API endpoint for member autocomplete search"""
-    from django.db.models import Q
-    
     query = request.GET.get('q', '').strip()
     
-    if len(query) < 2:
+    if not query:
         return JsonResponse({'results': []})
     
-    # Search by first name, last name, email, or nickname
-    members = ClubUser.objects.filter(is_active=True).filter(
-        Q(first_name__icontains=query) |
-        Q(last_name__icontains=query) |
-        Q(email__icontains=query) |
-        Q(nickname__icontains=query)
-    ).order_by('last_name', 'first_name')[:20]
+    # Indexed search over names, email, nickname, phone and vessel, best matches first;
+    # words too short for the trigram index are matched as last-name prefixes instead
+    members = ClubUser.objects.filter(is_active=True)
+    if is_indexable_query(query):
+        members = search_members(members, query)
+    else:
+        members = search_members_by_last_name(members, query)
+    members = rank_members(members, query).only('id', 'first_name', 'last_name', 'email')[:20]
     
     results = []
     for member in members:
@@ -356,7 +577,7 @@ def document_browser(request):
     """API endpoint for document browser - returns folders and files"""
     try:
         from DocumentManagement.models import DocumentFolder, DocumentFile
-        from DocumentManagement.utils import get_accessible_folders, check_folder_permission
+        from DocumentManagement.utils import get_accessible_folders, check_folder_permission, filter_folders_by_permission
     except ImportError:
         return JsonResponse({'error': 'Document Management not available'}, status=404)
     
@@ -374,13 +595,14 @@ def document_browser(request):
     # If searching, return search results
     if search_query:
         accessible_folders = get_accessible_folders(request.user, permission_type='view')
-        folder_ids = list(accessible_folders.values_list('id', flat=True))
         
         # Search files in accessible folders
         files = DocumentFile.objects.filter(
-            folder_id__in=folder_ids,
+            folder__in=accessible_folders,
             name__icontains=search_query
         ).select_related('folder').order_by('name')[:100]  # Limit to 100 results
+        files = list(files)
+        DocumentFolder.prefetch_ancestors(file_obj.folder for file_obj in files)
         
         for file_obj in files:
             response_data['files'].append({
@@ -418,15 +640,15 @@ def document_browser(request):
                 'path': current_folder.get_full_path(),
             })
             
-            # Get subfolders user can view
-            subfolders = current_folder.subfolders.all()
+            # Get subfolders user can view (their ancestors are the current folder's chain plus itself)
+            subfolders = filter_folders_by_permission(request.user, current_folder.subfolders.all(), 'view')
             for subfolder in subfolders:
-                if check_folder_permission(request.user, subfolder, 'view'):
-                    response_data['folders'].append({
-                        'id': subfolder.id,
-                        'name': subfolder.name,
-                        'path': subfolder.get_full_path(),
-                    })
+                subfolder._ancestors = ancestors + [current_folder]
+                response_data['folders'].append({
+                    'id': subfolder.id,
+                    'name': subfolder.name,
+                    'path': subfolder.get_full_path(),
+                })
             
             # Get files in current folder
             files = current_folder.files.all().order_by('name')
@@ -459,8 +681,6 @@ def document_browser(request):
 @login_required
 def event_register(request, pk):
     """Register a user (and optionally dependents/guests) for an event"""
-    from decimal import Decimal
-    
     event = get_object_or_404(Event, pk=pk)
     user = request.user
     
@@ -479,16 +699,17 @@ def event_register(request, pk):
         messages.info(request, 'You are already registered for this event.')
         return redirect('calendar:event_detail', pk=pk)
     
+    # Allowed member types and fees come from the cached snapshot, not the database
+    rules = get_registration_rules(event)
+    
     # Check if user's member types are allowed
-    user_member_types = user.member_types.filter(is_active=True)
-    if event.allowed_member_types.exists():
-        allowed_types = event.allowed_member_types.filter(is_active=True)
-        if not any(mt in allowed_types for mt in user_member_types):
-            messages.error(request, 'Your member type(s) are not allowed to register for this event.')
-            return redirect('calendar:event_detail', pk=pk)
+    user_member_type_ids = list(user.member_types.filter(is_active=True).values_list('pk', flat=True))
+    if not rules.allows(user_member_type_ids):
+        messages.error(request, 'Your member type(s) are not allowed to register for this event.')
+        return redirect('calendar:event_detail', pk=pk)
     
     if request.method == 'POST':
-        registration_form = EventRegistrationForm(request.POST, event=event, user=user)
+        registration_form = EventRegistrationForm(request.POST, event=event, user=user, rules=rules)
         guest_formset = EventGuestFormSet(request.POST, prefix='guests')
         
         # Debug: Check form validation
@@ -517,75 +738,85 @@ def event_register(request, pk):
                             messages.error(request, f'Guest form {i+1}, {field}: {error}')
         
         if registration_form.is_valid() and guest_formset.is_valid():
-            # Calculate total fee
-            total_fee = Decimal('0.00')
-            
-            # Fee for primary member
-            primary_member_types = user.member_types.filter(is_active=True)
-            for member_type in primary_member_types:
-                try:
-                    fee = event.registration_fees.get(member_type=member_type)
-                    total_fee += fee.fee_amount
-                    break  # Use first matching fee
-                except EventRegistrationFee.DoesNotExist:
-                    pass
-            
-            # Fees for additional members
             additional_members = registration_form.cleaned_data.get('additional_members', [])
-            for member in additional_members:
-                member_types = member.member_types.filter(is_active=True)
-                for member_type in member_types:
-                    try:
-                        fee = event.registration_fees.get(member_type=member_type)
-                        total_fee += fee.fee_amount
-                        break  # Use first matching fee
-                    except EventRegistrationFee.DoesNotExist:
-                        pass
-            
-            # Create registration
-            registration = registration_form.save(commit=False)
-            registration.event = event
-            registration.member = user
-            registration.total_fee = total_fee
-            registration.save()
-            registration_form.save_m2m()  # Save additional_members many-to-many
+            guests = [
+                guest_form.save(commit=False) for guest_form in guest_formset
+                if guest_form.cleaned_data and not guest_form.cleaned_data.get('DELETE', False)
+                # Only save if guest has a name (required field)
+                and guest_form.cleaned_data.get('name', '').strip()
+            ]
+            # Everyone on the registration, with their active member types for fee resolution
+            people = [(RegistrationLineItem.PRIMARY, user.pk, user_member_type_ids)]
+            people += [
+                (RegistrationLineItem.ADDITIONAL, member.pk, registration_form.additional_member_type_ids.get(member.pk, []))
+                for member in additional_members
+            ]
+            seat_count = len(people) + len(guests)
             
-            # Save guests
-            for guest_form in guest_formset:
-                if guest_form.cleaned_data and not guest_form.cleaned_data.get('DELETE', False):
-                    # Only save if guest has a name (required field)
-                    guest_name = guest_form.cleaned_data.get('name', '').strip()
-                    if guest_name:
-                        guest = guest_form.save(commit=False)
+            try:
+                with transaction.atomic():
+                    registration = EventRegistration.objects.select_for_update().filter(event=event, member=user).first()
+                    if registration and not registration.cancelled:
+                        messages.info(request, 'You are already registered for this event.')
+                        return redirect('calendar:event_detail', pk=pk)
+                    
+                    if registration is None:
+                        registration = EventRegistration(event=event, member=user)
+                    else:
+                        # (event, member) is unique, so re-registering after a cancellation reuses the row
+                        registration.cancelled = False
+                        registration.cancelled_at = None
+                        registration.registered_at = timezone.now()
+                        registration.guests.all().delete()
+                        registration.line_items.all().delete()
+                    
+                    # Resolve each person's fee once, and keep it as a line item
+                    line_items = build_line_items(
+                        registration, get_fee_table(event), people, guests, rules.guest_member_type_id
+                    )
+                    total_fee = sum((item.amount for item in line_items), NO_FEE)
+                    registration.notes = registration_form.cleaned_data.get('notes', '')
+                    registration.total_fee = total_fee
+                    registration.seat_count = seat_count
+                    # Join the back of an existing waitlist rather than taking seats freed for it
+                    has_waitlist = event.capacity is not None and event.registrations.filter(
+                        cancelled=False, waitlisted=True
+                    ).exists()
+                    registration.waitlisted = has_waitlist or not Event.reserve_seats(event.pk, seat_count)
+                    registration.save()
+                    registration.additional_members.set(additional_members)
+                    
+                    # Save guests
+                    for guest in guests:
                         guest.event = event
                         guest.registration = registration
                         guest.save()
+                    RegistrationLineItem.objects.bulk_create(line_items)
+            except IntegrityError:
+                # A concurrent request registered this member first
+                messages.info(request, 'You are already registered for this event.')
+                return redirect('calendar:event_detail', pk=pk)
             
-            messages.success(request, f'You have successfully registered for "{event.title}"!')
+            if registration.waitlisted:
+                messages.warning(
+                    request,
+                    f'"{event.title}" is full, so you have been added to the waitlist. '
+                    'You will be registered automatically if seats become available.'
+                )
+            else:
+                messages.success(request, f'You have successfully registered for "{event.title}"!')
             if total_fee > 0:
                 messages.info(request, f'Total registration fee: ${total_fee:.2f}')
             return redirect('calendar:event_detail', pk=pk)
     else:
-        registration_form = EventRegistrationForm(event=event, user=user)
+        registration_form = EventRegistrationForm(event=event, user=user, rules=rules)
         guest_formset = EventGuestFormSet(prefix='guests')
     
     # Get fee information for display
-    fee_info = {}
-    if event.registration_fees.exists():
-        for fee in event.registration_fees.all():
-            fee_info[str(fee.member_type.pk)] = str(fee.fee_amount)
+    fee_info = get_fee_table(event).fee_info()
     
-    # Check if guests are allowed (if there's a "Guest" member type in allowed_member_types)
-    guests_allowed = False
-    if event.allowed_member_types.exists():
-        guest_types = event.allowed_member_types.filter(
-            is_active=True,
-            name__icontains='guest'
-        )
-        guests_allowed = guest_types.exists()
-    else:
-        # If no restrictions on member types, allow guests
-        guests_allowed = True
+    # Guests are allowed if there's a "Guest" member type in allowed_member_types (or no restrictions)
+    guests_allowed = rules.guests_allowed
     
     # Get available child members for display in template
     available_child_members = []
@@ -616,7 +847,10 @@ def event_unregister(request, pk):
     try:
         registration = EventRegistration.objects.get(event=event, member=user, cancelled=False)
         registration.cancel()
-        messages.success(request, f'You have successfully unregistered from "{event.title}".')
+        if registration.waitlisted:
+            messages.success(request, f'You have been removed from the waitlist for "{event.title}".')
+        else:
+            messages.success(request, f'You have successfully unregistered from "{event.title}".')
     except EventRegistration.DoesNotExist:
         messages.error(request, 'You are not registered for this event.')
     
@@ -7,14 +7,14 @@ class DocumentFolderAdmin(admin.ModelAdmin):
     list_display = ['name', 'parent', 'created_by', 'created_at', 'file_count', 'subfolder_count']
     list_filter = ['created_at', 'parent']
     search_fields = ['name', 'description']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['path', 'created_at', 'updated_at']
     
     fieldsets = (
         ('Folder Information', {
             'fields': ('name', 'parent', 'description')
         }),
         ('Metadata', {
-            'fields': ('created_by', 'created_at', 'updated_at'),
+            'fields': ('path', 'created_by', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
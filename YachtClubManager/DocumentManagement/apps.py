@@ -5,3 +5,6 @@ class DocumentmanagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'DocumentManagement'
     verbose_name = 'Document Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from DocumentManagement.models import EffectiveFolderPermission
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cascaded effective folder permissions from the folder permission rules'
+
+    def handle(self, *args, **options):
+        EffectiveFolderPermission.rebuild()
+        count = EffectiveFolderPermission.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt {count} effective folder permission(s)'))
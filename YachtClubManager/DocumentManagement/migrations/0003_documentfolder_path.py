@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:13
+
+from django.db import migrations, models
+
+
+def populate_folder_paths(apps, schema_editor):
+    """Compute the materialized path of every existing folder"""
+    DocumentFolder = apps.get_model('DocumentManagement', 'DocumentFolder')
+    parents = dict(DocumentFolder.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def build_path(folder_id):
+        # Walk up until a folder with a known path (or the root) is found, then fill in downwards
+        chain = []
+        current = folder_id
+        while current is not None and current not in paths:
+            chain.append(current)
+            current = parents.get(current)
+        prefix = paths.get(current, '')
+        for pk in reversed(chain):
+            prefix = f'{prefix}{pk}/'
+            paths[pk] = prefix
+        return paths[folder_id]
+
+    folders = list(DocumentFolder.objects.all())
+    for folder in folders:
+        folder.path = build_path(folder.id)
+    DocumentFolder.objects.bulk_update(folders, ['path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DocumentManagement', '0002_alter_documentfile_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentfolder',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Materialized path of folder IDs from the root, e.g. "1/5/9/"', max_length=255),
+        ),
+        migrations.RunPython(populate_folder_paths, migrations.RunPython.noop),
+    ]
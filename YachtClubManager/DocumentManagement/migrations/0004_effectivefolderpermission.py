@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+PERMISSION_FIELDS = ('can_view', 'can_add', 'can_edit', 'can_delete')
+
+
+def build_effective_permissions(apps, schema_editor):
+    """Cascade existing folder permissions down every folder's path"""
+    DocumentFolder = apps.get_model('DocumentManagement', 'DocumentFolder')
+    FolderPermission = apps.get_model('DocumentManagement', 'FolderPermission')
+    EffectiveFolderPermission = apps.get_model('DocumentManagement', 'EffectiveFolderPermission')
+
+    grants = {}
+    for row in FolderPermission.objects.values('folder_id', 'role_id', *PERMISSION_FIELDS):
+        grants.setdefault(row['folder_id'], []).append(row)
+
+    rows = []
+    for folder_id, path in DocumentFolder.objects.values_list('id', 'path'):
+        bits = {}
+        for ancestor_id in path.split('/')[:-1]:
+            for grant in grants.get(int(ancestor_id), ()):
+                role_bits = bits.setdefault(grant['role_id'], dict.fromkeys(PERMISSION_FIELDS, False))
+                for field in PERMISSION_FIELDS:
+                    role_bits[field] = role_bits[field] or grant[field]
+        rows.extend(
+            EffectiveFolderPermission(folder_id=folder_id, role_id=role_id, **role_bits)
+            for role_id, role_bits in bits.items()
+            if any(role_bits.values())
+        )
+    EffectiveFolderPermission.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DocumentManagement', '0003_documentfolder_path'),
+        ('ManagementApp', '0007_clubuser_parent_member_clubuser_relationship_type_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectiveFolderPermission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('can_view', models.BooleanField(default=False)),
+                ('can_add', models.BooleanField(default=False)),
+                ('can_edit', models.BooleanField(default=False)),
+                ('can_delete', models.BooleanField(default=False)),
+                ('folder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_permissions', to='DocumentManagement.documentfolder')),
+                ('role', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_folder_permissions', to='ManagementApp.role')),
+            ],
+            options={
+                'verbose_name': 'Effective Folder Permission',
+                'verbose_name_plural': 'Effective Folder Permissions',
+                'unique_together': {('folder', 'role')},
+            },
+        ),
+        migrations.RunPython(build_effective_permissions, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.core.exceptions import ValidationError
@@ -25,14 +27,11 @@ def sanitize_folder_name(name):
 
 def get_document_upload_path(instance, filename):
     """Generate upload path based on folder hierarchy"""
-    # Get the folder path
+    # Build path from root to current folder (ancestors come from the materialized path in one query)
     folder_path_parts = []
-    current_folder = instance.folder
-    
-    # Build path from root to current folder
-    while current_folder:
-        folder_path_parts.insert(0, sanitize_folder_name(current_folder.name))
-        current_folder = current_folder.parent
+    if instance.folder:
+        folders = instance.folder.get_all_ancestors() + [instance.folder]
+        folder_path_parts = [sanitize_folder_name(folder.name) for folder in folders]
     
     # Join folder parts (use forward slashes - Django handles OS-specific paths)
     folder_path = '/'.join(folder_path_parts) if folder_path_parts else 'root'
@@ -54,6 +53,14 @@ class DocumentFolder(models.Model):
         help_text='Parent folder (leave empty for root folder)'
     )
     description = models.TextField(blank=True, help_text='Folder description')
+    path = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False,
+        help_text='Materialized path of folder IDs from the root, e.g. "1/5/9/"'
+    )
     created_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -73,48 +80,103 @@ class DocumentFolder(models.Model):
     def __str__(self):
         return self.get_full_path()
     
+    def save(self, *args, **kwargs):
+        """Save the folder and keep the materialized path of it and its subtree up to date"""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'path'}
+        
+        with transaction.atomic():
+            parent_path = ''
+            if self.parent_id:
+                parent_path = DocumentFolder.objects.values_list('path', flat=True).get(pk=self.parent_id)
+            
+            old_path = None
+            if self.pk:
+                old_path = DocumentFolder.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+                self.path = f'{parent_path}{self.pk}/'
+            
+            super().save(*args, **kwargs)
+            
+            if old_path is None:
+                # New folder - its own ID is only known after the insert
+                self.path = f'{parent_path}{self.pk}/'
+                DocumentFolder.objects.filter(pk=self.pk).update(path=self.path)
+            elif old_path and old_path != self.path:
+                # Folder was moved - rewrite the path prefix of the whole subtree in one statement
+                DocumentFolder.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1), output_field=models.CharField())
+                )
+            
+            if old_path != self.path:
+                # New or moved folders inherit different permissions, so re-cascade them
+                EffectiveFolderPermission.rebuild(self)
+        
+        self.__dict__.pop('_ancestors', None)
+    
+    def get_ancestor_ids(self):
+        """Get ancestor folder IDs (root first) from the materialized path without querying"""
+        return [int(pk) for pk in self.path.split('/')[:-2]]
+    
     def get_full_path(self):
         """Get the full path of the folder"""
-        if self.parent:
-            return f"{self.parent.get_full_path()}/{self.name}"
-        return self.name
+        names = [ancestor.name for ancestor in self.get_all_ancestors()]
+        names.append(self.name)
+        return '/'.join(names)
     
     def get_filesystem_path(self):
         """Get filesystem-safe path of the folder"""
-        if self.parent:
-            parent_path = self.parent.get_filesystem_path()
-            return os.path.join(parent_path, sanitize_folder_name(self.name))
-        return sanitize_folder_name(self.name)
+        parts = [sanitize_folder_name(ancestor.name) for ancestor in self.get_all_ancestors()]
+        parts.append(sanitize_folder_name(self.name))
+        return os.path.join(*parts)
     
     def clean(self):
         """Validate that folder doesn't reference itself as parent"""
         if self.parent == self:
             raise ValidationError('A folder cannot be its own parent.')
         
-        # Prevent circular references
-        if self.parent:
-            current = self.parent
-            while current:
-                if current == self:
-                    raise ValidationError('Circular reference detected in folder hierarchy.')
-                current = current.parent
+        # Prevent circular references - the new parent must not live inside this folder's subtree
+        if self.parent and self.pk and self.path and self.parent.path.startswith(self.path):
+            raise ValidationError('Circular reference detected in folder hierarchy.')
     
     def get_all_ancestors(self):
-        """Get all ancestor folders"""
-        ancestors = []
-        current = self.parent
-        while current:
-            ancestors.insert(0, current)
-            current = current.parent
-        return ancestors
+        """Get all ancestor folders (root first) in a single query"""
+        ancestors = self.__dict__.get('_ancestors')
+        if ancestors is None and not self.path and self.parent_id:
+            # Not saved yet, so there is no path - derive the chain from the parent instead
+            ancestors = self.parent.get_all_ancestors() + [self.parent]
+        elif ancestors is None:
+            ancestor_ids = self.get_ancestor_ids()
+            folders_by_id = DocumentFolder.objects.in_bulk(ancestor_ids) if ancestor_ids else {}
+            ancestors = [folders_by_id[pk] for pk in ancestor_ids if pk in folders_by_id]
+            # Each ancestor's own ancestors are the ones above it, so breadcrumbs need no further queries
+            for index, ancestor in enumerate(ancestors):
+                ancestor._ancestors = ancestors[:index]
+            self._ancestors = ancestors
+        return list(ancestors)
+    
+    def get_subtree(self, include_self=True):
+        """Get a queryset of this folder's descendants (and optionally itself) via the path index"""
+        subtree = DocumentFolder.objects.filter(path__startswith=self.path)
+        if not include_self:
+            subtree = subtree.exclude(pk=self.pk)
+        return subtree
     
     def get_all_descendants(self):
-        """Get all descendant folders recursively"""
-        descendants = []
-        for subfolder in self.subfolders.all():
-            descendants.append(subfolder)
-            descendants.extend(subfolder.get_all_descendants())
-        return descendants
+        """Get all descendant folders in a single query"""
+        if not self.path:
+            return []
+        return list(self.get_subtree(include_self=False).order_by('path'))
+    
+    @classmethod
+    def prefetch_ancestors(cls, folders):
+        """Load the ancestors of many folders in one query so get_full_path() needs no further queries"""
+        folders = list(folders)
+        ancestor_ids = {pk for folder in folders for pk in folder.get_ancestor_ids()}
+        folders_by_id = cls.objects.in_bulk(ancestor_ids) if ancestor_ids else {}
+        for folder in list(folders_by_id.values()) + folders:
+            folder._ancestors = [folders_by_id[pk] for pk in folder.get_ancestor_ids() if pk in folders_by_id]
+        return folders
     
     def get_absolute_url(self):
         return reverse('document_management:folder_detail', kwargs={'pk': self.pk})
@@ -163,6 +225,85 @@ class FolderPermission(models.Model):
         return f"{self.folder.name} - {self.role.get_name_display()}"
 
 
+class EffectiveFolderPermission(models.Model):
+    """Cascaded folder permissions per role, so a permission check is a single lookup"""
+    PERMISSION_FIELDS = ('can_view', 'can_add', 'can_edit', 'can_delete')
+    
+    folder = models.ForeignKey(
+        DocumentFolder,
+        on_delete=models.CASCADE,
+        related_name='effective_permissions'
+    )
+    role = models.ForeignKey(
+        Role,
+        on_delete=models.CASCADE,
+        related_name='effective_folder_permissions'
+    )
+    can_view = models.BooleanField(default=False)
+    can_add = models.BooleanField(default=False)
+    can_edit = models.BooleanField(default=False)
+    can_delete = models.BooleanField(default=False)
+    
+    class Meta:
+        unique_together = [['folder', 'role']]
+        verbose_name = 'Effective Folder Permission'
+        verbose_name_plural = 'Effective Folder Permissions'
+    
+    def __str__(self):
+        granted = [field[4:] for field in self.PERMISSION_FIELDS if getattr(self, field)]
+        return f"{self.folder_id} - {self.role_id}: {', '.join(granted)}"
+    
+    @classmethod
+    def rebuild(cls, folder=None, role_id=None):
+        """
+        Recompute effective permissions for a folder's subtree (or every folder).
+        
+        A folder's effective bits are the OR of the FolderPermission rows on the
+        folder and all of its ancestors. Limiting to role_id only touches that role.
+        """
+        with transaction.atomic():
+            if folder is not None:
+                root_path = DocumentFolder.objects.filter(pk=folder.pk).values_list('path', flat=True).first()
+                if not root_path:
+                    # Folder no longer exists (e.g. deleted in the same transaction)
+                    return
+                subtree = DocumentFolder.objects.filter(path__startswith=root_path)
+                # Permissions on the subtree itself plus the ancestors above its root
+                source_ids = [int(pk) for pk in root_path.split('/')[:-2]]
+                source = FolderPermission.objects.filter(
+                    models.Q(folder__path__startswith=root_path) | models.Q(folder_id__in=source_ids)
+                )
+            else:
+                subtree = DocumentFolder.objects.all()
+                source = FolderPermission.objects.all()
+            
+            existing = cls.objects.filter(folder__in=subtree)
+            if role_id is not None:
+                source = source.filter(role_id=role_id)
+                existing = existing.filter(role_id=role_id)
+            
+            grants = {}
+            for row in source.values('folder_id', 'role_id', *cls.PERMISSION_FIELDS):
+                grants.setdefault(row['folder_id'], []).append(row)
+            
+            rows = []
+            for folder_id, path in subtree.values_list('id', 'path'):
+                bits = {}
+                for ancestor_id in path.split('/')[:-1]:
+                    for grant in grants.get(int(ancestor_id), ()):
+                        role_bits = bits.setdefault(grant['role_id'], dict.fromkeys(cls.PERMISSION_FIELDS, False))
+                        for field in cls.PERMISSION_FIELDS:
+                            role_bits[field] = role_bits[field] or grant[field]
+                rows.extend(
+                    cls(folder_id=folder_id, role_id=grant_role_id, **role_bits)
+                    for grant_role_id, role_bits in bits.items()
+                    if any(role_bits.values())
+                )
+            
+            existing.delete()
+            cls.objects.bulk_create(rows, batch_size=500)
+
+
 class DocumentFile(models.Model):
     """Files stored within document folders"""
     folder = models.ForeignKey(
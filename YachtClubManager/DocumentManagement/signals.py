@@ -0,0 +1,37 @@
+"""
+Signal handlers that keep the effective folder-permission table in sync
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import DocumentFolder, EffectiveFolderPermission, FolderPermission
+
+
+@receiver(pre_save, sender=FolderPermission)
+def folder_permission_saving(sender, instance, **kwargs):
+    """Remember the stored (folder, role) of an edited grant, which may be moved to another folder or role"""
+    instance._stored_grant = None
+    if instance.pk is not None:
+        instance._stored_grant = FolderPermission.objects.filter(pk=instance.pk).values_list(
+            'folder_id', 'role_id'
+        ).first()
+
+
+@receiver(post_save, sender=FolderPermission)
+def folder_permission_saved(sender, instance, **kwargs):
+    """Re-cascade the changed role over the folder's subtree, and the grant's old (folder, role) if it moved"""
+    EffectiveFolderPermission.rebuild(instance.folder, role_id=instance.role_id)
+    stored = getattr(instance, '_stored_grant', None)
+    if stored is not None and stored != (instance.folder_id, instance.role_id):
+        folder_id, role_id = stored
+        EffectiveFolderPermission.rebuild(DocumentFolder(pk=folder_id), role_id=role_id)
+
+
+@receiver(post_delete, sender=FolderPermission)
+def folder_permission_deleted(sender, instance, **kwargs):
+    """Re-cascade once the surrounding delete (possibly of the folder itself) has committed"""
+    folder = DocumentFolder(pk=instance.folder_id)
+    transaction.on_commit(partial(EffectiveFolderPermission.rebuild, folder, role_id=instance.role_id))
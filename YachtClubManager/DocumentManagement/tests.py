@@ -1,3 +1,65 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from ManagementApp.benchmarks import BenchmarkTestCase
+from ManagementApp.models import ClubUser, Role
+
+from .models import DocumentFolder, FolderPermission
+from .utils import check_folder_permission
+
+# (max queries, max seconds) per view - raise a budget only together with the change that needs it
+VIEW_BUDGETS = {
+    'folder_detail_root': (20, 1.0),
+    'folder_detail_deep': (14, 1.0),
+}
+
+
+class DocumentViewBenchmarkTests(BenchmarkTestCase):
+    """Query-count and latency budgets for the document views"""
+
+    def test_folder_detail_root(self):
+        self.assertWithinBudget(
+            'folder_detail_root', VIEW_BUDGETS['folder_detail_root'],
+            reverse('document_management:folder_detail', kwargs={'pk': self.root_folder.pk})
+        )
+
+    def test_folder_detail_deep(self):
+        self.assertWithinBudget(
+            'folder_detail_deep', VIEW_BUDGETS['folder_detail_deep'],
+            reverse('document_management:folder_detail', kwargs={'pk': self.deep_folder.pk})
+        )
+
+
+class EffectiveFolderPermissionTests(TestCase):
+    """Editing a grant re-cascades both the role and folder it had and the ones it has now"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = ClubUser.objects.create_user(
+            email='viewer@example.com', password='viewer', first_name='View', last_name='Er',
+            role=Role.get_viewer_role(),
+        )
+        cls.member = ClubUser.objects.create_user(
+            email='member@example.com', password='member', first_name='Mem', last_name='Ber',
+            role=Role.get_member_role(),
+        )
+        cls.root = DocumentFolder.objects.create(name='Minutes')
+        cls.child = DocumentFolder.objects.create(name='2025', parent=cls.root)
+        cls.other = DocumentFolder.objects.create(name='Charts')
+
+    def test_changing_the_role_revokes_the_old_role(self):
+        grant = FolderPermission.objects.create(folder=self.root, role=self.viewer.role, can_view=True)
+        self.assertTrue(check_folder_permission(self.viewer, self.child))
+
+        grant = FolderPermission.objects.get(pk=grant.pk)
+        grant.role = self.member.role
+        grant.save()
+        self.assertFalse(check_folder_permission(self.viewer, self.child))
+        self.assertTrue(check_folder_permission(self.member, self.child))
+
+    def test_moving_the_grant_revokes_the_old_folder(self):
+        grant = FolderPermission.objects.create(folder=self.root, role=self.viewer.role, can_view=True)
+        grant.folder = self.other
+        grant.save()
+        self.assertFalse(check_folder_permission(self.viewer, self.child))
+        self.assertTrue(check_folder_permission(self.viewer, self.other))
@@ -8,7 +8,12 @@ def get_user_roles(user):
     """Get all roles for a user"""
     if not user.is_authenticated:
         return Role.objects.none()
-    return user.roles.all()
+    return Role.objects.filter(pk=user.role_id)
+
+
+def _has_folder_admin_access(user):
+    """Admin users have all folder permissions"""
+    return user.has_permission('manage_users') or user.has_permission('access_admin')
 
 
 def check_folder_permission(user, folder, permission_type='view'):
@@ -24,40 +29,49 @@ def check_folder_permission(user, folder, permission_type='view'):
     Returns:
         bool: True if user has permission, False otherwise
     """
-    from .models import FolderPermission
+    from .models import EffectiveFolderPermission
     
     if not user.is_authenticated:
         return False
     
     # Admin users have all permissions
-    if user.has_permission('manage_users') or user.has_permission('access_admin'):
+    if _has_folder_admin_access(user):
         return True
     
-    # Get all user roles
-    user_roles = get_user_roles(user)
-    if not user_roles.exists():
+    if not user.role_id:
         return False
     
-    # Check permissions starting from root folder up to current folder
-    folders_to_check = folder.get_all_ancestors() + [folder]
-    
-    for folder_to_check in folders_to_check:
-        # Check if any of user's roles have the required permission
-        for role in user_roles:
-            try:
-                perm = FolderPermission.objects.get(folder=folder_to_check, role=role)
-                if permission_type == 'view' and perm.can_view:
-                    return True
-                elif permission_type == 'add' and perm.can_add:
-                    return True
-                elif permission_type == 'edit' and perm.can_edit:
-                    return True
-                elif permission_type == 'delete' and perm.can_delete:
-                    return True
-            except FolderPermission.DoesNotExist:
-                continue
-    
-    return False
+    # Cascading is precomputed, so this is a single indexed lookup
+    return EffectiveFolderPermission.objects.filter(
+        folder_id=folder.pk,
+        role_id=user.role_id,
+        **{f'can_{permission_type}': True}
+    ).exists()
+
+
+def filter_folders_by_permission(user, folders, permission_type='view'):
+    """
+    Filter a list of folders down to those the user has a permission on,
+    using one query for the whole list instead of one check per folder.
+    """
+    from .models import EffectiveFolderPermission
+    
+    folders = list(folders)
+    if not user.is_authenticated or not folders:
+        return []
+    
+    if _has_folder_admin_access(user):
+        return folders
+    
+    if not user.role_id:
+        return []
+    
+    allowed_ids = set(EffectiveFolderPermission.objects.filter(
+        folder_id__in=[folder.pk for folder in folders],
+        role_id=user.role_id,
+        **{f'can_{permission_type}': True}
+    ).values_list('folder_id', flat=True))
+    return [folder for folder in folders if folder.pk in allowed_ids]
 
 
 def get_accessible_folders(user, permission_type='view'):
@@ -71,35 +85,24 @@ def get_accessible_folders(user, permission_type='view'):
     Returns:
         QuerySet: Folders the user can access
     """
-    from .models import DocumentFolder, FolderPermission
+    from .models import DocumentFolder
     
     if not user.is_authenticated:
         return DocumentFolder.objects.none()
     
     # Admin users can access all folders
-    if user.has_permission('manage_users') or user.has_permission('access_admin'):
+    if _has_folder_admin_access(user):
         return DocumentFolder.objects.all()
     
-    # Get user roles
-    user_roles = get_user_roles(user)
-    if not user_roles.exists():
+    if not user.role_id:
         return DocumentFolder.objects.none()
     
-    # Get folders where user has the required permission
-    permission_field = f'can_{permission_type}'
-    permissions = FolderPermission.objects.filter(
-        role__in=user_roles,
-        **{permission_field: True}
-    ).select_related('folder')
-    
-    folder_ids = set()
-    for perm in permissions:
-        folder_ids.add(perm.folder_id)
-        # Include all subfolders (permissions cascade down)
-        for descendant in perm.folder.get_all_descendants():
-            folder_ids.add(descendant.id)
-    
-    return DocumentFolder.objects.filter(id__in=folder_ids)
+    # Cascading is precomputed, so one join finds every folder - the queryset stays lazy
+    # and can be used directly as a subquery (e.g. folder__in=...)
+    return DocumentFolder.objects.filter(
+        effective_permissions__role_id=user.role_id,
+        **{f'effective_permissions__can_{permission_type}': True}
+    )
 
 
 def can_access_folder(user, folder, permission_type='view'):
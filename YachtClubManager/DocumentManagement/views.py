@@ -16,7 +16,7 @@ from .mixins import (
     FolderEditMixin,
     FolderDeleteMixin
 )
-from .utils import get_accessible_folders, check_folder_permission
+from .utils import get_accessible_folders, check_folder_permission, filter_folders_by_permission
 
 
 class FolderListView(DocumentManagementRequiredMixin, ListView):
@@ -47,12 +47,7 @@ class FolderDetailView(FolderViewMixin, DetailView):
         folder = self.object
         
         # Get subfolders user can view
-        subfolders = folder.subfolders.all()
-        accessible_subfolders = [
-            sf for sf in subfolders 
-            if check_folder_permission(self.request.user, sf, 'view')
-        ]
-        context['subfolders'] = accessible_subfolders
+        context['subfolders'] = filter_folders_by_permission(self.request.user, folder.subfolders.all(), 'view')
         
         # Get files user can view (if they have view permission on folder)
         context['files'] = folder.files.all().order_by('name')
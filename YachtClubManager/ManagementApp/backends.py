@@ -0,0 +1,15 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+ClubUser = get_user_model()
+
+
+class ClubUserBackend(ModelBackend):
+    """Model backend that loads the user's role in the same query as the user"""
+
+    def get_user(self, user_id):
+        try:
+            user = ClubUser._default_manager.select_related('role').get(pk=user_id)
+        except ClubUser.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,239 @@
+"""
+Shared fixtures for the view benchmark tests.
+
+Each app's tests.py seeds the same club through BenchmarkTestCase and checks
+that its views stay within a stored query-count budget. Wall-time budgets depend
+on the machine and on whatever else shares the test database, so they are only
+enforced with BENCHMARK_ENFORCE_TIMINGS=1 in the environment. The measurements
+are logged to the ManagementApp.benchmarks logger at INFO level.
+"""
+import logging
+import os
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import ClubUser, MemberType, Role
+
+logger = logging.getLogger(__name__)
+
+ENFORCE_TIMINGS = os.getenv('BENCHMARK_ENFORCE_TIMINGS', '').lower() in ('true', '1', 'yes', 'on')
+
+# Size of the seeded club - large enough that per-row queries show up in the counts
+BENCHMARK_MEMBERS = 60
+BENCHMARK_DEPENDENTS_PER_MEMBER = 2
+BENCHMARK_EVENTS = 24
+BENCHMARK_REGISTRATIONS_PER_EVENT = 15
+BENCHMARK_GUESTS_PER_REGISTRATION = 1
+BENCHMARK_FOLDER_DEPTH = 5
+BENCHMARK_FOLDERS_PER_LEVEL = 3
+BENCHMARK_FILES_PER_FOLDER = 4
+
+
+class BenchmarkTestCase(TestCase):
+    """Seeds a realistic club once per test class and measures views through the test client"""
+    results = None
+
+    @classmethod
+    def setUpTestData(cls):
+        from CalendarApp.models import (
+            Event, EventCategory, EventContact, EventGuest, EventRegistration, EventRegistrationFee
+        )
+        from CalendarApp.fees import write_line_items
+        from DocumentManagement.models import DocumentFile, DocumentFolder, FolderPermission
+
+        # Start from a cold cache so no earlier test's cached rows leak in
+        cache.clear()
+        now = timezone.now()
+        cls.editor_role = Role.get_editor_role()
+        member_role = Role.get_member_role()
+
+        full_member = MemberType.objects.create(name='Full Member', can_be_parent=True, display_order=1)
+        junior = MemberType.objects.create(name='Junior', can_be_child=True, display_order=2)
+        guest = MemberType.objects.create(name='Guest', display_order=3)
+        member_types = [full_member, junior, guest]
+
+        # Members, each with dependents
+        members = ClubUser.objects.bulk_create([
+            ClubUser(
+                email=f'member{i}@example.com',
+                first_name=f'First{i}',
+                last_name=f'Last{i:03d}',
+                role=member_role,
+                address1=f'{i} Harbour Road',
+                city='Seaport',
+                state='WA',
+                zip_code='98000',
+                primary_phone_number='+12065550100',
+                vessel_name=f'Vessel {i}',
+            )
+            for i in range(BENCHMARK_MEMBERS)
+        ])
+        cls.user = ClubUser.objects.create_user(
+            email='benchmark@example.com',
+            password='benchmark',
+            first_name='Bench',
+            last_name='Mark',
+            role=cls.editor_role,
+        )
+        members.append(cls.user)
+        dependents = ClubUser.objects.bulk_create([
+            ClubUser(
+                email=f'dependent{i}-{j}@example.com',
+                first_name=f'Child{j}',
+                last_name=member.last_name,
+                role=member_role,
+                parent_member=member,
+                relationship_type='Child',
+            )
+            for i, member in enumerate(members)
+            for j in range(BENCHMARK_DEPENDENTS_PER_MEMBER)
+        ])
+        MemberTypeLink = ClubUser.member_types.through
+        MemberTypeLink.objects.bulk_create(
+            [MemberTypeLink(clubuser_id=member.pk, membertype_id=full_member.pk) for member in members]
+            + [MemberTypeLink(clubuser_id=dependent.pk, membertype_id=junior.pk) for dependent in dependents]
+        )
+        dependents_by_parent = {}
+        for dependent in dependents:
+            dependents_by_parent.setdefault(dependent.parent_member_id, []).append(dependent)
+
+        # Events spread over the current month, each with fees, contacts and registrations
+        categories = EventCategory.objects.bulk_create([
+            EventCategory(name=name, color=color)
+            for name, color in [('Racing', '#dc3545'), ('Social', '#198754'), ('Cruising', '#0d6efd')]
+        ])
+        events = Event.objects.bulk_create([
+            Event(
+                title=f'Benchmark Event {i}',
+                short_description='Seeded for the view benchmarks',
+                formatted_description='<p>Seeded for the view benchmarks</p>',
+                category=categories[i % len(categories)],
+                start_datetime=now + timedelta(days=i - BENCHMARK_EVENTS // 2, hours=1),
+                end_datetime=now + timedelta(days=i - BENCHMARK_EVENTS // 2, hours=4),
+                registration_status='required',
+                registrant_list_visibility='members',
+            )
+            for i in range(BENCHMARK_EVENTS)
+        ])
+        EventRegistrationFee.objects.bulk_create([
+            EventRegistrationFee(event=event, member_type=member_type, fee_amount=Decimal(amount))
+            for event in events
+            for member_type, amount in zip(member_types, ['40.00', '15.00', '25.00'])
+        ])
+        EventContact.objects.bulk_create([
+            EventContact(event=event, member=members[i % len(members)], is_primary=True)
+            for i, event in enumerate(events)
+        ])
+        registrations = EventRegistration.objects.bulk_create([
+            EventRegistration(event=event, member=members[(i + j) % BENCHMARK_MEMBERS])
+            for i, event in enumerate(events)
+            for j in range(BENCHMARK_REGISTRATIONS_PER_EVENT)
+        ])
+        AdditionalMemberLink = EventRegistration.additional_members.through
+        additional_links = AdditionalMemberLink.objects.bulk_create([
+            AdditionalMemberLink(eventregistration_id=registration.pk, clubuser_id=dependent.pk)
+            for registration in registrations
+            for dependent in dependents_by_parent.get(registration.member_id, [])[:1]
+        ])
+        guests = EventGuest.objects.bulk_create([
+            EventGuest(event_id=registration.event_id, registration=registration, name=f'Guest {registration.pk}-{k}')
+            for registration in registrations
+            for k in range(BENCHMARK_GUESTS_PER_REGISTRATION)
+        ])
+        write_line_items(registrations)
+        cls.registrant_count = len(registrations) + len(additional_links) + len(guests)
+        Event.recount_registrations(events)
+        cls.event = events[-1]
+        cls.open_event = Event.objects.create(
+            title='Benchmark Open Event',
+            short_description='Open for registration',
+            start_datetime=now + timedelta(days=30),
+            end_datetime=now + timedelta(days=30, hours=3),
+            registration_status='required',
+        )
+        EventRegistrationFee.objects.bulk_create([
+            EventRegistrationFee(event=cls.open_event, member_type=member_type, fee_amount=Decimal('20.00'))
+            for member_type in member_types
+        ])
+
+        # A deep folder tree, readable by the benchmark user's role from the top
+        cls.root_folder = DocumentFolder.objects.create(name='Benchmark Root')
+        FolderPermission.objects.create(folder=cls.root_folder, role=cls.editor_role, can_view=True, can_add=True)
+        level = [cls.root_folder]
+        folders = [cls.root_folder]
+        for depth in range(BENCHMARK_FOLDER_DEPTH - 1):
+            level = [
+                DocumentFolder.objects.create(name=f'Folder {depth}-{i}', parent=parent)
+                for parent in level[:BENCHMARK_FOLDERS_PER_LEVEL]
+                for i in range(BENCHMARK_FOLDERS_PER_LEVEL)
+            ]
+            folders.extend(level)
+        cls.deep_folder = folders[-1]
+        DocumentFile.objects.bulk_create([
+            DocumentFile(
+                folder=folder,
+                name=f'Document {i}.pdf',
+                file=f'documents/benchmark/document_{folder.pk}_{i}.pdf',
+                file_size=2048,
+                mime_type='application/pdf',
+            )
+            for folder in folders
+            for i in range(BENCHMARK_FILES_PER_FOLDER)
+        ])
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        # Record the measurements so budgets can be tuned from a test run
+        for name, queries, elapsed in cls.results:
+            logger.info('%s.%s: %d queries, %.1f ms', cls.__name__, name, queries, elapsed * 1000)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertWithinBudget(self, name, budget, path, method='get', data=None, status_code=200, headers=None):
+        """
+        Request a view and fail if it runs more queries than its budget (or, with
+        BENCHMARK_ENFORCE_TIMINGS, takes longer).
+
+        budget is a (max_queries, max_seconds) tuple. The request is made once to warm
+        up caches and imports, then measured on a second run.
+        """
+        max_queries, max_seconds = budget
+        request = getattr(self.client, method)
+        if method == 'get':
+            request(path, data, headers=headers)
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = request(path, data, headers=headers)
+            if response.streaming:
+                # Streaming views do their work while the body is consumed; keep it readable for the test
+                response.streaming_content = [b''.join(response.streaming_content)]
+            elapsed = time.perf_counter() - started
+
+        self.results.append((name, len(queries), elapsed))
+        self.assertEqual(response.status_code, status_code)
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f'{name} ran {len(queries)} queries (budget {max_queries}):\n'
+            + '\n'.join(query['sql'] for query in queries.captured_queries)
+        )
+        if ENFORCE_TIMINGS:
+            self.assertLessEqual(
+                elapsed, max_seconds,
+                f'{name} took {elapsed:.3f}s (budget {max_seconds:.3f}s)'
+            )
+        return response
@@ -0,0 +1,59 @@
+"""
+Cached row counts for the management dashboard
+
+COUNT(*) on PostgreSQL scans the whole table, and the action log grows without
+bound. Counts are cached here and nudged up or down by the signal handlers in
+ManagementApp.signals as rows are created and deleted. On a cache miss, tables
+above COUNTER_ESTIMATE_THRESHOLD rows use the planner's estimate (pg_class.reltuples)
+instead of an exact count.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+COUNTER_CACHE_KEY = 'management:count:{label}'
+# Bounds the drift from bulk operations, which send no signals
+COUNTER_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_COUNTER_CACHE_TIMEOUT', 60 * 10)
+COUNTER_ESTIMATE_THRESHOLD = getattr(settings, 'DASHBOARD_COUNTER_ESTIMATE_THRESHOLD', 100000)
+
+
+def _cache_key(model):
+    return COUNTER_CACHE_KEY.format(label=model._meta.label_lower)
+
+
+def estimated_count(model):
+    """The planner's row estimate for a table, or None if it is unavailable or the table was never analyzed"""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        # Table names are mixed case, so regclass needs the quoted identifier
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [connection.ops.quote_name(model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 until the table is first vacuumed or analyzed
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def get_count(model):
+    """Number of rows in a model's table, from the cache where possible"""
+    key = _cache_key(model)
+    count = cache.get(key)
+    if count is None:
+        count = estimated_count(model)
+        if count is None or count < COUNTER_ESTIMATE_THRESHOLD:
+            count = model._default_manager.count()
+        cache.set(key, count, COUNTER_CACHE_TIMEOUT)
+    return count
+
+
+def adjust_count(model, delta):
+    """Shift a cached count once the current transaction commits (a missing count is left to be rebuilt)"""
+    def apply():
+        try:
+            cache.incr(_cache_key(model), delta)
+        except ValueError:
+            pass
+    transaction.on_commit(apply)
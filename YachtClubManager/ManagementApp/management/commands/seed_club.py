@@ -0,0 +1,279 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from ManagementApp.models import ClubUser, MemberType, Role
+from CalendarApp.fees import write_line_items
+from CalendarApp.models import (
+    Event, EventCategory, EventContact, EventGuest, EventRegistration, EventRegistrationFee
+)
+from DocumentManagement.models import (
+    DocumentFile, DocumentFolder, EffectiveFolderPermission, FolderPermission
+)
+
+FIRST_NAMES = [
+    'Alex', 'Blake', 'Casey', 'Drew', 'Emery', 'Finley', 'Gray', 'Harper', 'Indy', 'Jordan',
+    'Kai', 'Logan', 'Morgan', 'Noel', 'Oakley', 'Parker', 'Quinn', 'Reese', 'Sage', 'Taylor',
+]
+LAST_NAMES = [
+    'Anchor', 'Bowline', 'Capstan', 'Davit', 'Ensign', 'Fathom', 'Gunwale', 'Halyard', 'Inboard', 'Jib',
+    'Keel', 'Lanyard', 'Mast', 'Nautilus', 'Offing', 'Pennant', 'Quay', 'Rudder', 'Spinnaker', 'Transom',
+]
+VESSEL_TYPES = ['Motor', 'Sailboat']
+CATEGORIES = [('Racing', '#dc3545'), ('Social', '#198754'), ('Cruising', '#0d6efd'), ('Training', '#fd7e14')]
+# Seeded member types: (name, can_be_parent, can_be_child, fee)
+MEMBER_TYPES = [
+    ('Full Member', True, False, Decimal('40.00')),
+    ('Associate', True, False, Decimal('30.00')),
+    ('Junior', False, True, Decimal('15.00')),
+    ('Guest', False, False, Decimal('25.00')),
+]
+
+
+def batched(iterable, size):
+    """Yield lists of up to size items from iterable"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate a synthetic club (members, events, registrations, documents) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=1000, help='Number of primary members')
+        parser.add_argument('--dependents', type=float, default=1.0, help='Average dependents per member')
+        parser.add_argument('--events', type=int, default=200, help='Number of events')
+        parser.add_argument('--registrations', type=int, default=5000, help='Number of event registrations')
+        parser.add_argument('--guest-rate', type=float, default=0.3, help='Share of registrations that bring a guest')
+        parser.add_argument('--folder-depth', type=int, default=5, help='Depth of the document folder tree')
+        parser.add_argument('--folder-fanout', type=int, default=3, help='Subfolders per folder')
+        parser.add_argument('--files-per-folder', type=int, default=5, help='Files in each folder')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument('--prefix', type=str, default='seed', help='Prefix for generated emails and names')
+        parser.add_argument('--password', type=str, help='Password for every generated member (default: unusable)')
+        parser.add_argument('--random-seed', type=int, help='Seed for reproducible data')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        self.random = random.Random(options['random_seed'])
+
+        if ClubUser.objects.filter(email__startswith=f'{self.prefix}-').exists():
+            raise CommandError(
+                f'Members with the "{self.prefix}-" prefix already exist. Use --prefix to seed another club.'
+            )
+        if options['registrations'] > options['members'] * options['events']:
+            raise CommandError('Cannot create more registrations than members x events.')
+
+        with transaction.atomic():
+            member_types = self.seed_member_types()
+            members, dependents_by_parent = self.seed_members(options, member_types)
+            events = self.seed_events(options, members, member_types)
+            self.seed_registrations(options, members, events, dependents_by_parent)
+            self.seed_documents(options)
+
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Seeded club "{self.prefix}" successfully!'))
+
+    def bulk_create(self, model, objects):
+        """Insert objects in batches and return them with primary keys set"""
+        created = []
+        for batch in batched(objects, self.batch_size):
+            created.extend(model.objects.bulk_create(batch))
+        return created
+
+    def seed_member_types(self):
+        member_types = {}
+        for order, (name, can_be_parent, can_be_child, fee) in enumerate(MEMBER_TYPES):
+            member_type, _ = MemberType.objects.get_or_create(
+                name=name,
+                defaults={'can_be_parent': can_be_parent, 'can_be_child': can_be_child, 'display_order': order},
+            )
+            member_types[name] = (member_type, fee)
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(member_types)} member types ready'))
+        return member_types
+
+    def seed_members(self, options, member_types):
+        # Hash once - hashing per member would dominate the run time
+        password = make_password(options['password'])
+        roles = [Role.get_member_role()] * 8 + [Role.get_viewer_role(), Role.get_editor_role()]
+        now = timezone.now()
+
+        def member(index, **extra):
+            first_name = self.random.choice(FIRST_NAMES)
+            return ClubUser(
+                email=f'{self.prefix}-{index}@example.invalid',
+                password=password,
+                first_name=first_name,
+                last_name=f'{self.random.choice(LAST_NAMES)}{index}',
+                primary_phone_number=f'+1555{self.random.randrange(10 ** 7):07d}',
+                address1=f'{self.random.randrange(1, 9999)} Harbour Road',
+                city='Seaport',
+                state='WA',
+                zip_code=f'98{self.random.randrange(1000):03d}',
+                date_joined=now - timedelta(days=self.random.randrange(3650)),
+                **extra,
+            )
+
+        members = self.bulk_create(ClubUser, (
+            member(
+                index,
+                role=self.random.choice(roles),
+                vessel_type=self.random.choice(VESSEL_TYPES),
+                vessel_name=f'{self.prefix.title()} Vessel {index}',
+            )
+            for index in range(options['members'])
+        ))
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(members)} members created'))
+
+        dependent_count = int(options['members'] * options['dependents'])
+        member_role = Role.get_member_role()
+        dependents = self.bulk_create(ClubUser, (
+            member(
+                options['members'] + index,
+                role=member_role,
+                parent_member=self.random.choice(members),
+                relationship_type='Child',
+            )
+            for index in range(dependent_count)
+        ))
+        dependents_by_parent = {}
+        for dependent in dependents:
+            dependents_by_parent.setdefault(dependent.parent_member_id, []).append(dependent.pk)
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(dependents)} dependents created'))
+
+        MemberTypeLink = ClubUser.member_types.through
+        parent_types = [member_type.pk for member_type, _ in member_types.values() if member_type.can_be_parent]
+        junior_type = member_types['Junior'][0].pk
+        self.bulk_create(MemberTypeLink, (
+            [MemberTypeLink(clubuser_id=member.pk, membertype_id=self.random.choice(parent_types)) for member in members]
+            + [MemberTypeLink(clubuser_id=dependent.pk, membertype_id=junior_type) for dependent in dependents]
+        ))
+        return members, dependents_by_parent
+
+    def seed_events(self, options, members, member_types):
+        categories = [
+            EventCategory.objects.get_or_create(name=name, defaults={'color': color})[0]
+            for name, color in CATEGORIES
+        ]
+        now = timezone.now()
+        statuses = ['required', 'recommended', 'required_by_close_date', 'not_required']
+
+        def event(index):
+            start = now + timedelta(days=self.random.randrange(-365, 365), hours=self.random.randrange(8, 18))
+            description = '<p>Synthetic event generated by <strong>seed_club</strong>.</p>'
+            return Event(
+                title=f'{self.prefix.title()} Event {index}',
+                short_description='Synthetic event generated by seed_club',
+                formatted_description=description,
+                # bulk_create skips Event.save, which normally fills this in
+                search_document=Event.build_search_document(description),
+                category=self.random.choice(categories),
+                start_datetime=start,
+                end_datetime=start + timedelta(hours=self.random.randrange(1, 8)),
+                registration_status=self.random.choice(statuses),
+                registrant_list_visibility='members',
+            )
+
+        events = self.bulk_create(Event, (event(index) for index in range(options['events'])))
+        self.bulk_create(EventRegistrationFee, (
+            EventRegistrationFee(event=event, member_type=member_type, fee_amount=fee)
+            for event in events
+            for member_type, fee in member_types.values()
+        ))
+        self.bulk_create(EventContact, (
+            EventContact(event=event, member=self.random.choice(members), is_primary=True)
+            for event in events
+        ))
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(events)} events created with fees and contacts'))
+        return events
+
+    def seed_registrations(self, options, members, events, dependents_by_parent):
+        per_event, remainder = divmod(options['registrations'], len(events)) if events else (0, 0)
+        member_ids = [member.pk for member in members]
+        AdditionalMemberLink = EventRegistration.additional_members.through
+
+        def registrations():
+            for index, event in enumerate(events):
+                count = per_event + (1 if index < remainder else 0)
+                for member_id in self.random.sample(member_ids, count):
+                    # total_fee is filled in from the line items by write_line_items
+                    yield EventRegistration(event=event, member_id=member_id)
+
+        total = additional = guests = 0
+        # Insert registration batches one at a time so 1M rows never sit in memory together
+        for batch in batched(registrations(), self.batch_size):
+            batch = EventRegistration.objects.bulk_create(batch)
+            links = [
+                AdditionalMemberLink(eventregistration_id=registration.pk, clubuser_id=dependent_id)
+                for registration in batch
+                for dependent_id in dependents_by_parent.get(registration.member_id, [])
+                if self.random.random() < 0.5
+            ]
+            guest_rows = [
+                EventGuest(event_id=registration.event_id, registration=registration, name=f'Guest {registration.pk}')
+                for registration in batch
+                if self.random.random() < options['guest_rate']
+            ]
+            AdditionalMemberLink.objects.bulk_create(links, batch_size=self.batch_size)
+            EventGuest.objects.bulk_create(guest_rows, batch_size=self.batch_size)
+            write_line_items(batch)
+            total += len(batch)
+            additional += len(links)
+            guests += len(guest_rows)
+            self.stdout.write(f'  {total} registrations...')
+
+        # bulk_create sends no signals, so set the denormalized counters in one pass
+        Event.recount_registrations(events)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {total} registrations created with {additional} additional members and {guests} guests'
+        ))
+
+    def seed_documents(self, options):
+        root = DocumentFolder.objects.create(name=f'{self.prefix.title()} Documents')
+        level = [root]
+        folders = [root]
+        for depth in range(1, options['folder_depth']):
+            children = self.bulk_create(DocumentFolder, (
+                DocumentFolder(name=f'Folder {depth}-{index}', parent=parent)
+                for parent in level
+                for index in range(options['folder_fanout'])
+            ))
+            # bulk_create skips save(), so fill in the materialized paths directly
+            paths = {folder.pk: folder.path for folder in level}
+            for folder in children:
+                folder.path = f'{paths[folder.parent_id]}{folder.pk}/'
+            DocumentFolder.objects.bulk_update(children, ['path'], batch_size=self.batch_size)
+            folders.extend(children)
+            level = children
+
+        self.bulk_create(DocumentFile, (
+            DocumentFile(
+                folder=folder,
+                name=f'Document {index}.pdf',
+                file=f'documents/{self.prefix}/{folder.pk}/document_{index}.pdf',
+                file_size=self.random.randrange(10 ** 4, 10 ** 7),
+                mime_type='application/pdf',
+            )
+            for folder in folders
+            for index in range(options['files_per_folder'])
+        ))
+
+        # Everyone can view the tree, editors can add below the second level
+        permissions = [FolderPermission(folder=root, role=role, can_view=True) for role in Role.objects.all()]
+        permissions += [
+            FolderPermission(folder=folder, role=Role.get_editor_role(), can_view=True, can_add=True, can_edit=True)
+            for folder in folders[1:1 + options['folder_fanout']]
+        ]
+        FolderPermission.objects.bulk_create(permissions)
+        # bulk_create sends no signals, so cascade the new permissions in one pass
+        EffectiveFolderPermission.rebuild(root)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(folders)} folders and {len(folders) * options["files_per_folder"]} files created'
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ManagementApp', '0007_clubuser_parent_member_clubuser_relationship_type_and_more'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clubuser',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='ManagementA_last_na_5f192c_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:47
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+TRIGRAM_INDEX_NAME = 'management_clubuser_search_trgm'
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+    GIN trigram index so LIKE '%term%' on search_text avoids a sequential scan.
+    
+    PostgreSQL only, and skipped where the server does not ship pg_trgm; search
+    still works without it, just with a scan.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    ClubUser = apps.get_model('ManagementApp', 'ClubUser')
+    quote_name = schema_editor.connection.ops.quote_name
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {quote_name(TRIGRAM_INDEX_NAME)} '
+        f'ON {quote_name(ClubUser._meta.db_table)} USING gin ({quote_name("search_text")} gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.connection.ops.quote_name(TRIGRAM_INDEX_NAME)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ManagementApp', '0008_clubuser_name_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clubuser',
+            name='search_text',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Concat('first_name', models.Value(' '), 'last_name', models.Value(' '), 'email', models.Value(' '), 'nickname', models.Value(' '), 'primary_phone_number', models.Value(' '), 'vessel_name', output_field=models.TextField())), output_field=models.TextField()),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:31
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ManagementApp', '0009_clubuser_search_text'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clubuser',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('last_name'), name='text_pattern_ops'), name='management_user_lastname_like'),
+        ),
+    ]
@@ -1,6 +1,8 @@
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.core.validators import RegexValidator
+from django.db.models.functions import Concat, Lower
 from django.utils import timezone as django_timezone
 
 
@@ -192,12 +194,30 @@ class Role(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Permission name -> Role flag, as used by ClubUser.has_permission()
+    PERMISSION_FIELDS = {
+        'view_events': 'can_view_events',
+        'create_events': 'can_create_events',
+        'edit_events': 'can_edit_events',
+        'delete_events': 'can_delete_events',
+        'manage_categories': 'can_manage_categories',
+        'manage_users': 'can_manage_users',
+        'access_admin': 'can_access_admin',
+    }
+
     class Meta:
         ordering = ['name']
 
     def __str__(self):
         return self.get_name_display()
 
+    def get_permission_set(self):
+        """Get the names of all permissions this role grants"""
+        return frozenset(
+            permission for permission, field in self.PERMISSION_FIELDS.items()
+            if getattr(self, field)
+        )
+
     @classmethod
     def get_viewer_role(cls):
         """Get or create the viewer role"""
@@ -368,6 +388,18 @@ class ClubUser(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True, help_text='Designates whether this user can log in.')
     is_staff = models.BooleanField(default=False, help_text='Designates whether the user can log into admin site.')
     
+    # Lowercased copy of the searchable fields, kept by the database and trigram-indexed
+    # on PostgreSQL (see ManagementApp.search)
+    search_text = models.GeneratedField(
+        expression=Lower(Concat(
+            'first_name', models.Value(' '), 'last_name', models.Value(' '), 'email', models.Value(' '),
+            'nickname', models.Value(' '), 'primary_phone_number', models.Value(' '), 'vessel_name',
+            output_field=models.TextField(),
+        )),
+        output_field=models.TextField(),
+        db_persist=True,
+    )
+    
     # Timestamps
     date_joined = models.DateTimeField(default=django_timezone.now)
     last_login = models.DateTimeField(null=True, blank=True, editable=False)
@@ -386,6 +418,10 @@ class ClubUser(AbstractBaseUser, PermissionsMixin):
             models.Index(fields=['email']),
             models.Index(fields=['role']),
             models.Index(fields=['is_active']),
+            # Matches the (last_name, first_name, id) keyset the user lists page on
+            models.Index(fields=['last_name', 'first_name', 'id']),
+            # Last-name prefix search for words too short for the trigram index (ManagementApp.search)
+            models.Index(OpClass(Lower('last_name'), name='text_pattern_ops'), name='management_user_lastname_like'),
         ]
 
     def __str__(self):
@@ -417,17 +453,22 @@ class ClubUser(AbstractBaseUser, PermissionsMixin):
         if self.is_superuser:
             return True
         
-        if not self.role:
-            return False
+        return permission in self.get_permissions()
+
+    def get_permissions(self):
+        """
+        Get the set of permissions granted by the user's role.
         
-        permission_map = {
-            'view_events': self.role.can_view_events,
-            'create_events': self.role.can_create_events,
-            'edit_events': self.role.can_edit_events,
-            'delete_events': self.role.can_delete_events,
-            'manage_categories': self.role.can_manage_categories,
-            'manage_users': self.role.can_manage_users,
-            'access_admin': self.role.can_access_admin,
-        }
+        The set is computed once per user instance and reused until the role
+        assignment changes or the role is saved (which bumps its updated_at).
+        """
+        if not self.role_id:
+            return frozenset()
         
-        return permission_map.get(permission, False)
+        role = self.role
+        stamp = (self.role_id, role.updated_at)
+        cached = self.__dict__.get('_permission_cache')
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, role.get_permission_set())
+            self._permission_cache = cached
+        return cached[1]
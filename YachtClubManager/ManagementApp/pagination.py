@@ -0,0 +1,142 @@
+"""
+Keyset (cursor) pagination for long lists
+
+OFFSET pagination reads and throws away every row before the requested page and
+needs a COUNT(*) for the page links, so deep pages of the action log or member
+lists get slower as the tables grow. Keyset pagination instead remembers the sort
+key of the last row shown and asks for rows after it, which an index on the sort
+key answers in the same time for every page.
+
+The sort key must be unique and non-null (end it with the primary key). Cursors
+are signed, so clients cannot forge arbitrary filters through them.
+"""
+from collections.abc import Sequence
+from functools import reduce
+from operator import or_
+
+from django.core import signing
+from django.db.models import Q
+from django.http import Http404
+
+CURSOR_SALT = 'ManagementApp.pagination'
+NEXT, PREVIOUS = 'n', 'p'
+
+
+class KeysetPage(Sequence):
+    """One page of results plus the cursors for its neighbours"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        return self.paginator.cursor(self.object_list[-1], NEXT) if self._has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self.paginator.cursor(self.object_list[0], PREVIOUS) if self._has_previous else None
+
+    @property
+    def last_cursor(self):
+        return self.paginator.last_cursor
+
+
+class KeysetPaginator:
+    """Paginate a queryset on a unique ordering such as ('-timestamp', '-id')"""
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering
+        ]
+
+    def cursor(self, obj, direction):
+        """Opaque token for the rows after (NEXT) or before (PREVIOUS) obj"""
+        values = [field.value_to_string(obj) for field in self.fields]
+        return signing.dumps({'d': direction, 'k': values}, salt=CURSOR_SALT, compress=True)
+
+    @property
+    def last_cursor(self):
+        """Token for the final page, read backwards from the end"""
+        return signing.dumps({'d': PREVIOUS, 'k': None}, salt=CURSOR_SALT, compress=True)
+
+    def _decode(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            direction, values = data['d'], data['k']
+            if direction not in (NEXT, PREVIOUS):
+                raise ValueError(direction)
+            if values is not None:
+                values = [field.to_python(value) for field, value in zip(self.fields, values, strict=True)]
+        except (signing.BadSignature, KeyError, TypeError, ValueError) as exc:
+            raise Http404('Invalid page cursor') from exc
+        return direction, values
+
+    def _after(self, values, backwards):
+        """
+        Filter for rows strictly after values in the sort order (before, if backwards).
+        
+        The planner cannot turn the OR of (a > x) OR (a = x AND b > y) ... into an index
+        range, so the leading column is also bounded on its own (a >= x); that bound
+        becomes the Index Cond and the OR only filters the few rows sharing a = x.
+        """
+        clauses = []
+        for index, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            lookup = 'lt' if descending != backwards else 'gt'
+            equal = {field.attname: value for field, value in zip(self.fields[:index], values)}
+            clauses.append(Q(**equal, **{f'{self.fields[index].attname}__{lookup}': values[index]}))
+        leading = 'lte' if self.ordering[0].startswith('-') != backwards else 'gte'
+        return Q(**{f'{self.fields[0].attname}__{leading}': values[0]}) & reduce(or_, clauses)
+
+    def page(self, cursor=None):
+        """Fetch the page a cursor points at (the first page without one), with no COUNT query"""
+        direction, values = self._decode(cursor) if cursor else (NEXT, None)
+        backwards = direction == PREVIOUS
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(values, backwards))
+        # One extra row tells whether there is another page in this direction
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=values is not None, has_previous=more)
+        return KeysetPage(rows, self, has_next=more, has_previous=values is not None)
+
+
+class KeysetPaginationMixin:
+    """ListView mixin that pages with KeysetPaginator on keyset_ordering instead of OFFSET/COUNT"""
+    keyset_ordering = None
+    cursor_param = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.keyset_ordering, page_size)
+        page = paginator.page(self.request.GET.get(self.cursor_param))
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,59 @@
+"""
+Member search for the user list, members directory and member autocomplete
+
+Matches each word of the query against ClubUser.search_text, a lowercased
+database-generated copy of the name, email, nickname, phone and vessel fields.
+On PostgreSQL with pg_trgm a GIN trigram index answers these LIKE '%word%'
+filters; elsewhere they are plain scans of one column. pg_trgm cannot extract a
+trigram from words shorter than three characters, so queries made only of such
+words would scan the table. Callers that need to stay fast (autocomplete) check
+is_indexable_query and answer the other queries with search_members_by_last_name,
+a last-name prefix match served by the btree index on lower(last_name), which
+still finds short names such as "Ng" or "Li".
+"""
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Lower
+
+MIN_INDEXED_TERM_LENGTH = 3
+
+
+def search_terms(query):
+    return query.lower().split()
+
+
+def is_indexable_query(query):
+    """Whether at least one word of query is long enough for the trigram index to narrow the search"""
+    return any(len(term) >= MIN_INDEXED_TERM_LENGTH for term in search_terms(query))
+
+
+def search_members(queryset, query):
+    """Members of queryset matching every word of query"""
+    for term in search_terms(query):
+        queryset = queryset.filter(search_text__contains=term)
+    return queryset
+
+
+def search_members_by_last_name(queryset, query):
+    """Members of queryset whose last name starts with the first word of query and who match the other words"""
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    # lower(last_name) LIKE 'term%', the expression of the prefix index
+    queryset = queryset.alias(last_name_lower=Lower('last_name')).filter(last_name_lower__startswith=terms[0])
+    return search_members(queryset, ' '.join(terms[1:]))
+
+
+def rank_members(queryset, query):
+    """Order matches with name prefixes first (last name, then first name), then alphabetically"""
+    terms = search_terms(query)
+    if not terms:
+        return queryset.order_by('last_name', 'first_name', 'id')
+    first_term = terms[0]
+    rank = Case(
+        When(last_name__istartswith=first_term, then=Value(0)),
+        When(first_name__istartswith=first_term, then=Value(1)),
+        When(nickname__istartswith=first_term, then=Value(2)),
+        default=Value(3),
+        output_field=IntegerField(),
+    )
+    return queryset.annotate(search_rank=rank).order_by('search_rank', 'last_name', 'first_name', 'id')
@@ -0,0 +1,27 @@
+"""
+Signal handlers that keep the cached dashboard counters in step with inserts and deletes
+"""
+from django.db.models.signals import post_delete, post_save
+
+from CalendarApp.models import Event, EventActionLog, EventCategory
+
+from .counters import adjust_count
+from .models import ClubUser
+
+COUNTED_MODELS = [EventCategory, Event, ClubUser, EventActionLog]
+
+
+def row_created(sender, instance, created, **kwargs):
+    """Count a newly inserted row"""
+    if created:
+        adjust_count(sender, 1)
+
+
+def row_deleted(sender, instance, **kwargs):
+    """Uncount a deleted row"""
+    adjust_count(sender, -1)
+
+
+for model in COUNTED_MODELS:
+    post_save.connect(row_created, sender=model, dispatch_uid=f'count_created_{model._meta.label_lower}')
+    post_delete.connect(row_deleted, sender=model, dispatch_uid=f'count_deleted_{model._meta.label_lower}')
@@ -1,3 +1,239 @@
+import csv
+import io
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from CalendarApp.models import Event, EventActionLog, EventCategory, EventGuest
+
+from .benchmarks import BenchmarkTestCase
+from .counters import estimated_count, get_count
+from .models import ClubUser
+from .pagination import KeysetPaginator
+from .search import is_indexable_query, rank_members, search_members, search_members_by_last_name
+from .views import _escape_csv_cell
+
+# (max queries, max seconds) per view - raise a budget only together with the change that needs it
+VIEW_BUDGETS = {
+    'registrations_report': (5, 3.0),
+    'registrations_report_csv': (5, 3.0),
+    'dashboard': (5, 1.0),
+    'dashboard_reports': (8, 1.0),
+    'members_directory': (6, 1.0),
+    'members_directory_search': (6, 1.0),
+    'members_directory_last_page': (6, 1.0),
+}
+
+
+class ManagementViewBenchmarkTests(BenchmarkTestCase):
+    """Query-count and latency budgets for the management views"""
+
+    def test_registrations_report(self):
+        response = self.assertWithinBudget(
+            'registrations_report', VIEW_BUDGETS['registrations_report'],
+            reverse('management:registrations_report')
+        )
+        self.assertTrue(response.context['registrations_data'])
+
+    def test_registrations_report_csv(self):
+        response = self.assertWithinBudget(
+            'registrations_report_csv', VIEW_BUDGETS['registrations_report_csv'],
+            reverse('management:registrations_report'), data={'export': 'csv'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('Event,Event Start'))
+        self.assertGreater(len(lines), 1)
+
+    def test_registrations_report_csv_escapes_formulas(self):
+        EventGuest.objects.filter(pk=EventGuest.objects.values('pk')[:1]).update(name='=HYPERLINK("http://x")')
+        response = self.client.get(reverse('management:registrations_report'), {'export': 'csv'})
+        body = b''.join(response.streaming_content).decode()
+        cells = [cell for row in csv.reader(io.StringIO(body)) for cell in row]
+        self.assertIn('\'=HYPERLINK("http://x")', cells)
+        self.assertFalse([cell for cell in cells if cell.startswith(('=', '@'))])
+        self.assertEqual(_escape_csv_cell('-1+2'), "'-1+2")
+        self.assertEqual(_escape_csv_cell(Decimal('-5.00')), Decimal('-5.00'))
+        self.assertEqual(_escape_csv_cell('-12.50'), '-12.50')
+        self.assertEqual(_escape_csv_cell('+1 (206) 555-0100'), '+1 (206) 555-0100')
+        # The seeded members' phone numbers come through unchanged
+        self.assertIn('+12065550100', cells)
+        self.assertNotIn("'+12065550100", cells)
+
+    def test_dashboard(self):
+        response = self.assertWithinBudget('dashboard', VIEW_BUDGETS['dashboard'], reverse('management:dashboard'))
+        self.assertEqual(response.context['total_events'], Event.objects.count())
+
+    def test_dashboard_reports(self):
+        response = self.assertWithinBudget(
+            'dashboard_reports', VIEW_BUDGETS['dashboard_reports'],
+            reverse('management:dashboard_section'), data={'section': 'reports'}
+        )
+        self.assertEqual(response.context['revenue_totals']['registrants'], self.registrant_count)
+        self.assertTrue(response.context['revenue_by_month'])
+
+    def test_members_directory(self):
+        self.assertWithinBudget(
+            'members_directory', VIEW_BUDGETS['members_directory'], reverse('management:members_directory')
+        )
+
+    def test_members_directory_search(self):
+        self.assertWithinBudget(
+            'members_directory_search', VIEW_BUDGETS['members_directory_search'],
+            reverse('management:members_directory'), data={'search': 'Last01'}
+        )
+
+    def test_members_directory_last_page(self):
+        first = self.client.get(reverse('management:members_directory')).context['page_obj']
+        response = self.assertWithinBudget(
+            'members_directory_last_page', VIEW_BUDGETS['members_directory_last_page'],
+            reverse('management:members_directory'), data={'cursor': first.last_cursor}
+        )
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertTrue(response.context['page_obj'].has_previous())
+
+
+class DashboardCounterTests(TestCase):
+    """Cached dashboard counts follow inserts and deletes without recounting"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_follow_signals(self):
+        self.assertEqual(get_count(EventCategory), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            category = EventCategory.objects.create(name='Racing')
+            EventCategory.objects.create(name='Social')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_count(EventCategory), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            category.delete()
+        self.assertEqual(get_count(EventCategory), 1)
+
+    def test_estimated_count_after_analyze(self):
+        EventCategory.objects.bulk_create([EventCategory(name=f'Category {i}') for i in range(20)])
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE "{EventCategory._meta.db_table}"')
+        self.assertEqual(estimated_count(EventCategory), 20)
+
+
+class KeysetPaginatorTests(TestCase):
+    """Walking cursors forwards and backwards visits every row once, in order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Shared names force the id tie-breaker to decide the order
+        ClubUser.objects.bulk_create([
+            ClubUser(email=f'sailor{i}@example.com', first_name=f'Sailor{i % 3}', last_name=f'Crew{i % 4}')
+            for i in range(23)
+        ])
+        cls.paginator = KeysetPaginator(ClubUser.objects.all(), ('last_name', 'first_name', 'id'), 5)
+        cls.expected = list(ClubUser.objects.order_by('last_name', 'first_name', 'id').values_list('pk', flat=True))
+
+    def test_forward_and_back(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(pages[-1].next_cursor))
+        self.assertEqual([user.pk for page in pages for user in page], self.expected)
+        self.assertEqual(len(pages), 5)
+        self.assertFalse(pages[0].has_previous())
+
+        backwards = [self.paginator.page(pages[-1].last_cursor)]
+        while backwards[-1].has_previous():
+            backwards.append(self.paginator.page(backwards[-1].previous_cursor))
+        self.assertEqual([user.pk for page in reversed(backwards) for user in page], self.expected)
+
+    def test_no_count_query(self):
+        page = self.paginator.page()
+        with self.assertNumQueries(1):
+            self.paginator.page(page.next_cursor)
+
+    def test_tampered_cursor(self):
+        response_cursor = self.paginator.page().next_cursor
+        with self.assertRaises(Http404):
+            self.paginator.page(response_cursor[:-2] + 'xx')
+
+    def test_leading_column_is_bounded(self):
+        cursor = self.paginator.page().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.paginator.page(cursor)
+        # A bare bound on the first sort column, ANDed outside the OR of the tie-breakers
+        self.assertRegex(queries[0]['sql'], r'WHERE \("[^"]+"\."last_name" >= \S+ AND \(')
+
+    def test_deep_page_uses_an_index_range(self):
+        start = timezone.now()
+        EventActionLog.objects.bulk_create([
+            EventActionLog(action='updated', event_title=f'Event {i}', timestamp=start - timedelta(minutes=i))
+            for i in range(50)
+        ])
+        paginator = KeysetPaginator(EventActionLog.objects.all(), ('-timestamp', '-id'), 10)
+        cursor = paginator.page().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            paginator.page(paginator.page(cursor).next_cursor)
+        with connection.cursor() as db:
+            # Too few rows for the planner to prefer the index on its own
+            db.execute('SET LOCAL enable_seqscan = off')
+            db.execute(f'EXPLAIN {queries[-1]["sql"]}')
+            plan = '\n'.join(row[0] for row in db.fetchall())
+        self.assertRegex(plan, r'Index Cond: .*timestamp')
+
+
+class MemberSearchTests(TestCase):
+    """The generated search column follows edits and finds members by every word of a query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.anna = ClubUser.objects.create_user(
+            email='anna@example.com', first_name='Anna', last_name='Marsh', vessel_name='Sea Breeze'
+        )
+        cls.tom = ClubUser.objects.create_user(
+            email='tom@example.com', first_name='Tom', last_name='Annesley', nickname='Skipper'
+        )
+
+    def test_matches_every_word_across_fields(self):
+        self.assertEqual(list(search_members(ClubUser.objects.all(), 'breeze ANNA')), [self.anna])
+        self.assertEqual(list(search_members(ClubUser.objects.all(), 'skip')), [self.tom])
+        self.assertFalse(search_members(ClubUser.objects.all(), 'anna skipper').exists())
+
+    def test_search_text_follows_updates(self):
+        ClubUser.objects.filter(pk=self.tom.pk).update(vessel_name='Windfall')
+        self.assertEqual(list(search_members(ClubUser.objects.all(), 'windfall')), [self.tom])
+
+    def test_name_prefixes_rank_first(self):
+        matches = rank_members(search_members(ClubUser.objects.all(), 'ann'), 'ann')
+        self.assertEqual(list(matches), [self.tom, self.anna])
+
+    def test_autocomplete_matches_short_words_as_last_name_prefixes(self):
+        self.assertFalse(is_indexable_query('an'))
+        self.assertFalse(is_indexable_query('an ma'))
+        self.assertTrue(is_indexable_query('an marsh'))
+        ng = ClubUser.objects.create_user(email='ng@example.com', first_name='Li', last_name='Ng')
+        self.client.force_login(self.anna)
+        path = reverse('calendar:member_autocomplete')
+
+        def autocomplete(query):
+            return [result['id'] for result in self.client.get(path, {'q': query}).json()['results']]
+
+        self.assertEqual(autocomplete('ng'), [ng.pk])
+        # Short words are last-name prefixes: "an" finds Annesley but not Anna Marsh
+        self.assertEqual(autocomplete('an'), [self.tom.pk])
+        self.assertEqual(autocomplete('ma an'), [self.anna.pk])
+        self.assertEqual(autocomplete('mar'), [self.anna.pk])
+        self.assertEqual(autocomplete(''), [])
 
-# Create your tests here.
+    def test_last_name_prefix_uses_the_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            list(search_members_by_last_name(ClubUser.objects.all(), 'Ng'))
+        with connection.cursor() as db:
+            # Too few rows for the planner to prefer the index on its own
+            db.execute('SET LOCAL enable_seqscan = off')
+            db.execute(f'EXPLAIN {queries[-1]["sql"]}')
+            plan = '\n'.join(row[0] for row in db.fetchall())
+        self.assertIn('management_user_lastname_like', plan)
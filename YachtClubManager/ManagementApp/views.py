@@ -5,15 +5,24 @@ from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth import get_user_model
 from django.core.exceptions import PermissionDenied
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
+from django.utils import timezone
+import csv
 import json
-from CalendarApp.models import EventCategory, Event, EventRegistration, EventRegistrationFee
+import re
+from CalendarApp.models import (
+    EventCategory, Event, EventActionLog, EventRevenueRollup, RegistrationLineItem
+)
+from .counters import get_count
 from .models import Role, MemberType, MemberTypeRelationship
 from .forms import EventCategoryForm, ClubUserCreateForm, ClubUserUpdateForm, ProfileUpdateForm, MemberTypeForm, RoleForm, MemberTypeRelationshipForm, EventRegistrationFilterForm
 from .mixins import UserManagementRequiredMixin, MemberDirectoryRequiredMixin
-from django.db.models import Q
+from .pagination import KeysetPaginationMixin
+from .search import search_members
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
 from decimal import Decimal
 
 ClubUser = get_user_model()
@@ -96,22 +105,17 @@ def management_dashboard(request):
         from django.contrib.auth.views import redirect_to_login
         return redirect_to_login(request.get_full_path())
     
-    categories = EventCategory.objects.all()
-    events = Event.objects.all()
-    users = ClubUser.objects.all()
-    
     # Count action logs if user has permission
     total_action_logs = 0
     if request.user.has_permission('edit_events') or request.user.has_permission('delete_events') or request.user.is_superuser:
-        from CalendarApp.models import EventActionLog
-        total_action_logs = EventActionLog.objects.count()
+        total_action_logs = get_count(EventActionLog)
     
     context = {
-        'total_categories': categories.count(),
-        'total_events': events.count(),
-        'total_users': users.count(),
+        'total_categories': get_count(EventCategory),
+        'total_events': get_count(Event),
+        'total_users': get_count(ClubUser),
         'total_action_logs': total_action_logs,
-        'recent_events': events.order_by('-created_at')[:5],
+        'recent_events': Event.objects.order_by('-created_at')[:5],
     }
     
     return render(request, 'ManagementApp/dashboard.html', context)
@@ -131,40 +135,39 @@ def dashboard_section(request):
     
     # Add section-specific context
     if section == 'events':
-        categories = EventCategory.objects.all()
-        events = Event.objects.all()
-        
         total_action_logs = 0
         if request.user.has_permission('edit_events') or request.user.has_permission('delete_events') or request.user.is_superuser:
-            from CalendarApp.models import EventActionLog
-            total_action_logs = EventActionLog.objects.count()
+            total_action_logs = get_count(EventActionLog)
         
         context.update({
-            'total_categories': categories.count(),
-            'total_events': events.count(),
+            'total_categories': get_count(EventCategory),
+            'total_events': get_count(Event),
             'total_action_logs': total_action_logs,
-            'recent_events': events.order_by('-created_at')[:5],
+            'recent_events': Event.objects.order_by('-created_at')[:5],
         })
     elif section == 'users':
         if request.user.is_superuser or request.user.has_permission('manage_users'):
-            users = ClubUser.objects.all()
             context.update({
-                'total_users': users.count(),
+                'total_users': get_count(ClubUser),
             })
         else:
             raise PermissionDenied("You don't have permission to view this section.")
+    elif section == 'reports':
+        if _can_view_reports(request.user):
+            context.update(_revenue_dashboard())
     
     template_name = f'ManagementApp/sections/{section}.html'
     return render(request, template_name, context)
 
 
 # User Management Views
-class ClubUserListView(UserManagementRequiredMixin, ListView):
+class ClubUserListView(UserManagementRequiredMixin, KeysetPaginationMixin, ListView):
     """List view of all club users"""
     model = ClubUser
     template_name = 'ManagementApp/user_list.html'
     context_object_name = 'users'
     paginate_by = 20
+    keyset_ordering = ('last_name', 'first_name', 'id')
 
     def get_queryset(self):
         queryset = ClubUser.objects.select_related('role').order_by('last_name', 'first_name')
@@ -172,15 +175,7 @@ class ClubUserListView(UserManagementRequiredMixin, ListView):
         # Search functionality
         search_query = self.request.GET.get('search', '').strip()
         if search_query:
-            from django.db.models import Q
-            queryset = queryset.filter(
-                Q(first_name__icontains=search_query) |
-                Q(last_name__icontains=search_query) |
-                Q(email__icontains=search_query) |
-                Q(nickname__icontains=search_query) |
-                Q(primary_phone_number__icontains=search_query) |
-                Q(vessel_name__icontains=search_query)
-            )
+            queryset = search_members(queryset, search_query)
         
         return queryset
     
@@ -247,12 +242,13 @@ class ClubUserDeleteView(UserManagementRequiredMixin, DeleteView):
         return super().form_valid(form)
 
 
-class MembersDirectoryView(MemberDirectoryRequiredMixin, ListView):
+class MembersDirectoryView(MemberDirectoryRequiredMixin, KeysetPaginationMixin, ListView):
     """View for members directory - accessible to members, editors, and admins (but not viewers)"""
     model = ClubUser
     template_name = 'ManagementApp/members_directory.html'
     context_object_name = 'members'
     paginate_by = 30
+    keyset_ordering = ('last_name', 'first_name', 'id')
 
     def get_queryset(self):
         # Only show active members
@@ -261,15 +257,7 @@ class MembersDirectoryView(MemberDirectoryRequiredMixin, ListView):
         # Search functionality
         search_query = self.request.GET.get('search', '').strip()
         if search_query:
-            from django.db.models import Q
-            queryset = queryset.filter(
-                Q(first_name__icontains=search_query) |
-                Q(last_name__icontains=search_query) |
-                Q(email__icontains=search_query) |
-                Q(nickname__icontains=search_query) |
-                Q(primary_phone_number__icontains=search_query) |
-                Q(vessel_name__icontains=search_query)
-            )
+            queryset = search_members(queryset, search_query)
         
         return queryset
     
@@ -596,11 +584,176 @@ def member_type_reorder(request):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+def _can_view_reports(user):
+    """Only Admins and Editors can see registration and revenue reports"""
+    return user.has_permission('edit_events') or user.has_permission('manage_users') or user.is_superuser
+
+
+REVENUE_DASHBOARD_MONTHS = 24
+REVENUE_DASHBOARD_EVENTS = 25
+
+
+def _revenue_dashboard():
+    """Revenue and attendance figures for the reports section, grouped in SQL from the rollup table"""
+    rollups = EventRevenueRollup.objects.all()
+    totals = {'registrants': Sum('registrants'), 'revenue': Sum('revenue')}
+    
+    by_month = list(
+        rollups.annotate(month=TruncMonth('event__start_datetime')).values('month').annotate(
+            events=Count('event', distinct=True), **totals
+        ).order_by('-month')[:REVENUE_DASHBOARD_MONTHS]
+    )
+    # Attendance bars are scaled against the busiest month shown
+    busiest = max((row['registrants'] for row in by_month), default=0)
+    for row in by_month:
+        row['attendance_percent'] = round(100 * row['registrants'] / busiest) if busiest else 0
+    
+    return {
+        'revenue_totals': rollups.aggregate(events=Count('event', distinct=True), **totals),
+        'revenue_by_month': by_month,
+        'revenue_by_category': rollups.values('event__category__name', 'event__category__color').annotate(
+            events=Count('event', distinct=True), **totals
+        ).order_by('-revenue', 'event__category__name'),
+        'revenue_by_member_type': rollups.values('member_type__name').annotate(**totals).order_by(
+            '-revenue', 'member_type__name'
+        ),
+        'revenue_by_event': rollups.values('event_id', 'event__title', 'event__start_datetime').annotate(
+            **totals
+        ).order_by('-event__start_datetime', 'event_id')[:REVENUE_DASHBOARD_EVENTS],
+    }
+
+
+def _format_address(member):
+    """Format a member's address on one line for the registrations report"""
+    address_parts = [member.address1, member.address2, member.city]
+    if member.state:
+        address_parts.append(member.get_state_display())
+    address_parts.append(member.zip_code)
+    return ', '.join(part for part in address_parts if part) or 'N/A'
+
+
+def _filter_report_line_items(filter_form):
+    """Build the report queryset: one stored line item per registrant, filtered and ordered in SQL"""
+    line_items = RegistrationLineItem.objects.filter(registration__cancelled=False).select_related(
+        'event', 'registration', 'member', 'guest', 'member_type'
+    ).order_by('event__start_datetime', 'registration__registered_at', 'registration_id', 'pk')
+    
+    # Filter by event title
+    event_title = filter_form.cleaned_data.get('event_title')
+    if event_title:
+        line_items = line_items.filter(event__title__icontains=event_title)
+    
+    # Filter by start date (events starting on or after this date)
+    start_date = filter_form.cleaned_data.get('start_date')
+    if start_date:
+        line_items = line_items.filter(event__start_datetime__date__gte=start_date)
+    
+    # Filter by end date (events ending on or before this date)
+    end_date = filter_form.cleaned_data.get('end_date')
+    if end_date:
+        line_items = line_items.filter(event__end_datetime__date__lte=end_date)
+    
+    return line_items
+
+
+def _registration_report_rows(line_items):
+    """Yield one report row per line item (primary member first, then dependents and guests)"""
+    for item in line_items:
+        event = item.event
+        row = {
+            'event_title': event.title,
+            'event_start': event.start_datetime,
+            'event_end': event.end_datetime,
+            'full_name': 'N/A',
+            'address': 'N/A',
+            'email': '',
+            'phone': 'N/A',
+            # The member type the fee was charged for when they registered
+            'member_type': item.member_type.name if item.member_type else 'N/A',
+            'registration_date': item.registration.registered_at,
+            'registration_fee': item.amount,
+            'is_primary': item.kind == RegistrationLineItem.PRIMARY,
+            'registrant_type': item.get_kind_display(),
+        }
+        if item.member:
+            row.update(
+                full_name=item.member.get_full_name(),
+                address=_format_address(item.member),
+                email=item.member.email,
+                phone=item.member.primary_phone_number or 'N/A',
+            )
+        elif item.guest:
+            row.update(
+                full_name=item.guest.name,
+                email=item.guest.email,
+                phone=item.guest.phone_number or 'N/A',
+            )
+        yield row
+
+
+class _Echo:
+    """File-like object whose write() just returns the value, so csv.writer can feed a generator"""
+    def write(self, value):
+        return value
+
+
+REPORT_EXPORT_CHUNK_SIZE = 2000
+REPORT_EXPORT_COLUMNS = [
+    ('Event', 'event_title'),
+    ('Event Start', 'event_start'),
+    ('Event End', 'event_end'),
+    ('Name', 'full_name'),
+    ('Registrant Type', 'registrant_type'),
+    ('Address', 'address'),
+    ('Email', 'email'),
+    ('Phone', 'phone'),
+    ('Member Type', 'member_type'),
+    ('Registration Date', 'registration_date'),
+    ('Fee', 'registration_fee'),
+]
+
+
+# Leading characters that make a spreadsheet treat a cell as a formula
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Numbers and phone numbers (+1 206 555-0100, -12.50) start with + or - but are not formulas
+CSV_NUMBER_PATTERN = re.compile(r'[+-]?[\d\s().-]+')
+
+
+def _escape_csv_cell(value):
+    """Quote member-entered text that a spreadsheet would otherwise evaluate as a formula"""
+    if (
+        isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES)
+        and not CSV_NUMBER_PATTERN.fullmatch(value)
+    ):
+        return "'" + value
+    return value
+
+
+def _registrations_csv_response(line_items):
+    """Stream the report as CSV, reading line items in chunks so memory stays flat"""
+    def format_value(key, value):
+        if key in ('event_start', 'event_end', 'registration_date'):
+            return timezone.localtime(value).strftime('%Y-%m-%d %H:%M')
+        return _escape_csv_cell(value)
+    
+    def csv_lines():
+        writer = csv.writer(_Echo())
+        yield writer.writerow([label for label, _ in REPORT_EXPORT_COLUMNS])
+        rows = _registration_report_rows(line_items.iterator(chunk_size=REPORT_EXPORT_CHUNK_SIZE))
+        for row in rows:
+            yield writer.writerow([format_value(key, row[key]) for _, key in REPORT_EXPORT_COLUMNS])
+    
+    filename = f'registrations_{timezone.localdate():%Y%m%d}.csv'
+    response = StreamingHttpResponse(csv_lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 def registrations_report(request):
     """Generate a registrations report with filtering options"""
     # Check permissions - only Admins and Editors can access
-    if not (request.user.has_permission('edit_events') or request.user.has_permission('manage_users') or request.user.is_superuser):
+    if not _can_view_reports(request.user):
         raise PermissionDenied("You don't have permission to access this report.")
     
     filter_form = EventRegistrationFilterForm(request.GET)
@@ -608,120 +761,11 @@ def registrations_report(request):
     total_revenue = Decimal('0.00')
     
     if filter_form.is_valid():
-        # Start with all non-cancelled registrations
-        registrations = EventRegistration.objects.filter(cancelled=False).select_related(
-            'event', 'member'
-        ).prefetch_related('member__member_types', 'additional_members')
-        
-        # Filter by event title
-        event_title = filter_form.cleaned_data.get('event_title')
-        if event_title:
-            registrations = registrations.filter(event__title__icontains=event_title)
-        
-        # Filter by start date (events starting on or after this date)
-        start_date = filter_form.cleaned_data.get('start_date')
-        if start_date:
-            registrations = registrations.filter(event__start_datetime__date__gte=start_date)
-        
-        # Filter by end date (events ending on or before this date)
-        end_date = filter_form.cleaned_data.get('end_date')
-        if end_date:
-            registrations = registrations.filter(event__end_datetime__date__lte=end_date)
-        
-        # Build report data
-        for registration in registrations:
-            # Primary member
-            member = registration.member
-            member_types = ', '.join([mt.name for mt in member.member_types.filter(is_active=True)])
-            
-            # Calculate fee for primary member based on their member type
-            primary_fee = Decimal('0.00')
-            member_type_list = member.member_types.filter(is_active=True)
-            for member_type in member_type_list:
-                try:
-                    fee = EventRegistrationFee.objects.get(event=registration.event, member_type=member_type)
-                    primary_fee = fee.fee_amount
-                    break  # Use first matching fee
-                except EventRegistrationFee.DoesNotExist:
-                    pass
-            
-            # Format address
-            address_parts = []
-            if member.address1:
-                address_parts.append(member.address1)
-            if member.address2:
-                address_parts.append(member.address2)
-            if member.city:
-                address_parts.append(member.city)
-            if member.state:
-                address_parts.append(member.get_state_display())
-            if member.zip_code:
-                address_parts.append(member.zip_code)
-            full_address = ', '.join(address_parts) if address_parts else 'N/A'
-            
-            registrations_data.append({
-                'event_title': registration.event.title,
-                'event_start': registration.event.start_datetime,
-                'event_end': registration.event.end_datetime,
-                'full_name': member.get_full_name(),
-                'address': full_address,
-                'email': member.email,
-                'phone': member.primary_phone_number or 'N/A',
-                'member_type': member_types or 'N/A',
-                'registration_date': registration.registered_at,
-                'registration_fee': primary_fee,
-                'is_primary': True,
-            })
-            
-            total_revenue += primary_fee
-            
-            # Additional members (dependents)
-            for additional_member in registration.additional_members.all():
-                additional_member_types = ', '.join([mt.name for mt in additional_member.member_types.filter(is_active=True)])
-                
-                # Calculate fee for additional member based on their member type
-                additional_fee = Decimal('0.00')
-                additional_member_type_list = additional_member.member_types.filter(is_active=True)
-                for member_type in additional_member_type_list:
-                    try:
-                        fee = EventRegistrationFee.objects.get(event=registration.event, member_type=member_type)
-                        additional_fee = fee.fee_amount
-                        break  # Use first matching fee
-                    except EventRegistrationFee.DoesNotExist:
-                        pass
-                
-                # Format address for additional member
-                additional_address_parts = []
-                if additional_member.address1:
-                    additional_address_parts.append(additional_member.address1)
-                if additional_member.address2:
-                    additional_address_parts.append(additional_member.address2)
-                if additional_member.city:
-                    additional_address_parts.append(additional_member.city)
-                if additional_member.state:
-                    additional_address_parts.append(additional_member.get_state_display())
-                if additional_member.zip_code:
-                    additional_address_parts.append(additional_member.zip_code)
-                additional_full_address = ', '.join(additional_address_parts) if additional_address_parts else 'N/A'
-                
-                registrations_data.append({
-                    'event_title': registration.event.title,
-                    'event_start': registration.event.start_datetime,
-                    'event_end': registration.event.end_datetime,
-                    'full_name': additional_member.get_full_name(),
-                    'address': additional_full_address,
-                    'email': additional_member.email,
-                    'phone': additional_member.primary_phone_number or 'N/A',
-                    'member_type': additional_member_types or 'N/A',
-                    'registration_date': registration.registered_at,
-                    'registration_fee': additional_fee,
-                    'is_primary': False,
-                })
-                
-                total_revenue += additional_fee
-        
-        # Sort by event start date, then by registration date
-        registrations_data.sort(key=lambda x: (x['event_start'], x['registration_date']))
+        line_items = _filter_report_line_items(filter_form)
+        if request.GET.get('export') == 'csv':
+            return _registrations_csv_response(line_items)
+        registrations_data = list(_registration_report_rows(line_items))
+        total_revenue = sum((row['registration_fee'] for row in registrations_data), Decimal('0.00'))
     
     context = {
         'filter_form': filter_form,
@@ -147,6 +147,49 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The default local-memory cache is per process; with several workers point
+# CACHE_BACKEND/CACHE_LOCATION at a shared cache (memcached, redis or a database table)
+# so every worker sees the same snapshots and invalidations.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Seconds to keep a cached event registration snapshot (see CalendarApp.registration)
+REGISTRATION_RULES_CACHE_TIMEOUT = int(os.getenv('REGISTRATION_RULES_CACHE_TIMEOUT', 60 * 60 * 6))
+
+# Seconds to keep a rendered event card of the calendar and event list pages (see CalendarApp.fragments)
+EVENT_CARD_CACHE_TIMEOUT = int(os.getenv('EVENT_CARD_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Days of past events kept in the ICS subscription feeds (see CalendarApp.ics)
+ICS_FEED_PAST_DAYS = int(os.getenv('ICS_FEED_PAST_DAYS', 180))
+
+# Management dashboard counters (see ManagementApp.counters): cache lifetime in seconds,
+# and the table size above which the planner's row estimate replaces COUNT(*)
+DASHBOARD_COUNTER_CACHE_TIMEOUT = int(os.getenv('DASHBOARD_COUNTER_CACHE_TIMEOUT', 60 * 10))
+DASHBOARD_COUNTER_ESTIMATE_THRESHOLD = int(os.getenv('DASHBOARD_COUNTER_ESTIMATE_THRESHOLD', 100000))
+
+# Event action log writer (see CalendarApp.audit): entries are queued and bulk-inserted by a
+# background thread unless ACTION_LOG_ASYNC is off. When the queue is full, ACTION_LOG_OVERFLOW
+# 'sync' writes the entry in the request and 'drop' discards it with a warning. A batch that
+# fails to insert is retried ACTION_LOG_WRITE_RETRIES times before it is written entry by entry.
+ACTION_LOG_ASYNC = os.getenv('ACTION_LOG_ASYNC', 'True').lower() in ('true', '1', 'yes', 'on')
+ACTION_LOG_QUEUE_SIZE = int(os.getenv('ACTION_LOG_QUEUE_SIZE', 10000))
+ACTION_LOG_BATCH_SIZE = int(os.getenv('ACTION_LOG_BATCH_SIZE', 100))
+ACTION_LOG_FLUSH_INTERVAL = float(os.getenv('ACTION_LOG_FLUSH_INTERVAL', 2.0))
+ACTION_LOG_OVERFLOW = os.getenv('ACTION_LOG_OVERFLOW', 'sync').lower()
+ACTION_LOG_WRITE_RETRIES = int(os.getenv('ACTION_LOG_WRITE_RETRIES', 3))
+# prune_action_logs moves whole months older than ACTION_LOG_RETENTION_DAYS into
+# gzipped JSONL files under ACTION_LOG_ARCHIVE_DIR
+ACTION_LOG_RETENTION_DAYS = int(os.getenv('ACTION_LOG_RETENTION_DAYS', 365))
+ACTION_LOG_ARCHIVE_DIR = Path(os.getenv('ACTION_LOG_ARCHIVE_DIR', BASE_DIR / 'archives'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -280,6 +323,12 @@ CKEDITOR_5_FILE_STORAGE = "django.core.files.storage.DefaultStorage"
 AUTH_USER_MODEL = 'ManagementApp.ClubUser'
 
 # Authentication
+# ClubUserBackend loads the role with the user on every request so permission checks
+# need no extra queries. ModelBackend stays listed so existing sessions remain valid.
+AUTHENTICATION_BACKENDS = [
+    'ManagementApp.backends.ClubUserBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'  # Redirects to calendar page (CalendarApp is mounted at root)
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'YachtClubManager.settings')
 
 application = get_wsgi_application()
+
+# Serving processes only: flush queued action log entries on SIGTERM as on a normal exit
+from CalendarApp.audit import writer  # noqa: E402
+
+writer.install_sigterm_handler()